@@ -0,0 +1,57 @@
+import re
+from difflib import SequenceMatcher
+
+PUNCTUATION = re.compile(r"[^\w']+")
+
+
+def normalize(word):
+    """Compare words without case or surrounding punctuation, which aren't heard when spoken."""
+    return PUNCTUATION.sub("", word.lower()) or word
+
+
+def align_words(original, corrected):
+    """
+    Align the words of two transcriptions. Returns difflib opcodes (tag, i1, i2, j1, j2) over
+    original.split() and corrected.split().
+    """
+    matcher = SequenceMatcher(None, [normalize(word) for word in original.split()],
+                              [normalize(word) for word in corrected.split()], autojunk=False)
+    return matcher.get_opcodes()
+
+
+def changed_spans(original, corrected, context=2):
+    """
+    Return the (start, end) word ranges of the corrected transcription that differ from the
+    original, each widened by `context` words on either side and merged where they meet. A
+    deletion gives the words that now surround the gap.
+    """
+    length = len(corrected.split())
+    spans = []
+    for tag, _, _, j1, j2 in align_words(original, corrected):
+        if tag == 'equal':
+            continue
+        start, end = max(0, j1 - context), min(length, j2 + context)
+        if start == end:
+            continue  # Everything was deleted, so there is nothing left to say
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(end, spans[-1][1]))
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def changed_phrases(original, corrected, context=2):
+    """Return the text of each changed span of the corrected transcription; see changed_spans."""
+    words = corrected.split()
+    return [' '.join(words[start:end]) for start, end in changed_spans(original, corrected, context)]
+
+
+def new_nouns(original, proper_nouns):
+    """Return the proper nouns that don't appear, as whole words, in the original transcription."""
+    text = ' '.join(normalize(word) for word in original.split())
+    new = []
+    for noun in proper_nouns:
+        phrase = ' '.join(normalize(word) for word in noun.split())
+        if not re.search(rf"(?<![\w']){re.escape(phrase)}(?![\w'])", text):
+            new.append(noun)
+    return new
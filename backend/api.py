@@ -1,92 +1,374 @@
-import os
-from dotenv import load_dotenv
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .alignment import changed_phrases, new_nouns
+from .llm_client import LLMError
 from .recorder import AudioRecorder
-from .transcriber import Transcriber
 from .ner_manager import NERManager
 from .playback import Playback
-import google.generativeai as genai
+from .playback_queue import PlaybackQueue
+from .streaming import StreamingTranscriber
+from .vad import EnergyVAD
+from .metrics import span
 from .utils import spell_out
 
-# Load environment variables
-load_dotenv()
-genai.configure(api_key=os.getenv('GOOGLE_KEY'))
+# Fixed prompts spoken on every dictation; synthesized into the TTS cache at startup
+PROMPTS = ['Proper nouns are: ', 'Is there anything you would like to fix?', 'Nothing changed.']
+
+# Slow to import and only needed once there is audio to recognize, speak or correct
+HEAVY_MODULES = ['speech_recognition', 'gtts', 'requests', 'google.generativeai']
+
+class PipelineCancelled(Exception):
+    """Raised inside the pipeline when the caller cancels in-flight work."""
+
+
+def fix_phrases(original, corrected, proper_nouns, mode="changes", context=2):
+    """
+    Return the phrases to speak back after a fix. In "full" mode that is the whole corrected
+    transcription and all its proper nouns, each spelled out. In "changes" mode it is only the
+    spans that changed, with `context` words either side, and only the proper nouns that are
+    new, so a one-word fix to a long dictation is played back in seconds.
+    """
+    if mode == "full":
+        phrases = [corrected, PROMPTS[0]]
+        if proper_nouns:
+            phrases.append(', '.join(proper_nouns))
+        return phrases + [f"{noun} is {spell_out(noun)}" for noun in proper_nouns]
+
+    phrases = changed_phrases(original, corrected, context) or [PROMPTS[2]]
+    proper_nouns = new_nouns(original, proper_nouns)
+    if proper_nouns:
+        phrases += [PROMPTS[0], ', '.join(proper_nouns)]
+        phrases += [f"{noun} is {spell_out(noun)}" for noun in proper_nouns]
+    return phrases
+
 
 class VoiceDictationTool:
     """Main class for handling the voice dictation tool with NER functionality."""
 
-    def __init__(self, proper_nouns=False):
-        """Initialize the VoiceDictationTool with necessary parameters."""
-        self.audio_recorder = AudioRecorder()
-        self.transcriber = Transcriber()
-        self.ner_manager = NERManager()
-        self.playback = Playback()
+    def __init__(self, proper_nouns=False, streaming=False, archive=True, playback_depth=2, device=None,
+                 transcriber=None, ner_manager=None, playback=None, engine=None, tts=None, store=None, vad=True,
+                 gazetteer=None, warm_up=True, fix_playback="changes"):
+        """
+        Initialize the VoiceDictationTool with necessary parameters.
+
+        `device` is the AudioDeviceManager to record and play through; by default the shared
+        process-wide one is used. `transcriber`, `ner_manager` and `playback` replace the default
+        engines, e.g. with the stand-ins in backend.fakes. `engine` picks the speech recognition
+        engine of the default transcriber, e.g. "sphinx" or "vosk" to transcribe offline, and `tts`
+        the TTS provider of the default playback, e.g. "espeak" to synthesize offline. Takes and
+        fixes are archived with their transcripts to `store`, by default the shared RecordingStore.
+        `vad` trims silence from each recording before it is transcribed and archived, and skips
+        recordings with no speech at all; pass an EnergyVAD to tune it or False to turn it off.
+        The default speech threshold (a level of 500) silently drops takes from a quiet
+        microphone as having no speech, so for one pass e.g. EnergyVAD(44100, threshold=150).
+        The default NERManager remembers proper nouns in `gazetteer`, e.g. a persistent one.
+        `fix_playback` is "changes" to speak back only what a fix changed, or "full" to repeat
+        the whole corrected transcription; see fix_phrases.
+
+        The default transcriber and the LLM and TTS clients are only imported and created when
+        first needed. With `warm_up=True` that starts straight away in the background; pass False
+        to call warm_up() later, e.g. once a window is showing.
+        """
+        self.audio_recorder = AudioRecorder(device=device, store=store)
+        self._transcriber = transcriber
+        self.engine = engine
+        self.init_lock = threading.Lock()  # Guards creating the transcriber on first use
+        self.ner_manager = ner_manager if ner_manager is not None else NERManager(gazetteer=gazetteer)
+        self.playback = playback if playback is not None else Playback(device=device, provider=tts)
+        self.warm_up_thread = None
+        self.warm_up_times = {}  # Seconds each warm-up step took
+        self.playback_queue = PlaybackQueue(self.playback, depth=playback_depth, device=device)  # Synthesizes ahead while playing
         self.transcription = ""
         self.proper_nouns = []
         self.proper_nouns_enabled = proper_nouns
+        self.fix_playback = fix_playback
+        self.streaming = streaming  # Transcribe segments while the user is still talking
+        self.streaming_transcriber = None
+        self.archive = archive  # Write each take and its transcripts to the recording store in the background
+        self.take_id = None  # Store id of the take being worked on
+        if vad is True:
+            vad = EnergyVAD(self.audio_recorder.rate)
+        self.vad = vad or None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline")  # Runs the *_async methods
+        self.cancel_event = None  # Set to cancel the pipeline run that is in flight
+        if warm_up:
+            self.warm_up()
+
+    @property
+    def transcriber(self):
+        """The Transcriber, created on first use since it imports the speech recognition engines."""
+        with self.init_lock:
+            if self._transcriber is None:
+                from .transcriber import Transcriber
+
+                self._transcriber = Transcriber(self.engine)
+            return self._transcriber
+
+    def warm_up(self, background=True, modules=HEAVY_MODULES):
+        """
+        Import the heavy modules, create the transcriber, LLM model and audio device, and
+        synthesize the fixed prompts into the TTS cache, so the first take doesn't wait for them.
+        Each step's time is recorded in `warm_up_times`; a step that fails is left to fail again
+        (and be reported) when it's actually used.
+        """
+        steps = [(module, lambda module=module: importlib.import_module(module)) for module in modules]
+        steps += [
+            ("transcriber", lambda: self.transcriber),
+            ("llm", self.ner_manager.warm_up),
+            ("tts_prompts", lambda: self.playback.prewarm(PROMPTS, background=False)),
+            ("audio_device", lambda: self.audio_recorder.device.backend),
+        ]
+
+        def warm():
+            for name, step in steps:
+                start = time.perf_counter()
+                with span("warm_up", step=name):
+                    try:
+                        step()
+                    except Exception as e:
+                        print(f"Could not warm up {name}: {e}")
+                self.warm_up_times[name] = time.perf_counter() - start
+
+        if background:
+            self.warm_up_thread = threading.Thread(target=warm, name="warm-up", daemon=True)
+            self.warm_up_thread.start()
+        else:
+            warm()
+        return self.warm_up_times
+
+    def _start_streaming(self):
+        """Attach a streaming transcriber to the recorder if streaming mode is enabled."""
+        if not self.streaming or self.audio_recorder.is_recording:
+            return
+        self.streaming_transcriber = StreamingTranscriber(self.transcriber.transcribe_segment,
+                                                          self.audio_recorder.rate,
+                                                          self.audio_recorder.sample_width)
+        self.audio_recorder.chunk_queue = self.streaming_transcriber.chunks
+        self.streaming_transcriber.start()
+
+    def _trim_silence(self):
+        """
+        Return the recorder's audio with leading and trailing silence cut by the VAD, or None if
+        it holds no speech at all.
+        """
+        pcm = self.audio_recorder.get_pcm()
+        if self.vad is None:
+            return pcm
+        with span("vad", audio_seconds=self.audio_recorder.seconds(len(pcm))) as s:
+            trimmed, stats = self.vad.trim(pcm)
+            s.set(trimmed_seconds=stats["trimmed_seconds"], speech=stats["speech"])
+        return trimmed if stats["speech"] else None
+
+    def _discard_streaming(self):
+        """Stop the streaming transcriber of a recording that is not going to be used."""
+        streamer = self.streaming_transcriber
+        if streamer is not None:
+            self.streaming_transcriber = None
+            self.audio_recorder.chunk_queue = None
+            streamer.finish()
+
+    def _transcribe_recording(self, pcm=None):
+        """Transcribe the recorder's audio (or the given PCM) straight from memory."""
+        if pcm is None:
+            pcm = self.audio_recorder.get_pcm()
+        return self.transcriber.transcribe_audio(pcm, self.audio_recorder.rate, self.audio_recorder.sample_width)
+
+    def _transcribe_take(self, pcm=None):
+        """Transcribe the take that was just recorded, using the streamed segments if available."""
+        streamer = self.streaming_transcriber
+        if streamer is None:
+            return self._transcribe_recording(pcm)
+
+        self.streaming_transcriber = None
+        self.audio_recorder.chunk_queue = None
+        text = streamer.finish()
+        if streamer.error is not None:
+            # A segment could not be transcribed, so redo the whole take
+            print("Streaming transcription failed, transcribing the full recording.")
+            return self._transcribe_recording(pcm)
+        return text if text else "Transcription failed: Audio not understood."
+
+    def _snap_names(self, text):
+        """Fix misrecognized known proper nouns in a transcription without asking the LLM."""
+        if not text or text.startswith("Transcription failed"):
+            return text
+        text, replacements = self.ner_manager.snap_names(text)
+        for misrecognized, name in replacements:
+            print(f"Corrected '{misrecognized}' to the known name '{name}'")
+        return text
+
+    def _playback_proper_nouns(self, proper_nouns):
+        """Announce the proper nouns, speaking the fixed prefix separately so it comes from the cache."""
+        self.playback_queue.enqueue(PROMPTS[0])
+        if proper_nouns:
+            self.playback_queue.enqueue(', '.join(proper_nouns))
+
+    def _index_transcript(self, recording_id, text, kind, proper_nouns=()):
+        """Record a transcript against an archived recording."""
+        if recording_id is None:
+            return
+        try:
+            self.audio_recorder.store.add_transcript(recording_id, text, kind, proper_nouns)
+        except Exception as e:
+            print(f"Could not index {kind}: {e}")
+
+    def _report(self, progress, cancel_event, stage, value=None):
+        """Tell the caller a stage has finished, then stop if the run has been cancelled."""
+        if progress is not None:
+            progress(stage, value)
+        if cancel_event is not None and cancel_event.is_set():
+            raise PipelineCancelled(stage)
+
+    def _wait_for_playback(self, progress, cancel_event):
+        self._report(progress, cancel_event, "playback")
+        self.playback_queue.wait()
+        self.playback.cleanup()
+        self._report(progress, cancel_event, "done")
+
+    def _submit(self, method, *args, progress=None):
+        """Run a pipeline method on the worker thread and return its Future."""
+        cancel_event = threading.Event()
+        self.cancel_event = cancel_event
+        return self.executor.submit(method, *args, progress=progress, cancel_event=cancel_event)
+
+    def cancel(self):
+        """Cancel the pipeline run that is in flight and stop its playback."""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.cancel_playback()
+
+    def cancel_playback(self):
+        """Stop any playback that is still queued or playing."""
+        self.playback_queue.cancel()
 
     def start_recording(self):
         """Start recording the user's voice for the dictated text."""
+        self.cancel_playback()
+        self._start_streaming()
         self.audio_recorder.start_recording()
 
-    def stop_recording(self):
-        """Stop recording and process the audio for transcription and NER."""
+    def stop_recording(self, progress=None, cancel_event=None):
+        """
+        Stop recording and process the audio for transcription and NER.
+
+        `progress(stage, value)` is called as each stage finishes, with stages "transcription",
+        "proper_nouns", "playback" and "done". If the LLM can't be reached, "llm_error" is
+        reported with the error and the take carries on with no proper nouns. Setting
+        `cancel_event` stops the run after the current stage by raising PipelineCancelled.
+
+        A take with no speech is neither archived nor transcribed, and comes back with an empty
+        transcription. With the default VAD that includes quiet takes below its energy threshold
+        of 500; pass the constructor a VAD with a lower threshold for a quiet microphone.
+        """
 
         print("Recording stopped...")
         self.audio_recorder.stop_recording()
-        self.audio_recorder.save_audio()
+        pcm = self._trim_silence()
+        if pcm is None:
+            print("No speech detected.")
+            self._discard_streaming()
+            self.take_id = None
+            self.transcription = ""
+            self.proper_nouns = []
+            self._report(progress, cancel_event, "transcription", self.transcription)
+            return self.transcription, self.proper_nouns
 
-        self.transcription = self.transcriber.transcribe_audio(self.audio_recorder.audio_file)
+        self.take_id = self.audio_recorder.save_audio_async(pcm=pcm) if self.archive else None
+        self.transcription = self._snap_names(self._transcribe_take(pcm))
+        self._report(progress, cancel_event, "transcription", self.transcription)
         if self.transcription:
             print(f"Transcription: {self.transcription}")
-            self.proper_nouns = self.ner_manager.extract_proper_nouns(self.transcription)
-            print(f"Proper Nouns: {self.proper_nouns}")
-
-            if self.proper_nouns_enabled == 0:
-                self.playback.playback_transcription(self.transcription)
-            elif self.proper_nouns_enabled == 1:
-                self.playback.playback_transcription(self.transcription)
-                self.playback.playback_transcription('Proper nouns are: ' + ', '.join(self.proper_nouns))
+            # Every mode starts by repeating the transcription, so start speaking it during NER
+            self.playback_queue.enqueue(self.transcription)
+            try:
+                self.proper_nouns = self.ner_manager.extract_proper_nouns(self.transcription)
+                print(f"Proper Nouns: {self.proper_nouns}")
+            except LLMError as e:
+                # Carry on without proper nouns; nothing is cached, so the next take asks again
+                print(f"Could not extract proper nouns: {e}")
+                self.proper_nouns = []
+                self._report(progress, cancel_event, "llm_error", str(e))
+            self._index_transcript(self.take_id, self.transcription, "transcription", self.proper_nouns)
+            self._report(progress, cancel_event, "proper_nouns", self.proper_nouns)
+
+            if self.proper_nouns_enabled == 1:
+                self._playback_proper_nouns(self.proper_nouns)
             elif self.proper_nouns_enabled == 2:
-                self.playback.playback_transcription(self.transcription)
-                self.playback.playback_transcription('Proper nouns are: ' + ', '.join(self.proper_nouns))
+                self._playback_proper_nouns(self.proper_nouns)
                 for noun in self.proper_nouns:
                     spelled_out = spell_out(noun)
-                    self.playback.playback_transcription(f"{noun} is {spelled_out}")
-                self.playback.playback_transcription('Is there anything you would like to fix?')
+                    self.playback_queue.enqueue(f"{noun} is {spelled_out}")
+                self.playback_queue.enqueue(PROMPTS[1])
 
-            self.playback.cleanup()
+            self._wait_for_playback(progress, cancel_event)
         else:
             print("Transcription failed.")
         return self.transcription, self.proper_nouns
 
+    def stop_recording_async(self, progress=None):
+        """Run stop_recording on the pipeline worker thread. Returns a Future of its result."""
+        return self._submit(self.stop_recording, progress=progress)
+
     def start_fix_recording(self):
         """Start recording the user's voice for the fix."""
+        self.cancel_playback()
+        self._start_streaming()
         self.audio_recorder.start_fix_recording()
 
-    def process_fix(self, original_transcription):
-        """Process the fix recording to correct the original transcription."""
+    def process_fix(self, original_transcription, progress=None, cancel_event=None):
+        """
+        Process the fix recording to correct the original transcription.
+
+        Reports the stages "fix_transcription", "corrected_transcription" (with a
+        (text, proper_nouns) tuple), "playback" and "done"; see stop_recording. If the LLM can't
+        be reached, "llm_error" is reported first and the original transcription is carried on
+        uncorrected.
+        """
         self.audio_recorder.stop_fix_recording()
-        self.audio_recorder.save_fix_audio()
+        pcm = self._trim_silence()
+        if pcm is None:
+            print("No speech detected in the fix.")
+            self._discard_streaming()
+            self.corrected_transcription = None
+            self._report(progress, cancel_event, "fix_transcription", "")
+            return self.corrected_transcription
 
-        fix_transcription = self.transcriber.transcribe_audio(self.audio_recorder.fix_audio_file)
+        fix_id = self.audio_recorder.save_fix_audio_async(pcm) if self.archive else None
+        fix_transcription = self._transcribe_take(pcm)
+        self._report(progress, cancel_event, "fix_transcription", fix_transcription)
         if fix_transcription:
             print(f"Fix Transcription: {fix_transcription}")
+            self._index_transcript(fix_id, fix_transcription, "fix_transcription")
 
-            # Use LLM to correct the original transcription based on fix_transcription
-            self.corrected_transcription = self.ner_manager.correct_transcription(original_transcription, fix_transcription)
-            print(f"Corrected Transcription: {self.corrected_transcription}")
+            # Use LLM to correct the original transcription and extract its proper nouns in one request
+            try:
+                self.corrected_transcription, self.corrected_proper_nouns = self.ner_manager.correct_and_extract(
+                    original_transcription, fix_transcription)
+                print(f"Corrected Transcription: {self.corrected_transcription}")
+                self._index_transcript(self.take_id, self.corrected_transcription, "corrected_transcription",
+                                       self.corrected_proper_nouns)
+            except LLMError as e:
+                # Keep the transcription as it was; the fix itself is already archived
+                print(f"Could not correct the transcription: {e}")
+                self.corrected_transcription, self.corrected_proper_nouns = original_transcription, []
+                self._report(progress, cancel_event, "llm_error", str(e))
+            self._report(progress, cancel_event, "corrected_transcription",
+                         (self.corrected_transcription, self.corrected_proper_nouns))
 
-            # Playback the corrected transcription
-            self.corrected_proper_nouns = self.ner_manager.extract_proper_nouns(self.corrected_transcription)
-            self.playback.playback_transcription(self.corrected_transcription)
-            self.playback.playback_transcription('Proper nouns are: ' + ', '.join(self.corrected_proper_nouns))
-            for noun in self.corrected_proper_nouns:
-                spelled_out = spell_out(noun)
-                self.playback.playback_transcription(f"{noun} is {spelled_out}")
+            # Playback what the correction changed, or all of it
+            for phrase in fix_phrases(original_transcription, self.corrected_transcription,
+                                      self.corrected_proper_nouns, self.fix_playback):
+                self.playback_queue.enqueue(phrase)
 
-            self.playback.cleanup()
+            self._wait_for_playback(progress, cancel_event)
         else:
             print("Fix transcription failed.")
             self.corrected_transcription = None
 
         return self.corrected_transcription
+
+    def process_fix_async(self, original_transcription, progress=None):
+        """Run process_fix on the pipeline worker thread. Returns a Future of its result."""
+        return self._submit(self.process_fix, original_transcription, progress=progress)
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+import wave
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from .utils import percentile
+
+def google_recognizer(engine=None, target_rate=16000):
+    """
+    Default recognizer factory: transcribe a WAV file with Google Web Speech API (or `engine`).
+
+    Files go through Transcriber.preprocess, so they are resampled and FLAC-encoded exactly as
+    interactive takes are.
+    """
+    import speech_recognition
+    from .transcriber import Transcriber
+
+    transcriber = Transcriber(engine, target_rate=target_rate)
+
+    def recognize(path):
+        try:
+            return transcriber.recognize(transcriber.preprocess(transcriber.to_audio_data(path)))
+        except speech_recognition.UnknownValueError:
+            return ""  # No speech in the file
+
+    return recognize
+
+
+def find_inputs(source):
+    """List the WAV files in a directory (recursively) or in a manifest with one path per line."""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".wav"))
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source) as manifest:
+        for line in manifest:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(line if os.path.isabs(line) else os.path.join(base, line))
+    return paths
+
+
+def load_completed(output_path):
+    """Return the paths that already have a result in the JSONL output. Failed files are retried."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path) as output:
+        for line in output:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash
+            if record.get("status") == "ok":
+                completed.add(record["path"])
+    return completed
+
+
+def audio_seconds(path):
+    """Return the duration of a WAV file, or 0.0 if it can't be read."""
+    try:
+        with wave.open(path, 'rb') as wf:
+            return wf.getnframes() / float(wf.getframerate())
+    except (OSError, EOFError, wave.Error):
+        return 0.0
+
+
+_worker_state = threading.local()
+
+
+def _transcribe_file(factory, path):
+    """Transcribe one file in a worker, creating the recognizer once per worker."""
+    recognize = getattr(_worker_state, "recognize", None)
+    if recognize is None:
+        recognize = _worker_state.recognize = factory()
+
+    start = time.perf_counter()
+    record = {"path": path, "audio_seconds": round(audio_seconds(path), 3)}
+    try:
+        record["text"] = recognize(path)
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["latency_s"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+class BatchTranscriber:
+    """Class that transcribes many WAV files on a bounded worker pool, writing results incrementally."""
+
+    def __init__(self, factory=google_recognizer, workers=4, processes=False, max_pending=None):
+        """
+        Initialize the batch transcriber.
+
+        `factory` is called once in each worker and returns a recognizer, a callable that takes
+        a WAV path and returns its text. With `processes=True` it must be importable (picklable).
+        """
+        self.factory = factory
+        self.workers = workers
+        self.processes = processes
+        self.max_pending = max_pending or workers * 2  # Bound on submitted but unfinished files
+
+    def run(self, paths, output_path, progress=None):
+        """Transcribe every path that has no result in `output_path` yet and return summary stats."""
+        completed = load_completed(output_path)
+        todo = [path for path in paths if path not in completed]
+        latencies = []
+        total_audio = 0.0
+        errors = 0
+        start = time.perf_counter()
+
+        pool_class = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        with pool_class(max_workers=self.workers) as pool, open(output_path, "a+") as output:
+            output.seek(0, os.SEEK_END)
+            if output.tell():
+                output.seek(output.tell() - 1)
+                if output.read(1) != "\n":
+                    output.write("\n")  # Don't glue the next record onto a line cut short by a crash
+            pending = set()
+            remaining = iter(todo)
+            while True:
+                for path in remaining:
+                    pending.add(pool.submit(_transcribe_file, self.factory, path))
+                    if len(pending) >= self.max_pending:
+                        break
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    output.write(json.dumps(record) + "\n")
+                    output.flush()  # So a crash loses at most the files in flight
+                    latencies.append(record["latency_s"])
+                    total_audio += record["audio_seconds"]
+                    errors += record["status"] != "ok"
+                    if progress is not None:
+                        progress(record)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "files": len(latencies),
+            "skipped": len(paths) - len(todo),
+            "errors": errors,
+            "elapsed_s": round(elapsed, 3),
+            "files_per_s": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+            "audio_seconds_per_s": round(total_audio / elapsed, 3) if elapsed else 0.0,
+            "latency_p50_s": percentile(latencies, 0.50),
+            "latency_p90_s": percentile(latencies, 0.90),
+            "latency_p99_s": percentile(latencies, 0.99),
+        }
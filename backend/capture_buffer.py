@@ -0,0 +1,122 @@
+import numpy as np
+
+class CaptureBuffer:
+    """
+    Class that stores captured PCM in one contiguous, block-grown bytearray.
+
+    The buffer grows geometrically in whole blocks, so an hour of audio costs a few dozen
+    reallocations instead of one bytes object per chunk. With `max_bytes` set it keeps only the
+    most recent audio once full, and with `ring=True` the whole capacity is allocated up front.
+    """
+
+    def __init__(self, block_size=1 << 20, max_bytes=None, ring=False, sample_width=2):
+        """Initialize the buffer. Sizes are in bytes and are rounded to whole samples."""
+        if ring and max_bytes is None:
+            raise ValueError("A ring buffer needs max_bytes")
+        self.sample_width = sample_width
+        self.block_size = max(block_size - block_size % sample_width, sample_width)
+        self.max_bytes = None if max_bytes is None else max(max_bytes - max_bytes % sample_width, sample_width)
+        self.ring = ring
+        self.reallocations = 0
+        self.clear()
+
+    def clear(self):
+        """Drop the stored audio. Views handed out earlier stay valid."""
+        # Start a fresh bytearray instead of reusing the old one, so a background writer
+        # holding a view of the last take never sees the next one
+        self._buf = bytearray(self.max_bytes if self.ring else self.block_size)
+        self._start = 0  # Offset of the oldest byte once the buffer has wrapped
+        self.length = 0
+        self.dropped_bytes = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def capacity(self):
+        return len(self._buf)
+
+    def append(self, data):
+        """Append a chunk of PCM, overwriting the oldest audio once the memory cap is reached."""
+        data = memoryview(data).cast('B')
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            self.dropped_bytes += len(data) - self.max_bytes
+            data = data[len(data) - self.max_bytes:]
+
+        if self._start == 0 and self.length + len(data) > len(self._buf):
+            self._grow(self.length + len(data))
+
+        if self.length + len(data) <= len(self._buf):
+            end = (self._start + self.length) % len(self._buf)
+            self._write(end, data)
+            self.length += len(data)
+        else:
+            # Full: overwrite the oldest bytes
+            end = (self._start + self.length) % len(self._buf)
+            self._write(end, data)
+            overflow = self.length + len(data) - len(self._buf)
+            self._start = (self._start + overflow) % len(self._buf)
+            self.length = len(self._buf)
+            self.dropped_bytes += overflow
+
+    def _write(self, offset, data):
+        first = min(len(data), len(self._buf) - offset)
+        self._buf[offset:offset + first] = data[:first]
+        if first < len(data):
+            self._buf[:len(data) - first] = data[first:]
+
+    def _grow(self, needed):
+        """Grow the backing store to fit `needed` bytes, in whole blocks and at most up to the cap."""
+        size = len(self._buf)
+        new_size = max(needed, size + max(self.block_size, size // 2))
+        new_size += -new_size % self.block_size
+        if self.max_bytes is not None:
+            new_size = min(new_size, self.max_bytes)
+        if new_size <= size:
+            return
+        try:
+            # Extend one zeroed block at a time so growing never needs a temporary as big as the
+            # growth itself; bytearray reallocs in place where it can
+            zeros = memoryview(bytes(self.block_size))
+            while len(self._buf) < new_size:
+                self._buf.extend(zeros[:new_size - len(self._buf)])
+        except BufferError:
+            # A view is still exported, so the array can't be resized in place
+            buf = bytearray(new_size)
+            buf[:self.length] = self._buf[:self.length]
+            self._buf = buf
+        self.reallocations += 1
+
+    def _linearize(self):
+        """Rotate a wrapped ring so the audio starts at offset 0."""
+        if self._start:
+            # Copy both segments straight into one new array, without slice temporaries, so the
+            # rotation never holds more than the old and the new buffer
+            buf = bytearray(len(self._buf))
+            old = memoryview(self._buf)
+            tail = len(self._buf) - self._start
+            buf[:tail] = old[self._start:]
+            buf[tail:] = old[:self._start]
+            old.release()
+            self._buf = buf
+            self._start = 0
+
+    def view(self):
+        """Return a memoryview of the stored audio, oldest first, without copying it."""
+        self._linearize()
+        return memoryview(self._buf)[:self.length]
+
+    def tail(self, nbytes):
+        """Return views (one, or two if the ring wraps) over the most recent `nbytes` of audio."""
+        nbytes = min(nbytes - nbytes % self.sample_width, self.length)
+        start = (self._start + self.length - nbytes) % max(len(self._buf), 1)
+        buf = memoryview(self._buf)
+        if start + nbytes <= len(self._buf):
+            return [buf[start:start + nbytes]]
+        return [buf[start:], buf[:start + nbytes - len(self._buf)]]
+
+    def level(self, nbytes=4096):
+        """Return the RMS level of the most recent `nbytes` of int16 audio."""
+        parts = [np.frombuffer(part, dtype=np.int16) for part in self.tail(nbytes)]
+        samples = np.concatenate(parts).astype(np.float32) if parts else np.zeros(0, np.float32)
+        return float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
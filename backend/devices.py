@@ -0,0 +1,289 @@
+import threading
+import time
+import wave
+import numpy as np
+from .utils import AudioClip
+
+class PyAudioBackend:
+    """Device backend that opens real input/output streams through PyAudio."""
+
+    def __init__(self):
+        import pyaudio
+
+        self.audio = pyaudio.PyAudio()
+
+    def open_output(self, sample_width, channels, rate):
+        return self.audio.open(format=self.audio.get_format_from_width(sample_width),
+                               channels=channels,
+                               rate=rate,
+                               output=True)
+
+    def open_input(self, sample_width, channels, rate, frames_per_buffer):
+        return _PyAudioInput(self.audio.open(format=self.audio.get_format_from_width(sample_width),
+                                             channels=channels,
+                                             rate=rate,
+                                             input=True,
+                                             frames_per_buffer=frames_per_buffer))
+
+    def terminate(self):
+        self.audio.terminate()
+
+
+class _PyAudioInput:
+    """Wraps a PyAudio input stream so reads never raise on overflow."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, frames):
+        return self.stream.read(frames, exception_on_overflow=False)  # Safeguard against overflow
+
+    def start_stream(self):
+        self.stream.start_stream()
+
+    def stop_stream(self):
+        self.stream.stop_stream()
+
+    def close(self):
+        self.stream.close()
+
+
+class NullBackend:
+    """
+    Headless device backend for tests and servers.
+
+    Output is collected in memory (and optionally written to a WAV file). Input is read from
+    the given PCM or WAV file, followed by silence. With `realtime=True` reads and writes take
+    as long as the audio they carry, like a real device.
+    """
+
+    def __init__(self, input_pcm=b'', input_file=None, output_file=None, realtime=False):
+        if input_file is not None:
+            with wave.open(input_file, 'rb') as wf:
+                input_pcm = wf.readframes(wf.getnframes())
+        self.input_pcm = input_pcm
+        self.output_file = output_file
+        self.realtime = realtime
+        self.output = bytearray()
+        self.opened_outputs = 0
+        self.opened_inputs = 0
+
+    def open_output(self, sample_width, channels, rate):
+        self.opened_outputs += 1
+        return _NullOutput(self, sample_width, channels, rate)
+
+    def open_input(self, sample_width, channels, rate, frames_per_buffer):
+        self.opened_inputs += 1
+        return _NullInput(self, sample_width * channels, rate)
+
+    def terminate(self):
+        pass
+
+
+class _NullOutput:
+    def __init__(self, backend, sample_width, channels, rate):
+        self.backend = backend
+        self.frame_bytes = sample_width * channels
+        self.rate = rate
+        self.wave_file = None
+        if backend.output_file is not None:
+            self.wave_file = wave.open(backend.output_file, 'wb')
+            self.wave_file.setnchannels(channels)
+            self.wave_file.setsampwidth(sample_width)
+            self.wave_file.setframerate(rate)
+
+    def write(self, data):
+        self.backend.output += data
+        if self.wave_file is not None:
+            self.wave_file.writeframes(data)
+        if self.backend.realtime:
+            time.sleep(len(data) / self.frame_bytes / self.rate)
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        if self.wave_file is not None:
+            self.wave_file.close()
+
+
+class _NullInput:
+    def __init__(self, backend, frame_bytes, rate):
+        self.backend = backend
+        self.frame_bytes = frame_bytes
+        self.rate = rate
+        self.position = 0
+
+    def read(self, frames):
+        nbytes = frames * self.frame_bytes
+        data = self.backend.input_pcm[self.position:self.position + nbytes]
+        self.position += len(data)
+        if self.backend.realtime:
+            time.sleep(frames / self.rate)
+        return bytes(data) + bytes(nbytes - len(data))
+
+    def start_stream(self):
+        pass
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def convert_pcm(pcm, source_format, target_format):
+    """
+    Convert interleaved PCM between (sample_width, channels, rate) formats.
+
+    Channels are averaged or duplicated and the rate is changed by linear interpolation, which is
+    plenty for speech prompts and avoids reopening the output stream.
+    """
+    if source_format == target_format:
+        return pcm
+    source_width, source_channels, source_rate = source_format
+    target_width, target_channels, target_rate = target_format
+
+    samples = _to_float(pcm, source_width).reshape(-1, source_channels)
+    if source_channels != target_channels:
+        mono = samples.mean(axis=1, keepdims=True)
+        samples = np.repeat(mono, target_channels, axis=1)
+
+    if source_rate != target_rate and len(samples):
+        count = max(1, int(round(len(samples) * target_rate / source_rate)))
+        positions = np.arange(count) * (source_rate / target_rate)
+        frames = np.arange(len(samples))
+        samples = np.stack([np.interp(positions, frames, samples[:, c]) for c in range(target_channels)], axis=1)
+
+    return _from_float(samples.reshape(-1), target_width)
+
+
+_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+def _to_float(pcm, sample_width):
+    if sample_width not in _DTYPES:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    samples = np.frombuffer(pcm, dtype=_DTYPES[sample_width]).astype(np.float64)
+    if sample_width == 1:
+        return (samples - 128.0) / 128.0  # 8-bit PCM is unsigned
+    return samples / float(2 ** (8 * sample_width - 1))
+
+
+def _from_float(samples, sample_width):
+    if sample_width not in _DTYPES:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    scale = float(2 ** (8 * sample_width - 1))
+    samples = np.clip(samples, -1.0, 1.0 - 1.0 / scale)
+    if sample_width == 1:
+        return (samples * 128.0 + 128.0).astype(np.uint8).tobytes()
+    return (samples * scale).astype(_DTYPES[sample_width]).tobytes()
+
+
+class AudioDeviceManager:
+    """
+    Class that owns the process-wide audio backend and keeps its streams open.
+
+    The output stream is opened once, in the format of the first clip (or `output_format`);
+    later clips in other formats are converted instead of reopening the stream. The input
+    stream is paused between recordings rather than closed.
+    """
+
+    def __init__(self, backend=None, output_format=None):
+        """Initialize the manager. The default backend is PyAudio, created on first use."""
+        self._backend = backend
+        self.output_format = output_format  # (sample_width, channels, rate)
+        self.output_stream = None
+        self.input_stream = None
+        self.input_format = None
+        self.input_active = False
+        self.lock = threading.RLock()
+
+    @property
+    def backend(self):
+        with self.lock:
+            if self._backend is None:
+                self._backend = PyAudioBackend()
+            return self._backend
+
+    def prepare_output(self, clip):
+        """Open the output stream if needed and return the clip converted to its format."""
+        with self.lock:
+            clip_format = (clip.sample_width, clip.channels, clip.rate)
+            if self.output_format is None:
+                self.output_format = clip_format
+            if self.output_stream is None:
+                self.output_stream = self.backend.open_output(*self.output_format)
+        if clip_format == self.output_format:
+            return clip
+        return AudioClip(convert_pcm(clip.pcm, clip_format, self.output_format), *self.output_format)
+
+    def write(self, pcm):
+        """Write PCM that is already in the output format, blocking until the device accepts it."""
+        self.output_stream.write(pcm)
+
+    def play(self, clip, chunk=1024):
+        """Play a clip through the shared output stream."""
+        clip = self.prepare_output(clip)
+        frame_bytes = chunk * clip.sample_width * clip.channels
+        for start in range(0, len(clip.pcm), frame_bytes):
+            self.write(clip.pcm[start:start + frame_bytes])
+
+    def open_input(self, sample_width, channels, rate, frames_per_buffer):
+        """Return the shared input stream, started and in the requested format."""
+        with self.lock:
+            input_format = (sample_width, channels, rate, frames_per_buffer)
+            if self.input_stream is not None and self.input_format != input_format:
+                self.input_stream.stop_stream()
+                self.input_stream.close()
+                self.input_stream = None
+            if self.input_stream is None:
+                self.input_stream = self.backend.open_input(sample_width, channels, rate, frames_per_buffer)
+                self.input_format = input_format
+            elif not self.input_active:
+                self.input_stream.start_stream()
+            self.input_active = True
+            return self.input_stream
+
+    def pause_input(self):
+        """Stop capturing without closing the input stream."""
+        with self.lock:
+            if self.input_stream is not None and self.input_active:
+                self.input_stream.stop_stream()
+            self.input_active = False
+
+    def close(self):
+        """Close all streams and release the backend."""
+        with self.lock:
+            if self.output_stream is not None:
+                self.output_stream.stop_stream()
+                self.output_stream.close()
+                self.output_stream = None
+            if self.input_stream is not None:
+                self.input_stream.stop_stream()
+                self.input_stream.close()
+                self.input_stream = None
+                self.input_active = False
+            if self._backend is not None:
+                self._backend.terminate()
+                self._backend = None
+
+
+_device_manager = None
+_device_manager_lock = threading.Lock()
+
+
+def get_device_manager():
+    """Return the process-wide AudioDeviceManager, creating it on first use."""
+    global _device_manager
+    with _device_manager_lock:
+        if _device_manager is None:
+            _device_manager = AudioDeviceManager()
+        return _device_manager
+
+
+def set_device_manager(manager):
+    """Replace the process-wide AudioDeviceManager, e.g. with one on a NullBackend."""
+    global _device_manager
+    with _device_manager_lock:
+        _device_manager = manager
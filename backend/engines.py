@@ -0,0 +1,217 @@
+import json
+import multiprocessing
+import threading
+import time
+from collections import deque
+import speech_recognition
+from .utils import load_factory, percentile
+
+class Engine:
+    """
+    Base class for speech recognition engines used by Transcriber.
+
+    Subclasses implement `_recognize(audio)`, which takes an AudioData object and returns the
+    text, raising speech_recognition.UnknownValueError when no speech was understood and
+    RequestError when the engine could not be reached. Every call is timed for `stats()`.
+    """
+
+    name = "engine"
+    upload = False  # Whether audio is sent over the network, and so worth FLAC-encoding first
+
+    def __init__(self, history=1000):
+        self.latencies = deque(maxlen=history)  # Seconds per call
+        self.rtfs = deque(maxlen=history)  # Real-time factor: processing time / audio duration
+        self.lock = threading.Lock()
+
+    def recognize(self, audio):
+        """Transcribe an AudioData object and record how long it took."""
+        start = time.perf_counter()
+        try:
+            return self._recognize(audio)
+        finally:
+            latency = time.perf_counter() - start
+            seconds = len(audio.frame_data) / float(audio.sample_rate * audio.sample_width)
+            with self.lock:
+                self.latencies.append(latency)
+                if seconds:
+                    self.rtfs.append(latency / seconds)
+
+    def _recognize(self, audio):
+        raise NotImplementedError
+
+    def stats(self):
+        """Return the call count, latency percentiles and mean real-time factor of recent calls."""
+        with self.lock:
+            latencies = list(self.latencies)
+            rtfs = list(self.rtfs)
+        return {
+            "engine": self.name,
+            "calls": len(latencies),
+            "latency_mean_s": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_p50_s": percentile(latencies, 0.50),
+            "latency_p95_s": percentile(latencies, 0.95),
+            "rtf_mean": sum(rtfs) / len(rtfs) if rtfs else 0.0,
+        }
+
+    def close(self):
+        """Release the engine's resources."""
+
+
+class GoogleEngine(Engine):
+    """Engine that sends audio to the Google Web Speech API."""
+
+    name = "google"
+    upload = True
+
+    def __init__(self, recognizer=None):
+        super().__init__()
+        self.recognizer = recognizer if recognizer is not None else speech_recognition.Recognizer()
+
+    def _recognize(self, audio):
+        return self.recognizer.recognize_google(audio)
+
+
+def _serve(factory_spec, options, connection, warmup_pcm, rate):
+    """Worker process loop: load the recognizer once, warm it up, then answer requests until told to stop."""
+    try:
+        recognize = load_factory(factory_spec)(**options)
+        if warmup_pcm:
+            recognize(warmup_pcm, rate, 2)
+    except Exception as e:
+        connection.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    connection.send(("ready", None))
+
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return  # The parent went away
+        if request is None:
+            return
+        pcm, rate, sample_width = request
+        try:
+            connection.send(("ok", recognize(pcm, rate, sample_width)))
+        except Exception as e:
+            connection.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class LocalEngine(Engine):
+    """
+    Engine that runs a CPU-only recognizer in a persistent worker process.
+
+    The worker is started (and its model loaded and warmed up) when the engine is created, so
+    it's ready by the time the first take is recorded. `factory` is a "module:function" that is
+    called once in the worker with `options` and returns `recognize(pcm, rate, sample_width)`,
+    which returns the text, or "" when nothing was understood. Audio is converted to `rate`
+    16-bit mono before it is sent.
+    """
+
+    def __init__(self, factory, options=None, name="local", rate=16000, timeout=30.0):
+        super().__init__()
+        self.factory = factory
+        self.options = options or {}
+        self.name = name
+        self.rate = rate
+        self.timeout = timeout  # Seconds to wait for one transcription before restarting the worker
+        self.process = None
+        self.connection = None
+        self.ready = False
+        self.call_lock = threading.Lock()  # One request in flight per worker
+        self.start()
+
+    def start(self):
+        """Start the worker process. It loads its model in the background."""
+        context = multiprocessing.get_context("spawn")  # Forking a process that has threads is unsafe
+        self.connection, child_connection = context.Pipe()
+        warmup_pcm = bytes(self.rate // 2 * 2)  # Half a second of silence
+        self.process = context.Process(target=_serve, daemon=True, name=f"{self.name}-asr",
+                                       args=(self.factory, self.options, child_connection, warmup_pcm, self.rate))
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+
+    def _receive(self, timeout):
+        if not self.connection.poll(timeout):
+            raise TimeoutError(f"{self.name} engine did not answer within {timeout} s")
+        return self.connection.recv()
+
+    def _recognize(self, audio):
+        pcm = audio.get_raw_data(convert_rate=self.rate, convert_width=2)
+        with self.call_lock:
+            try:
+                if not self.ready:
+                    status, message = self._receive(self.timeout)
+                    if status != "ready":
+                        raise RuntimeError(message)
+                    self.ready = True
+                self.connection.send((pcm, self.rate, 2))
+                status, result = self._receive(self.timeout)
+            except (OSError, EOFError, TimeoutError, RuntimeError) as e:
+                # The worker died, hung or failed to load; start a fresh one for the next call
+                self._stop()
+                self.start()
+                raise speech_recognition.RequestError(f"{self.name} engine failed: {e}")
+
+        if status != "ok":
+            raise speech_recognition.RequestError(result)
+        if not result:
+            raise speech_recognition.UnknownValueError()
+        return result
+
+    def _stop(self):
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+    def close(self):
+        """Stop the worker process."""
+        with self.call_lock:
+            if self.process is not None:
+                self._stop()
+                self.process = None
+
+
+def vosk_recognizer(model_path=None):
+    """Worker-side factory for a Vosk (Kaldi) recognizer. Needs `pip install vosk` and a model."""
+    import vosk
+
+    vosk.SetLogLevel(-1)
+    model = vosk.Model(model_path) if model_path else vosk.Model(lang="en-us")
+
+    def recognize(pcm, rate, sample_width):
+        recognizer = vosk.KaldiRecognizer(model, rate)
+        recognizer.AcceptWaveform(bytes(pcm))
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+    return recognize
+
+
+def sphinx_recognizer(language="en-US"):
+    """Worker-side factory for CMU PocketSphinx. Needs `pip install pocketsphinx`."""
+    recognizer = speech_recognition.Recognizer()
+
+    def recognize(pcm, rate, sample_width):
+        try:
+            return recognizer.recognize_sphinx(speech_recognition.AudioData(pcm, rate, sample_width), language=language)
+        except speech_recognition.UnknownValueError:
+            return ""
+
+    return recognize
+
+
+def create_engine(name, **options):
+    """Create an engine by name: "google", "vosk" (options: model_path) or "sphinx" (options: language)."""
+    if name == "google":
+        return GoogleEngine(**options)
+    if name == "vosk":
+        return LocalEngine("backend.engines:vosk_recognizer", options, name="vosk")
+    if name == "sphinx":
+        return LocalEngine("backend.engines:sphinx_recognizer", options, name="sphinx")
+    raise ValueError(f"Unknown speech recognition engine {name!r}")
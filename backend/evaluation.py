@@ -0,0 +1,361 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from difflib import SequenceMatcher
+import numpy as np
+from .alignment import PUNCTUATION
+
+COUNTS = ("reference_words", "hits", "substitutions", "deletions", "insertions", "reference_chars", "char_edits",
+          "reference_nouns", "nouns_found")
+MAX_CHAR_CELLS = 4_000_000  # Largest character edit distance table worked out in full
+MAX_WORD_CELLS = 4_000_000  # Largest word alignment table held in memory (16 MB)
+
+
+def words(text):
+    """Split a transcript into words to score, ignoring case and punctuation."""
+    return [word for word in (PUNCTUATION.sub("", word.lower()) for word in text.split()) if word]
+
+
+def _encode(reference, hypothesis):
+    """Map the tokens of both sequences to integer ids, so they can be compared as arrays."""
+    ids = {}
+    return (np.array([ids.setdefault(token, len(ids)) for token in reference], dtype=np.int64),
+            np.array([ids.setdefault(token, len(ids)) for token in hypothesis], dtype=np.int64))
+
+
+def _next_row(previous, token, hypothesis, columns, row_number):
+    """One row of the Levenshtein table, computed for the whole row at once."""
+    row = np.empty_like(previous)
+    row[0] = row_number
+    row[1:] = np.minimum(previous[1:] + 1, previous[:-1] + (hypothesis != token))
+    # Insertions chain along the row: row[j] = min over k <= j of row[k] + (j - k)
+    return np.minimum.accumulate(row - columns) + columns
+
+
+def _trim(reference, hypothesis):
+    """Return the lengths of the common prefix and suffix, which the table doesn't need to cover."""
+    limit = min(len(reference), len(hypothesis))
+    prefix = 0
+    while prefix < limit and reference[prefix] == hypothesis[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and reference[-1 - suffix] == hypothesis[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+def _last_row(reference, hypothesis):
+    """The last row of the Levenshtein table of two encoded sequences, keeping only two rows at a time."""
+    columns = np.arange(len(hypothesis) + 1, dtype=np.int64)
+    row = columns
+    for i, token in enumerate(reference, 1):
+        row = _next_row(row, token, hypothesis, columns, i)
+    return row
+
+
+def edit_distance(reference, hypothesis):
+    """Levenshtein distance between two sequences, keeping only two rows of the table."""
+    prefix, suffix = _trim(reference, hypothesis)
+    reference, hypothesis = _encode(reference[prefix:len(reference) - suffix],
+                                    hypothesis[prefix:len(hypothesis) - suffix])
+    return int(_last_row(reference, hypothesis)[-1])
+
+
+def _align_table(reference, hypothesis, i0, j0, ops):
+    """Align two encoded sequences through their full table, appending ops offset by (i0, j0)."""
+    columns = np.arange(len(hypothesis) + 1, dtype=np.int64)
+    table = np.empty((len(reference) + 1, len(hypothesis) + 1), dtype=np.int32)
+    table[0] = columns
+    for i, token in enumerate(reference, 1):
+        table[i] = _next_row(table[i - 1].astype(np.int64), token, hypothesis, columns, i)
+
+    # Walk back from the end of the table along a cheapest path
+    reference, hypothesis = reference.tolist(), hypothesis.tolist()
+    path = []
+    i, j = len(reference), len(hypothesis)
+    while i or j:
+        cost = table.item(i, j)
+        if i and j and cost == table.item(i - 1, j - 1) + (reference[i - 1] != hypothesis[j - 1]):
+            op = "equal" if reference[i - 1] == hypothesis[j - 1] else "substitute"
+            path.append((op, i0 + i - 1, j0 + j - 1))
+            i, j = i - 1, j - 1
+        elif i and cost == table.item(i - 1, j) + 1:
+            path.append(("delete", i0 + i - 1, None))
+            i -= 1
+        else:
+            path.append(("insert", None, j0 + j - 1))
+            j -= 1
+    ops.extend(reversed(path))
+
+
+def _hirschberg(reference, hypothesis, i0, j0, ops):
+    """
+    Align two encoded sequences exactly in linear memory: split the reference in half, find
+    where a cheapest path crosses the middle from the last rows computed forwards and
+    backwards, and align each side, until the pieces' tables fit under MAX_WORD_CELLS.
+    """
+    if len(reference) * len(hypothesis) <= MAX_WORD_CELLS or len(reference) < 2:
+        _align_table(reference, hypothesis, i0, j0, ops)
+        return
+    middle = len(reference) // 2
+    forward = _last_row(reference[:middle], hypothesis)
+    backward = _last_row(reference[middle:][::-1], hypothesis[::-1])[::-1]
+    split = int(np.argmin(forward + backward))
+    _hirschberg(reference[:middle], hypothesis[:split], i0, j0, ops)
+    _hirschberg(reference[middle:], hypothesis[split:], i0 + middle, j0 + split, ops)
+
+
+def _anchors(reference, hypothesis):
+    """
+    Return (i, j) pairs of words that occur exactly once in each encoded sequence, the longest
+    run of them in the same order in both (as in patience diff).
+    """
+    counts = np.bincount(reference, minlength=max(reference.max(), hypothesis.max()) + 1)
+    other_counts = np.bincount(hypothesis, minlength=len(counts))
+    unique = (counts == 1) & (other_counts == 1)
+    where = np.full(len(counts), -1, dtype=np.int64)
+    where[hypothesis] = np.arange(len(hypothesis))
+    pairs = [(i, int(where[token])) for i, token in enumerate(reference.tolist()) if unique[token]]
+
+    # Longest increasing subsequence of the hypothesis positions
+    tails, tail_pairs, previous = [], [], []
+    for pair in pairs:
+        k = bisect_left(tails, pair[1])
+        previous.append(tail_pairs[k - 1] if k else None)
+        if k == len(tails):
+            tails.append(pair[1])
+            tail_pairs.append(len(previous) - 1)
+        else:
+            tails[k] = pair[1]
+            tail_pairs[k] = len(previous) - 1
+    chain = []
+    k = tail_pairs[-1] if tail_pairs else None
+    while k is not None:
+        chain.append(pairs[k])
+        k = previous[k]
+    return chain[::-1]
+
+
+def _common_runs(reference, hypothesis):
+    """Return the (i, j) pairs of the runs of words difflib finds in both encoded sequences."""
+    matcher = SequenceMatcher(None, reference.tolist(), hypothesis.tolist())
+    return [(i + k, j + k) for i, j, size in matcher.get_matching_blocks() for k in range(size)]
+
+
+def _align_long(reference, hypothesis, i0, j0, ops):
+    """Align two encoded sequences too long for one table, between words they share."""
+    prefix, suffix = _trim(reference, hypothesis)
+    ops += [("equal", i0 + k, j0 + k) for k in range(prefix)]
+    middle_reference = reference[prefix:len(reference) - suffix]
+    middle_hypothesis = hypothesis[prefix:len(hypothesis) - suffix]
+    if len(middle_reference) * len(middle_hypothesis) <= MAX_WORD_CELLS:
+        _align_table(middle_reference, middle_hypothesis, i0 + prefix, j0 + prefix, ops)
+    else:
+        anchors = []
+        if len(middle_reference) and len(middle_hypothesis):
+            anchors = _anchors(middle_reference, middle_hypothesis) or _common_runs(middle_reference, middle_hypothesis)
+        if not anchors:
+            _hirschberg(middle_reference, middle_hypothesis, i0 + prefix, j0 + prefix, ops)
+        else:
+            i = j = 0
+            for anchor_i, anchor_j in anchors + [(len(middle_reference), len(middle_hypothesis))]:
+                _align_long(middle_reference[i:anchor_i], middle_hypothesis[j:anchor_j],
+                            i0 + prefix + i, j0 + prefix + j, ops)
+                if anchor_i < len(middle_reference):
+                    ops.append(("equal", i0 + prefix + anchor_i, j0 + prefix + anchor_j))
+                i, j = anchor_i + 1, anchor_j + 1
+    ops += [("equal", i0 + len(reference) - k, j0 + len(hypothesis) - k) for k in range(suffix, 0, -1)]
+
+
+def align(reference, hypothesis):
+    """
+    Align two word sequences by minimum edit distance. Returns a list of (op, reference_index,
+    hypothesis_index), op being "equal", "substitute", "delete" (no hypothesis index) or
+    "insert" (no reference index).
+
+    Past MAX_WORD_CELLS, as for long dictations, the sequences are first lined up on the words
+    that occur once in each (or failing that, on the runs difflib finds in both), and only the
+    pieces in between are aligned, exactly and in linear memory, so the cost follows the
+    errors rather than the length of the text. That path isn't guaranteed to be the cheapest,
+    so long transcripts can come out with a few more errors.
+    """
+    ops = []
+    _align_long(*_encode(reference, hypothesis), 0, 0, ops)
+    return ops
+
+
+def char_edits(reference_words, hypothesis_words, ops):
+    """
+    Character edits between the two transcripts, words joined by single spaces.
+
+    This is the exact edit distance unless its table would pass MAX_CHAR_CELLS, as for long
+    dictations. Then only the runs of words that the word alignment `ops` found to differ are
+    compared, so the cost follows the errors rather than the length of the text; as character
+    alignments across matching words aren't considered, that can come out a little higher.
+    """
+    reference_text, hypothesis_text = ' '.join(reference_words), ' '.join(hypothesis_words)
+    if len(reference_text) * len(hypothesis_text) <= MAX_CHAR_CELLS:
+        return edit_distance(reference_text, hypothesis_text)
+
+    edits = 0
+    run_reference, run_hypothesis = [], []
+    for op, i, j in ops + [("equal", None, None)]:
+        if op != "equal":
+            if i is not None:
+                run_reference.append(reference_words[i])
+            if j is not None:
+                run_hypothesis.append(hypothesis_words[j])
+            continue
+        if run_reference or run_hypothesis:
+            edits += edit_distance(' '.join(run_reference), ' '.join(run_hypothesis))
+            if (not run_reference and len(hypothesis_words) > len(run_hypothesis)) or \
+                    (not run_hypothesis and len(reference_words) > len(run_reference)):
+                edits += 1  # The space that went with the inserted or deleted words
+            run_reference, run_hypothesis = [], []
+    return edits
+
+
+def noun_matches(reference_nouns, hypothesis_nouns):
+    """Return how many of the reference proper nouns were also found in the hypothesis."""
+    found = {' '.join(words(noun)) for noun in hypothesis_nouns}
+    return sum(' '.join(words(noun)) in found for noun in reference_nouns)
+
+
+def score(reference, hypothesis, reference_nouns=None, hypothesis_nouns=None):
+    """
+    Score a hypothesis transcript against its reference. Returns the counts in COUNTS plus
+    "wer" and "cer" as fractions, and "noun_recall" when both noun lists are given. Characters
+    are counted on the words as scored, joined by single spaces; see char_edits.
+    """
+    reference_words, hypothesis_words = words(reference), words(hypothesis)
+    result = dict.fromkeys(COUNTS, 0)
+    result["reference_words"] = len(reference_words)
+    ops = align(reference_words, hypothesis_words)
+    for op, _, _ in ops:
+        result[{"equal": "hits", "substitute": "substitutions", "delete": "deletions",
+                "insert": "insertions"}[op]] += 1
+
+    result["reference_chars"] = len(' '.join(reference_words))
+    result["char_edits"] = char_edits(reference_words, hypothesis_words, ops)
+    if reference_nouns is not None and hypothesis_nouns is not None:
+        result["reference_nouns"] = len(reference_nouns)
+        result["nouns_found"] = noun_matches(reference_nouns, hypothesis_nouns)
+    return rates(result)
+
+
+def rates(counts):
+    """Add WER, CER and proper-noun recall to a dict of (summed) counts."""
+    errors = counts["substitutions"] + counts["deletions"] + counts["insertions"]
+    counts["wer"] = errors / counts["reference_words"] if counts["reference_words"] else float(errors > 0)
+    counts["cer"] = counts["char_edits"] / counts["reference_chars"] if counts["reference_chars"] else \
+        float(counts["char_edits"] > 0)
+    if counts["reference_nouns"]:
+        counts["noun_recall"] = counts["nouns_found"] / counts["reference_nouns"]
+    return counts
+
+
+def _score_item(item):
+    record = {"id": item["id"]}
+    record.update(score(item["reference"], item["hypothesis"], item.get("reference_nouns"),
+                        item.get("hypothesis_nouns")))
+    return record
+
+
+def load_references(source):
+    """
+    Load reference transcripts from a JSONL file of {"path", "text"[, "proper_nouns"]} records,
+    or from the .txt file next to each WAV file in a directory. Returns {wav_path: record}.
+    """
+    references = {}
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(".txt"):
+                    with open(os.path.join(root, name)) as f:
+                        path = os.path.join(root, name[:-4] + ".wav")
+                        references[os.path.abspath(path)] = {"path": path, "text": f.read().strip()}
+        return references
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                references[os.path.abspath(os.path.join(base, record["path"]))] = record
+    return references
+
+
+def load_hypotheses(path):
+    """Load the successful transcripts of a batch_transcribe.py output. Returns {wav_path: text}."""
+    hypotheses = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash
+            if record.get("status") == "ok":
+                hypotheses[os.path.abspath(record["path"])] = record["text"]
+    return hypotheses
+
+
+class CorpusEvaluator:
+    """Class that scores many hypothesis transcripts against their references in parallel."""
+
+    def __init__(self, workers=None, extract_proper_nouns=None, ner_workers=4):
+        """
+        Initialize the evaluator.
+
+        Alignments are spread over `workers` processes (all cores by default; 1 to score in this
+        process). If `extract_proper_nouns` is given, e.g. NERManager.extract_proper_nouns, it is
+        run on `ner_workers` threads to find the nouns of each hypothesis, and of each reference
+        that doesn't list its own, and proper-noun recall is reported.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.extract_proper_nouns = extract_proper_nouns
+        self.ner_workers = ner_workers
+
+    def _add_nouns(self, items):
+        jobs = []
+        with ThreadPoolExecutor(max_workers=self.ner_workers) as pool:
+            for item in items:
+                if item.get("reference_nouns") is None:
+                    jobs.append((item, "reference_nouns", pool.submit(self.extract_proper_nouns, item["reference"])))
+                jobs.append((item, "hypothesis_nouns", pool.submit(self.extract_proper_nouns, item["hypothesis"])))
+            for item, key, future in jobs:
+                try:
+                    item[key] = future.result()
+                except Exception as e:
+                    print(f"Could not extract proper nouns for {item['id']}: {e}")
+
+    def run(self, items, progress=None):
+        """
+        Score dicts of {"id", "reference", "hypothesis"[, "reference_nouns"]}. Returns the record
+        of each item, in order, and a summary with the corpus-wide rates.
+        """
+        items = [dict(item) for item in items]
+        start = time.perf_counter()
+        if self.extract_proper_nouns is not None:
+            self._add_nouns(items)
+
+        if self.workers > 1 and len(items) > 1:
+            chunksize = max(1, len(items) // (self.workers * 4))
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                records = []
+                for record in pool.map(_score_item, items, chunksize=chunksize):
+                    records.append(record)
+                    if progress is not None:
+                        progress(record)
+        else:
+            records = []
+            for item in items:
+                records.append(_score_item(item))
+                if progress is not None:
+                    progress(records[-1])
+
+        summary = rates({key: sum(record[key] for record in records) for key in COUNTS})
+        summary["utterances"] = len(records)
+        summary["elapsed_s"] = round(time.perf_counter() - start, 3)
+        return records, summary
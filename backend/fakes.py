@@ -0,0 +1,200 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .engines import Engine
+from .ner_manager import NERManager
+from .playback import Playback
+from .transcriber import Transcriber
+from .tts import TTSProvider
+from .tts_cache import TTSCache
+from .utils import AudioClip
+
+# Local stand-in engines with configurable latency, for tests and benchmarks that must run offline
+
+class Latency:
+    """A delay of `base` seconds plus uniform random jitter of up to `jitter` seconds."""
+
+    def __init__(self, base=0.0, jitter=0.0, seed=None):
+        self.base = base
+        self.jitter = jitter
+        self.random = random.Random(seed)
+
+    def sample(self):
+        return max(0.0, self.base + self.random.uniform(-self.jitter, self.jitter))
+
+    def wait(self):
+        time.sleep(self.sample())
+
+
+class FakeEngine(Engine):
+    """Engine that returns canned text after a simulated network delay."""
+
+    name = "fake"
+
+    def __init__(self, text="I met Vik Srinivasan in Palo Alto near Stanford", latency=None, per_second=0.0):
+        """`per_second` adds that many seconds of latency per second of audio."""
+        super().__init__()
+        self.text = text
+        self.latency = latency or Latency()
+        self.per_second = per_second
+        self.calls = 0
+
+    def _recognize(self, audio):
+        self.calls += 1
+        seconds = len(audio.frame_data) / float(audio.sample_rate * audio.sample_width)
+        time.sleep(self.latency.sample() + self.per_second * seconds)
+        return self.text
+
+
+class FakeTranscriber(Transcriber):
+    """Transcriber on a FakeEngine."""
+
+    def __init__(self, text="I met Vik Srinivasan in Palo Alto near Stanford", latency=None, per_second=0.0):
+        super().__init__(engine=FakeEngine(text, latency, per_second))
+
+    @property
+    def text(self):
+        return self.engine.text
+
+    @property
+    def calls(self):
+        return self.engine.calls
+
+
+DEFAULT_CORRECTION = "I met Vik Srinivasan in Palo Alto near Stanford"
+DEFAULT_NOUNS = ("Vik Srinivasan", "Palo Alto", "Stanford")
+
+
+def canned_llm_response(prompt, generation_config=None, proper_nouns=DEFAULT_NOUNS, corrected_transcription=None):
+    """Answer a NERManager prompt the way the real LLM would, from canned data."""
+    corrected_transcription = corrected_transcription or DEFAULT_CORRECTION
+    if generation_config and generation_config.get("response_mime_type") == "application/json":
+        return json.dumps({"corrected_transcription": corrected_transcription, "proper_nouns": list(proper_nouns)})
+    if prompt.startswith("You are an assistant that corrects"):
+        return corrected_transcription
+    return json.dumps(list(proper_nouns))
+
+
+class FakeNERManager(NERManager):
+    """NERManager whose LLM answers from canned data after a simulated delay."""
+
+    def __init__(self, proper_nouns=DEFAULT_NOUNS, corrected_transcription=None, latency=None):
+        super().__init__()
+        self.canned_nouns = list(proper_nouns)
+        self.corrected_transcription = corrected_transcription
+        self.latency = latency or Latency()
+        self.calls = 0
+
+    def warm_up(self):
+        pass  # There is no model to load
+
+    def call_gpt_api(self, prompt, generation_config=None):
+        self.calls += 1
+        self.latency.wait()
+        return canned_llm_response(prompt, generation_config, self.canned_nouns, self.corrected_transcription)
+
+
+class FakeLLMServer:
+    """
+    Local HTTP stand-in for the LLM API, for driving LLMClient through an HTTPTransport.
+
+    Answers like FakeNERManager after `latency`. Queue HTTP statuses with fail_next() to make the
+    next requests fail, or set `fail_rate` to fail that fraction of requests with `fail_status`.
+    """
+
+    def __init__(self, latency=None, fail_rate=0.0, fail_status=503, retry_after=None, seed=None):
+        self.latency = latency or Latency()
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.retry_after = retry_after  # Sent as Retry-After on failures
+        self.random = random.Random(seed)
+        self.failures = deque()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep connections alive, like the real API
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, reply = server.respond(body)
+                data = reply if isinstance(reply, bytes) else json.dumps(reply).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    if status != 200 and server.retry_after is not None:
+                        self.send_header("Retry-After", str(server.retry_after))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client timed out and hung up
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/generate"
+
+    def fail_next(self, *statuses):
+        """Answer the next requests with these HTTP statuses; a 200 comes with a body that isn't JSON."""
+        with self.lock:
+            self.failures.extend(statuses)
+
+    def respond(self, body):
+        with self.lock:
+            self.requests += 1
+            status = self.failures.popleft() if self.failures else None
+            if status is None and self.fail_rate and self.random.random() < self.fail_rate:
+                status = self.fail_status
+        self.latency.wait()
+        if status == 200:
+            return status, b'{"text": "cut sho'
+        if status is not None:
+            return status, {"error": f"injected {status}"}
+        return 200, {"text": canned_llm_response(body["prompt"], body.get("generation_config"))}
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeTTSProvider(TTSProvider):
+    """TTS provider whose speech is silence, synthesized after a simulated delay."""
+
+    name = "fake"
+
+    def __init__(self, latency=None, seconds_per_char=0.06, rate=24000):
+        self.latency = latency or Latency()
+        self.seconds_per_char = seconds_per_char
+        self.rate = rate
+        self.calls = 0
+
+    def synthesize(self, text, lang):
+        self.calls += 1
+        self.latency.wait()
+        frames = int(len(text) * self.seconds_per_char * self.rate)
+        return AudioClip(bytes(frames * 2), 2, 1, self.rate)
+
+
+class FakePlayback(Playback):
+    """Playback on a FakeTTSProvider, with an in-memory cache."""
+
+    def __init__(self, latency=None, seconds_per_char=0.06, rate=24000, device=None, cache=None):
+        super().__init__(cache=cache if cache is not None else TTSCache(cache_dir=None), device=device,
+                         provider=FakeTTSProvider(latency, seconds_per_char, rate))
+
+    @property
+    def calls(self):
+        return self.provider.calls
@@ -0,0 +1,421 @@
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+from difflib import SequenceMatcher
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "voice_dictation", "gazetteer.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+VOWELS = set("AEIOUY")
+WORD = re.compile(r"\S+")
+TRAILING_PUNCTUATION = ".,!?;:\"'’)"
+BREAK = re.compile(r"[.,!?;:\"'’)]$|[.,!?;:]\s")  # Punctuation a misrecognized name would not span
+SENTENCE_END = re.compile(r"[.!?][\"'’)]*$")
+
+
+def _load_common_words():
+    with open(os.path.join(os.path.dirname(__file__), "common_words.txt")) as f:
+        return frozenset(line.strip() for line in f if line.strip())
+
+
+COMMON_WORDS = _load_common_words()  # Everyday English words, which are never snapped to a name
+
+
+def is_common_word(word):
+    """Return whether `word`, or the word it inflects ("rows", "walked"), is an everyday English word."""
+    word = word.lower().strip(TRAILING_PUNCTUATION)
+    if word in COMMON_WORDS:
+        return True
+    for suffix in ("s", "es", "ed", "ing", "ly"):
+        if word.endswith(suffix) and word[:-len(suffix)] in COMMON_WORDS:
+            return True
+    return False
+
+
+def phonetic_keys(word, length=6):
+    """
+    Return the (primary, alternate) sound-alike keys of a word, in the style of Double Metaphone:
+    letters that sound alike map to one code ("Vic" and "Vik" are both FK), silent letters are
+    dropped and only a leading vowel is kept. Where a spelling has two common pronunciations
+    (the CH in "Michael", a soft or hard G) the alternate key takes the other one.
+    """
+    w = re.sub(r"[^A-Z]", "", word.upper())
+    if not w:
+        return "", ""
+    primary, alternate = [], []
+
+    def add(main, alt=None):
+        primary.append(main)
+        alternate.append(main if alt is None else alt)
+
+    def at(i, *options):
+        return any(w.startswith(option, i) for option in options)
+
+    i = 0
+    if at(0, "GN", "KN", "PN", "WR", "PS"):
+        i = 1
+    elif w[0] == "X":
+        add("S")
+        i = 1
+    elif at(0, "WH"):
+        add("W")
+        i = 2
+    if i == 0 and w[0] in VOWELS:
+        add("A")
+        i = 1
+
+    while i < len(w):
+        c = w[i]
+        if i and c == w[i - 1] and c != "C":
+            i += 1  # Doubled letters sound like one
+            continue
+        following = w[i + 1] if i + 1 < len(w) else ""
+        if c in VOWELS:
+            pass
+        elif c == "B":
+            if not (i == len(w) - 1 and i and w[i - 1] == "M"):  # The B in "Lamb" is silent
+                add("P")
+        elif c == "C":
+            if at(i, "CH"):
+                add("X", "K")
+                i += 1
+            elif at(i, "CIA", "CIO"):
+                add("X")
+            elif following in ("I", "E", "Y"):
+                add("S")
+            elif at(i, "CK", "CQ", "CG"):
+                add("K")
+                i += 1
+            else:
+                add("K")
+        elif c == "D":
+            if at(i, "DGE", "DGI", "DGY"):
+                add("J")
+                i += 1
+            else:
+                add("T")
+        elif c == "G":
+            if following == "H":
+                if i + 2 < len(w) and w[i + 2] in VOWELS and not (i and w[i - 1] in VOWELS):
+                    add("K")  # "Ghana"
+                i += 1  # Otherwise silent, as in "Leigh" or "Knight"
+            elif following == "N":
+                pass  # "Signe", "Gnome"
+            elif following in ("I", "E", "Y"):
+                add("J", "K")
+            else:
+                add("K")
+        elif c == "H":
+            if following in VOWELS and not (i and w[i - 1] in "CGPST"):
+                add("H")
+        elif c == "J":
+            add("J", "H")  # "Jose"
+        elif c == "K":
+            if not (i and w[i - 1] == "C"):
+                add("K")
+        elif c == "P":
+            if following == "H":
+                add("F")
+                i += 1
+            else:
+                add("P")
+        elif c == "Q":
+            add("K")
+        elif c == "S":
+            if at(i, "SH"):
+                add("X")
+                i += 1
+            elif at(i, "SIO", "SIA"):
+                add("X", "S")
+            elif at(i, "SCH"):
+                add("SK", "X")
+                i += 2
+            else:
+                add("S")
+        elif c == "T":
+            if at(i, "TH"):
+                add("0", "T")
+                i += 1
+            elif at(i, "TIO", "TIA"):
+                add("X")
+            elif at(i, "TCH"):
+                pass
+            else:
+                add("T")
+        elif c == "V":
+            add("F")
+        elif c == "W":
+            if following in VOWELS:
+                add("W", "F")  # "Wagner"
+        elif c == "X":
+            add("KS")
+        elif c == "Z":
+            add("S")
+        else:
+            add(c)  # F, L, M, N, R
+        i += 1
+
+    return "".join(primary)[:length], "".join(alternate)[:length]
+
+
+def phrase_keys(phrase):
+    """Return the distinct keys of a multi-word phrase, one code per word separated by spaces."""
+    words = [phonetic_keys(word) for word in phrase.split()]
+    primary = " ".join(key for key, _ in words)
+    alternate = " ".join(key for _, key in words)
+    return (primary,) if primary == alternate else (primary, alternate)
+
+
+class Gazetteer:
+    """
+    Persistent store of the proper nouns seen so far, for matching names locally.
+
+    Each name has a sighting count and a weight that halves every `half_life_days` without a
+    sighting. Names are indexed by exact spelling, by sound-alike key (so a misrecognized "Vic
+    Srinivasan" finds "Vik Srinivasan") and by lowercased prefix. The indexes live in memory and
+    the names in SQLite at `path`, or only in memory if `path` is None.
+    """
+
+    def __init__(self, path=None, half_life_days=90.0, min_weight=0.5, min_count=2, clock=time.time):
+        self.path = path
+        self.half_life = half_life_days * 86400
+        self.min_weight = min_weight  # Names that decay below this no longer match and are pruned
+        self.min_count = min_count  # Names seen fewer times than this are not trusted to match others
+        self.clock = clock
+        self.entries = {}  # name -> [count, weight, updated]
+        self.phonetic = {}  # phonetic key -> set of names
+        self.prefixes = []  # sorted (lowercased name, name)
+        self.max_words = 1  # Words in the longest name, which bounds the n-grams worth looking up
+        self.counts = {}  # name -> times seen, the view NERManager exposes as its memory
+        self.lock = threading.RLock()
+
+        self.db = None
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            with self.lock, self.db:
+                self.db.execute("PRAGMA journal_mode=WAL")
+                self.db.execute("PRAGMA synchronous=NORMAL")
+                self.db.executescript(SCHEMA)
+                rows = self.db.execute("SELECT name, count, weight, updated FROM names").fetchall()
+            for name, count, weight, updated in rows:
+                self._index(name, [count, weight, updated])
+            self.prefixes.sort()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def _index(self, name, entry, sort=False):
+        self.entries[name] = entry
+        self.counts[name] = entry[0]
+        for key in phrase_keys(name):
+            self.phonetic.setdefault(key, set()).add(name)
+        item = (name.lower(), name)
+        if sort:
+            insort(self.prefixes, item)
+        else:
+            self.prefixes.append(item)
+        self.max_words = max(self.max_words, len(name.split()))
+
+    def _decayed(self, entry, now):
+        count, weight, updated = entry
+        return weight * math.pow(0.5, max(0.0, now - updated) / self.half_life)
+
+    def add(self, names, count=1):
+        """Record sightings of names, bumping their decayed weight by `count` each."""
+        now = self.clock()
+        rows = []
+        with self.lock:
+            for name in names:
+                name = " ".join(name.split())
+                if not name:
+                    continue
+                entry = self.entries.get(name)
+                if entry is None:
+                    entry = [count, float(count), now]
+                    self._index(name, entry, sort=True)
+                else:
+                    entry[1] = self._decayed(entry, now) + count
+                    entry[0] += count
+                    entry[2] = now
+                    self.counts[name] = entry[0]
+                rows.append((name, entry[0], entry[1], entry[2]))
+            if self.db is not None and rows:
+                with self.db:
+                    self.db.executemany("INSERT OR REPLACE INTO names (name, count, weight, updated) VALUES (?, ?, ?, ?)",
+                                        rows)
+
+    def weight(self, name):
+        """Return the current (decayed) weight of a name, or 0.0 if it is unknown."""
+        with self.lock:
+            entry = self.entries.get(name)
+            return 0.0 if entry is None else self._decayed(entry, self.clock())
+
+    def sounds_like(self, phrase, keys=None):
+        """Return the known names that sound like `phrase`, with their weights, heaviest first."""
+        now = self.clock()
+        with self.lock:
+            names = set()
+            for key in keys or phrase_keys(phrase):
+                names |= self.phonetic.get(key, set())
+            weighted = [(name, self._decayed(self.entries[name], now)) for name in names]
+        return sorted(weighted, key=lambda item: (-item[1], item[0]))
+
+    def complete(self, prefix, limit=10):
+        """Return up to `limit` known names starting with `prefix` (case-insensitively), heaviest first."""
+        prefix = prefix.lower()
+        now = self.clock()
+        with self.lock:
+            start = bisect_left(self.prefixes, (prefix,))
+            names = []
+            for lowered, name in self.prefixes[start:]:
+                if not lowered.startswith(prefix):
+                    break
+                names.append((self._decayed(self.entries[name], now), name))
+        return [name for _, name in heapq.nsmallest(limit, names, key=lambda item: (-item[0], item[1]))]
+
+    def match(self, phrase, min_similarity=0.6, keys=None):
+        """
+        Return the known name `phrase` was most likely meant to be, or None if there is no
+        confident match: a name that sounds the same, is spelled similarly, has been seen at
+        least `min_count` times, has not decayed away and clearly outweighs any other candidate.
+        """
+        if phrase in self.entries:
+            return phrase
+        words = len(phrase.split())
+        lowered = phrase.lower()
+        candidates = []
+        for name, weight in self.sounds_like(phrase, keys):
+            if weight < self.min_weight or self.counts[name] < self.min_count or len(name.split()) != words:
+                continue
+            similarity = SequenceMatcher(None, lowered, name.lower()).ratio()
+            if similarity >= min_similarity:
+                candidates.append((similarity * weight, name))
+        if not candidates:
+            return None
+        candidates.sort(reverse=True)
+        if len(candidates) > 1 and candidates[0][0] < 2 * candidates[1][0]:
+            return None  # Too close to call
+        return candidates[0][1]
+
+    def spans(self, text):
+        """
+        Yield (start, end, phrase, first, last) for every run of up to `max_words` words in
+        `text` (words `first` to `last`), plus the run with its trailing punctuation stripped
+        off, longest runs first at each position.
+        """
+        words = [(m.start(), m.end()) for m in WORD.finditer(text)]
+        for i in range(len(words)):
+            for j in range(min(len(words), i + self.max_words) - 1, i - 1, -1):
+                start, end = words[i][0], words[j][1]
+                phrase = text[start:end]
+                yield start, end, phrase, i, j
+                stripped = phrase.rstrip(TRAILING_PUNCTUATION)
+                if stripped and stripped != phrase:
+                    yield start, start + len(stripped), stripped, i, j
+
+    def find(self, text):
+        """Return (start, end, name) for every known name in `text`, longest first, not overlapping."""
+        found = []
+        covered_until = 0
+        with self.lock:
+            for start, end, phrase, _, _ in self.spans(text):
+                if start >= covered_until and phrase in self.entries:
+                    found.append((start, end, phrase))
+                    covered_until = end
+        return found
+
+    def snap(self, text, is_candidate=None):
+        """
+        Replace misrecognized names in `text` with the known names they confidently match.
+        `is_candidate(phrase)` picks which runs of words are worth matching; by default those
+        that start with a capital letter. A lone word starting a sentence, which is capitalized
+        whatever it is, and runs of everyday words ("Been there") are never replaced.
+        Returns (text, [(original, name), ...]).
+        """
+        if is_candidate is None:
+            is_candidate = lambda phrase: phrase[:1].isupper()
+        words = [m.group() for m in WORD.finditer(text)]
+        word_keys = [phonetic_keys(word) for word in words]  # Each word is encoded once
+        common = [is_common_word(word) for word in words]
+        sentence_starts = {0} | {i + 1 for i, word in enumerate(words) if SENTENCE_END.search(word)}
+        pieces = []
+        replacements = []
+        position = 0
+        for start, end, phrase, first, last in self.spans(text):
+            if start < position or not is_candidate(phrase) or BREAK.search(phrase):
+                continue
+            if first == last and first in sentence_starts:
+                continue
+            keys = {" ".join(key[k] for key in word_keys[first:last + 1]) for k in (0, 1)}
+            name = self.match(phrase, keys=keys)
+            if name is None or (name != phrase and all(common[first:last + 1])):
+                continue
+            if name != phrase:
+                pieces.append(text[position:start])
+                pieces.append(name)
+                replacements.append((phrase, name))
+            else:
+                pieces.append(text[position:end])
+            position = end
+        pieces.append(text[position:])
+        return "".join(pieces), replacements
+
+    def prune(self):
+        """Forget names whose weight has decayed below `min_weight`. Returns how many were removed."""
+        now = self.clock()
+        with self.lock:
+            stale = [name for name, entry in self.entries.items() if self._decayed(entry, now) < self.min_weight]
+            if not stale:
+                return 0
+            stale_set = set(stale)
+            for name in stale:
+                del self.entries[name]
+                del self.counts[name]
+                for key in phrase_keys(name):
+                    names = self.phonetic.get(key)
+                    if names is not None:
+                        names.discard(name)
+                        if not names:
+                            del self.phonetic[key]
+            self.prefixes = [item for item in self.prefixes if item[1] not in stale_set]
+            self.max_words = max((len(name.split()) for name in self.entries), default=1)
+            if self.db is not None:
+                with self.db:
+                    self.db.executemany("DELETE FROM names WHERE name = ?", [(name,) for name in stale])
+        return len(stale)
+
+    def clear(self):
+        """Forget every name."""
+        with self.lock:
+            self.entries.clear()
+            self.counts.clear()
+            self.phonetic.clear()
+            self.prefixes = []
+            self.max_words = 1
+            if self.db is not None:
+                with self.db:
+                    self.db.execute("DELETE FROM names")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,381 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from .metrics import span
+
+class LLMError(Exception):
+    """An LLM request failed for good: it was rejected, or every retry failed."""
+
+
+class TransientLLMError(LLMError):
+    """A failure worth retrying: a timeout, a dropped connection, a rate limit or a server error."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds the server asked us to wait, if it said
+
+
+class CircuitOpenError(LLMError):
+    """Raised without making a request while the circuit breaker is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"LLM circuit breaker is open, retry in {retry_after:.1f} s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Client-side rate limiter: `rate` requests per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token, going into debt if there is none. Returns how long to wait before using it."""
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def cancel(self):
+        """Give back a token that was reserved but not used."""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a token. Returns the seconds waited, or None without taking one if that would be
+        longer than `timeout`.
+        """
+        wait = self.reserve()
+        if timeout is not None and wait > timeout:
+            self.cancel()
+            return None
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests after `failure_threshold` failures in a row. After `reset_timeout`
+    seconds one trial request is let through: if it succeeds the circuit closes again, otherwise it
+    stays open for another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False  # Whether the trial request of a half-open circuit is in flight
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        """"closed", "open" or "half_open"."""
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half_open" if self.clock() - self.opened_at >= self.reset_timeout else "open"
+
+    def retry_after(self):
+        """Seconds until the next trial request is allowed."""
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - self.clock())
+
+    def allow(self):
+        """Return whether a request may be sent now."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at < self.reset_timeout or self.trial:
+                return False
+            self.trial = True
+            return True
+
+    def release(self):
+        """Give back the trial request of a half-open circuit that ended without a verdict on the API."""
+        with self.lock:
+            self.trial = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.trial = False
+
+
+_genai_lock = threading.Lock()
+_genai_key = None  # The key the Gemini client was last configured with
+
+
+def configure_genai(api_key=None):
+    """
+    Configure the Gemini client with `api_key`, or GOOGLE_KEY from the environment (or a .env
+    file). The client is process-wide, so this only reconfigures it when the key changes; it is
+    called when a model is first needed rather than at import.
+    """
+    import google.generativeai as genai
+    from dotenv import load_dotenv
+
+    global _genai_key
+    if api_key is None:
+        load_dotenv()
+        api_key = os.getenv('GOOGLE_KEY')
+    with _genai_lock:
+        if api_key != _genai_key:
+            genai.configure(api_key=api_key)
+            _genai_key = api_key
+
+
+class GeminiTransport:
+    """Sends prompts to a Gemini model, reusing one model (and its connection) for every request."""
+
+    def __init__(self, model_name="gemini-1.5-flash", api_key=None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.model = None
+        self.lock = threading.Lock()
+
+    def get_model(self):
+        import google.generativeai as genai  # Takes a second or more, so only once a model is needed
+
+        with self.lock:
+            if self.model is None:
+                configure_genai(self.api_key)
+                self.model = genai.GenerativeModel(self.model_name)
+            return self.model
+
+    def warm_up(self):
+        """Import the SDK and create the model ahead of the first request."""
+        self.get_model()
+
+    def generate(self, prompt, generation_config, timeout):
+        from google.api_core import exceptions
+        from google.auth import exceptions as auth_exceptions
+
+        try:
+            response = self.get_model().generate_content(prompt, generation_config=generation_config,
+                                                         request_options={"timeout": timeout})
+        except (exceptions.TooManyRequests, exceptions.ServerError, exceptions.DeadlineExceeded,
+                exceptions.Cancelled, exceptions.Aborted, auth_exceptions.TransportError,
+                ConnectionError, TimeoutError) as e:
+            raise TransientLLMError(f"{type(e).__name__}: {e}") from e
+        except (exceptions.GoogleAPIError, auth_exceptions.GoogleAuthError) as e:
+            # Includes a missing or invalid GOOGLE_KEY, which retrying won't fix
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        except OSError as e:  # Socket and requests errors not covered above
+            raise TransientLLMError(f"{type(e).__name__}: {e}") from e
+        except Exception as e:  # Anything else from the SDK, e.g. a bad configuration
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        try:
+            return response.text
+        except ValueError as e:  # The response was blocked or empty
+            raise LLMError(f"No text in response: {e}") from e
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date, or
+    None if it is missing or can't be read.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class HTTPTransport:
+    """
+    Sends prompts as JSON to a plain HTTP endpoint, e.g. backend.fakes.FakeLLMServer, over a
+    keep-alive connection pool.
+
+    The request body is {"prompt": ..., "generation_config": ...} and the reply {"text": ...}.
+    """
+
+    RETRYABLE = {408, 425, 429, 500, 502, 503, 504}
+
+    def __init__(self, url, pool_size=10):
+        import requests
+
+        self.url = url
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def generate(self, prompt, generation_config, timeout):
+        import requests
+
+        try:
+            response = self.session.post(self.url, json={"prompt": prompt, "generation_config": generation_config},
+                                         timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise TransientLLMError(f"{type(e).__name__}: {e}") from e
+
+        if response.status_code in self.RETRYABLE:
+            raise TransientLLMError(f"HTTP {response.status_code}",
+                                    retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        if response.status_code >= 400:
+            raise LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+        try:
+            return response.json()["text"]
+        except (ValueError, KeyError, TypeError) as e:
+            # A garbled or cut-off reply from the server (or a proxy in front of it); worth retrying
+            raise TransientLLMError(f"Malformed response: {type(e).__name__}: {e}") from e
+
+    def close(self):
+        self.session.close()
+
+
+class LLMClient:
+    """
+    Shared LLM client that keeps throughput steady when the API is slow or failing.
+
+    Every request waits for the token bucket (`rate` requests per second, bursts of `burst`),
+    gets `timeout` seconds per attempt and is retried on transient failures with full-jitter
+    exponential backoff, as long as the next attempt can start before `deadline` seconds have
+    passed. After `failure_threshold` failures in a row the circuit breaker opens and requests
+    fail straight away with CircuitOpenError for `reset_timeout` seconds, instead of adding to
+    an error storm.
+    """
+
+    def __init__(self, transport=None, timeout=10.0, deadline=30.0, max_retries=3, backoff=0.5, max_backoff=8.0,
+                 rate=4.0, burst=8, failure_threshold=5, reset_timeout=30.0, seed=None):
+        """`transport` sends one attempt; by default it is a GeminiTransport. `rate=None` disables rate limiting."""
+        self.transport = transport if transport is not None else GeminiTransport()
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.random = random.Random(seed)
+        self.counters = {"requests": 0, "attempts": 0, "retries": 0, "failures": 0, "rejected": 0}
+        self.lock = threading.Lock()
+
+    def _count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.counters[key] += value
+
+    def backoff_delay(self, retry):
+        """Full-jitter exponential backoff: uniform between 0 and backoff * 2^retry, capped."""
+        return self.random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+
+    def generate(self, prompt, generation_config=None, timeout=None, deadline=None):
+        """Return the model's text for `prompt`. Raises LLMError (or CircuitOpenError) if it can't be had."""
+        timeout = timeout or self.timeout
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        self._count(requests=1)
+        with span("llm_request", chars_in=len(prompt)) as request:
+            attempts = 0
+            throttled = 0.0
+            while True:
+                if not self.breaker.allow():
+                    self._count(rejected=1)
+                    request.set(attempts=attempts, retries=max(0, attempts - 1), throttled_s=throttled)
+                    raise CircuitOpenError(self.breaker.retry_after())
+
+                remaining = deadline_at - time.monotonic()
+                if self.bucket is not None:
+                    waited = self.bucket.acquire(timeout=remaining)
+                    if waited is None:
+                        self.breaker.release()
+                        self._count(failures=1)
+                        raise LLMError("Rate limit wait would pass the request deadline")
+                    throttled += waited
+                    remaining -= waited
+
+                attempts += 1
+                self._count(attempts=1, retries=int(attempts > 1))
+                request.set(attempts=attempts, retries=attempts - 1, throttled_s=throttled)
+                try:
+                    text = self.transport.generate(prompt, generation_config, max(0.1, min(timeout, remaining)))
+                except TransientLLMError as e:
+                    self.breaker.record_failure()
+                    delay = max(self.backoff_delay(attempts - 1), e.retry_after or 0.0)
+                    if attempts > self.max_retries or time.monotonic() + delay >= deadline_at:
+                        self._count(failures=1)
+                        raise
+                    print(f"LLM request failed ({e}), retrying in {delay:.2f} s")
+                    time.sleep(delay)
+                    continue
+                except LLMError:
+                    # The request itself was rejected; retrying won't help and the API is up
+                    self.breaker.record_success()
+                    self._count(failures=1)
+                    raise
+                except Exception:
+                    # A bug or an error the transport didn't map; count it against the API all the same
+                    self.breaker.record_failure()
+                    self._count(failures=1)
+                    raise
+                self.breaker.record_success()
+                request.set(chars_out=len(text))
+                return text
+
+    def warm_up(self):
+        """Get the transport ready ahead of the first request, if it has anything to load."""
+        if hasattr(self.transport, "warm_up"):
+            self.transport.warm_up()
+
+    def stats(self):
+        """Return request, attempt, retry, failure and rejection counts and the breaker state."""
+        with self.lock:
+            stats = dict(self.counters)
+        stats["circuit"] = self.breaker.state
+        return stats
+
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Return the process-wide LLMClient, creating it on first use."""
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient()
+        return _llm_client
+
+
+def set_llm_client(client):
+    """Replace the process-wide LLMClient, e.g. with one on an HTTPTransport to a fake server."""
+    global _llm_client
+    with _llm_client_lock:
+        _llm_client = client
@@ -0,0 +1,252 @@
+import atexit
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Span:
+    """The timing of one pipeline stage, plus what it processed (audio_seconds, bytes_in, ...)."""
+
+    __slots__ = ("name", "start", "duration", "attributes", "error")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, **attributes):
+        """Add or update attributes, e.g. once the size of the output is known."""
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        record = {"span": self.name, "start": round(self.start, 6), "duration_s": round(self.duration, 6)}
+        record.update(self.attributes)
+        if self.error is not None:
+            record["error"] = self.error
+        return record
+
+
+class Metrics:
+    """Class that times pipeline stages and hands each finished span to the registered sinks."""
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.lock = threading.Lock()
+
+    def add_sink(self, sink):
+        with self.lock:
+            self.sinks = self.sinks + [sink]
+        return sink
+
+    def remove_sink(self, sink):
+        with self.lock:
+            self.sinks = [s for s in self.sinks if s is not sink]
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the body of a with block as the stage `name`. Yields the Span to add attributes to."""
+        span = Span(name, attributes)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            self.record(span)
+
+    def record(self, span):
+        """Send a finished span to every sink. A failing sink never breaks the pipeline."""
+        for sink in self.sinks:
+            try:
+                sink.record(span)
+            except Exception as e:
+                print(f"Metrics sink {type(sink).__name__} failed: {e}")
+
+    def close(self):
+        """Flush and close every sink that holds a file, e.g. at exit."""
+        for sink in self.sinks:
+            if hasattr(sink, "close"):
+                try:
+                    sink.close()
+                except Exception as e:
+                    print(f"Metrics sink {type(sink).__name__} failed to close: {e}")
+
+
+class JSONLogSink:
+    """Sink that writes each span as one JSON object per line."""
+
+    def __init__(self, stream=None, path=None):
+        """Log to `path` (appending) if given, otherwise to `stream` (stderr by default)."""
+        self.file = open(path, "a") if path is not None else None
+        self.stream = self.file or stream or sys.stderr
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        line = json.dumps(span.to_dict())
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class _Histogram:
+    __slots__ = ("counts", "count", "sum", "errors", "totals")
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.totals = {}  # Sums of numeric attributes such as audio_seconds and bytes_in
+
+
+class HistogramSink:
+    """In-process registry of a duration histogram per stage, with running totals of span attributes."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        with self.lock:
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = _Histogram(self.buckets)
+            histogram.counts[bisect_left(self.buckets, span.duration)] += 1
+            histogram.count += 1
+            histogram.sum += span.duration
+            histogram.errors += span.error is not None
+            for key, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    histogram.totals[key] = histogram.totals.get(key, 0) + value
+
+    def quantile(self, name, q):
+        """Estimate a duration quantile for a stage from its buckets, interpolating within a bucket."""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None or not histogram.count:
+                return None
+            rank = q * histogram.count
+            seen = 0
+            for index, count in enumerate(histogram.counts):
+                if count and seen + count >= rank:
+                    lower = self.buckets[index - 1] if index else 0.0
+                    if index == len(self.buckets):
+                        return lower  # Past the last bucket, so the best we can say is "at least"
+                    return lower + (self.buckets[index] - lower) * (rank - seen) / count
+                seen += count
+            return self.buckets[-1]
+
+    def summary(self):
+        """Return {stage: {count, errors, mean_s, p50_s, p95_s, <attribute totals>}}."""
+        with self.lock:
+            names = list(self.histograms)
+        result = {}
+        for name in names:
+            histogram = self.histograms[name]
+            stats = {"count": histogram.count, "errors": histogram.errors,
+                     "mean_s": histogram.sum / histogram.count if histogram.count else 0.0,
+                     "p50_s": self.quantile(name, 0.5), "p95_s": self.quantile(name, 0.95)}
+            stats.update(histogram.totals)
+            result[name] = stats
+        return result
+
+    def exposition(self, prefix="voice_dictation"):
+        """Render the registry in the Prometheus text exposition format."""
+        lines = [f"# HELP {prefix}_stage_duration_seconds Time spent in each pipeline stage.",
+                 f"# TYPE {prefix}_stage_duration_seconds histogram"]
+        totals = []
+        with self.lock:
+            for name in sorted(self.histograms):
+                histogram = self.histograms[name]
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {histogram.sum}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {histogram.count}')
+                totals.append((f"{prefix}_stage_errors_total", name, histogram.errors))
+                for key, value in sorted(histogram.totals.items()):
+                    totals.append((f"{prefix}_stage_{key}_total", name, value))
+
+        for metric in sorted({metric for metric, _, _ in totals}):
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f'{metric}{{stage="{name}"}} {value}' for m, name, value in totals if m == metric)
+        return "\n".join(lines) + "\n"
+
+
+class PrometheusTextfileSink:
+    """
+    Sink that keeps a HistogramSink and rewrites it to a .prom file for node_exporter's textfile
+    collector. The file is replaced atomically, at most every `interval` seconds, and once more
+    on close so the last spans before exit are not lost.
+    """
+
+    def __init__(self, path, histograms=None, interval=1.0):
+        self.path = path
+        self.histograms = histograms if histograms is not None else HistogramSink()
+        self.interval = interval
+        self.last_write = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        self.histograms.record(span)
+        now = time.monotonic()
+        if now - self.last_write >= self.interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        """Write the current registry to the textfile."""
+        with self.lock:
+            self.last_write = time.monotonic() if now is None else now
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics_", suffix=".prom.tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(self.histograms.exposition())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    def close(self):
+        self.flush()
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the process-wide Metrics. It has no sinks, and so costs next to nothing, until one is added."""
+    return _metrics
+
+
+def set_metrics(metrics):
+    """Replace the process-wide Metrics."""
+    global _metrics
+    _metrics = metrics
+
+
+@atexit.register
+def _close_metrics():
+    get_metrics().close()
+
+
+def span(name, **attributes):
+    """Time a stage on the process-wide Metrics: `with span("transcribe", audio_seconds=3.2) as s: ...`."""
+    return get_metrics().span(name, **attributes)
@@ -1,13 +1,174 @@
-import google.generativeai as genai
-import os
+import ast
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from .gazetteer import BREAK, Gazetteer, phrase_keys
+from .llm_client import GeminiTransport, LLMClient, get_llm_client
+from .metrics import span
+
+PRUNE_INTERVAL = 86400  # Seconds between sweeps of decayed names out of the gazetteer
+
+# A run of capitalized words, e.g. "Palo Alto" or "O'Brien"
+CAPITALIZED_SPAN = re.compile(r"\b[A-Z][\w'’-]*(?:\s+[A-Z][\w'’-]*)*")
+# Capitalized words that are not names on their own
+NON_NAME_WORDS = {"I", "I'm", "I'll", "I've", "I'd", "I’m", "I’ll", "I’ve", "I’d"}
+# Words a fix can contain besides the names it gives and still be applied without the LLM,
+# e.g. "No, it's Vik, with a K"
+FIX_FILLER_WORDS = {"no", "not", "it", "it's", "it’s", "its", "is", "was", "that's", "that’s", "that", "the", "name",
+                    "names", "spelled", "spelt", "with", "a", "an", "i", "meant", "mean", "said", "say", "should",
+                    "be", "actually", "sorry", "oh", "um", "uh", "and", "like", "as", "in", "of"}
 
 class NERManager:
     """Class for managing Named Entity Recognition and memory of proper nouns."""
 
-    def __init__(self):
-        self.memory = {}
+    def __init__(self, cache_size=256, api_key=None, client=None, gazetteer=None):
+        """
+        Requests go through `client`, by default the process-wide LLMClient, which retries,
+        rate-limits and stops calling a failing API. Given an `api_key`, the manager gets a
+        client of its own for that key instead. The proper nouns seen are remembered in
+        `gazetteer`, by default an in-memory one; pass a Gazetteer with a path to keep them.
+        """
+        self.api_key = api_key
+        self.client = client
+        self.gazetteer = gazetteer if gazetteer is not None else Gazetteer()
+        self.last_pruned = None  # Gazetteer clock time of the last prune
+        self.cache = OrderedDict()  # normalized text -> tuple of proper nouns
+        self.cache_size = cache_size
+        self.inflight = {}  # normalized text -> Future shared by concurrent identical requests
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text):
+        """Normalize text for use as a cache key."""
+        return ' '.join(text.split())
 
     def extract_proper_nouns(self, transcription):
+        """Extract the proper nouns in a transcription, skipping the LLM whenever possible."""
+        with span("extract_proper_nouns", chars_in=len(transcription)) as extract:
+            proper_nouns, source = self._extract_proper_nouns(transcription)
+            extract.set(source=source, nouns=len(proper_nouns))
+        return proper_nouns
+
+    def _extract_proper_nouns(self, transcription):
+        """Returns (proper_nouns, source), where source says whether the LLM was needed."""
+        key = self.normalize(transcription)
+        with self.lock:
+            cached = self.cache.get(key)
+            source = "cache"
+            if cached is not None:
+                self.cache.move_to_end(key)
+            else:
+                cached = self._match_memory(key)
+                source = "memory"
+            if cached is not None:
+                proper_nouns = list(cached)
+                self.update_memory(proper_nouns)
+                return proper_nouns, source
+
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+
+        if not owner:
+            # Someone else is already asking the LLM about this exact text
+            proper_nouns = list(future.result())
+            self.update_memory(proper_nouns)
+            return proper_nouns, "coalesced"
+
+        try:
+            proper_nouns = self._extract_with_llm(key)
+        except BaseException as e:
+            with self.lock:
+                del self.inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.inflight[key]
+            if proper_nouns is not None:
+                self._cache_result(key, proper_nouns)
+        proper_nouns = proper_nouns or []
+        future.set_result(tuple(proper_nouns))
+        self.update_memory(proper_nouns)
+        return proper_nouns, "llm"
+
+    def _cache_result(self, key, proper_nouns):
+        self.cache[key] = tuple(proper_nouns)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    @property
+    def memory(self):
+        """The proper nouns seen so far and how often each was seen."""
+        return self.gazetteer.counts
+
+    def _match_memory(self, text):
+        """
+        Return the known proper nouns in `text` if they account for every capitalized span in it,
+        otherwise None. Text with no capitalized spans has no proper nouns.
+        """
+        covered = [False] * len(text)
+        found = []
+        for start, end, noun in self.gazetteer.find(text):
+            covered[start:end] = [True] * (end - start)
+            if noun not in found:
+                found.append(noun)
+
+        for match in CAPITALIZED_SPAN.finditer(text):
+            for word in re.finditer(r"\S+", match.group()):
+                start = match.start() + word.start()
+                if word.group() not in NON_NAME_WORDS and not covered[start]:
+                    return None
+        return tuple(found)
+
+    def snap_names(self, text):
+        """
+        Replace misrecognized proper nouns in `text` with the known names they sound like, e.g.
+        "Vic Srinivasan" with "Vik Srinivasan". Returns (text, [(misrecognized, name), ...]).
+        """
+        with span("snap_names", chars_in=len(text)) as snap:
+            text, replacements = self.gazetteer.snap(text)
+            snap.set(replacements=len(replacements))
+        return text, replacements
+
+    def correct_locally(self, original_transcription, fix_transcription):
+        """
+        Apply a fix that only names known proper nouns ("No, it's Vik, with a K") by replacing
+        the sound-alike words in the original. Returns the corrected transcription, or None if
+        the fix says anything else or it is not clear which words it corrects.
+        """
+        found = self.gazetteer.find(fix_transcription)
+        if not found:
+            return None
+        remainder = fix_transcription
+        for start, end, _ in reversed(found):
+            remainder = remainder[:start] + " " + remainder[end:]
+        if any(len(word) > 1 and word not in FIX_FILLER_WORDS for word in re.findall(r"[\w'’]+", remainder.lower())):
+            return None
+
+        corrected = original_transcription
+        changed = False
+        for name in dict.fromkeys(noun for _, _, noun in found):
+            keys = set(phrase_keys(name))
+            words = len(name.split())
+            targets = [(start, end) for start, end, phrase, first, last in self.gazetteer.spans(corrected)
+                       if last - first + 1 == words and phrase != name and not BREAK.search(phrase)
+                       and keys & set(phrase_keys(phrase))]
+            if not targets:
+                continue  # Nothing sounds like it, e.g. the original already has it right
+            if len(targets) > 1:
+                return None
+            start, end = targets[0]
+            corrected = corrected[:start] + name + corrected[end:]
+            changed = True
+        return corrected if changed else None
+
+    def _extract_with_llm(self, transcription):
+        """Ask the LLM for the proper nouns. Returns None if it gave no response."""
         prompt = (
             "You are a proper noun extractor. Extract all proper nouns from the following text and return them in a list:\n"
             f"{transcription}\n"
@@ -19,35 +180,82 @@ class NERManager:
         )
         response = self.call_gpt_api(prompt)
         if response:
-            # Remove brackets and split by commas
-            proper_nouns = response.replace('[', '').replace(']', '').replace("'", "").split(",")
-            proper_nouns = [noun.strip() for noun in proper_nouns if noun.strip()]
-            self.update_memory(proper_nouns)
-            return proper_nouns
+            return self.parse_noun_list(response)
         else:
             print("No response received from Gemini API.")
-            return []
+            return None
 
-    def call_gpt_api(self, prompt):
-        """Call the Gemini API with the given prompt to extract proper nouns."""
-        try:
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(prompt)
-            return response.text if response else ""
-        except Exception as e:
-            print(f"An error occurred while calling the Gemini API: {e}")
-            return ""
+    @staticmethod
+    def parse_noun_list(response):
+        """Parse a list of proper nouns from an LLM response."""
+        text = response.strip().strip('`').strip()
+        start, end = text.find('['), text.rfind(']')
+        if start != -1 and end > start:
+            # Parse it as a real list first, so names with commas or apostrophes survive
+            for parse in (json.loads, ast.literal_eval):
+                try:
+                    parsed = parse(text[start:end + 1])
+                except (ValueError, SyntaxError):
+                    continue
+                if isinstance(parsed, list):
+                    return [str(noun).strip() for noun in parsed if str(noun).strip()]
+
+        # Remove brackets and split by commas
+        proper_nouns = text.replace('[', '').replace(']', '').replace("'", "").split(",")
+        return [noun.strip() for noun in proper_nouns if noun.strip()]
+
+    def get_client(self):
+        """Return the LLM client, creating it on first use."""
+        if self.client is None:
+            self.client = LLMClient(GeminiTransport(api_key=self.api_key)) if self.api_key else get_llm_client()
+        return self.client
+
+    def warm_up(self):
+        """Create the LLM client and load its model ahead of the first request."""
+        self.get_client().warm_up()
+
+    def call_gpt_api(self, prompt, generation_config=None):
+        """
+        Send a prompt to the LLM and return its text. Raises LLMError if no answer could be had,
+        so a failed request is never mistaken for an empty one.
+        """
+        return self.get_client().generate(prompt, generation_config)
 
     def update_memory(self, proper_nouns):
-        for noun in proper_nouns:
-            self.memory[noun] = self.memory.get(noun, 0) + 1
+        """Record a sighting of each proper noun, and at most daily forget the names that have decayed."""
+        self.gazetteer.add(proper_nouns)
+        now = self.gazetteer.clock()
+        if self.last_pruned is None or now - self.last_pruned >= PRUNE_INTERVAL:
+            self.last_pruned = now
+            self.gazetteer.prune()
+
+    def get_memory(self):
+        """Return the proper nouns seen so far and how often each was seen."""
+        return self.memory
 
     def clear_memory(self):
         """Clear the memory of proper nouns."""
-        self.memory = {}
+        with self.lock:
+            self.gazetteer.clear()
+            self.cache.clear()
+
+    def _correct_locally(self, original_transcription, fix_transcription):
+        with span("correct_locally", chars_in=len(original_transcription) + len(fix_transcription)) as local:
+            corrected_transcription = self.correct_locally(original_transcription, fix_transcription)
+            local.set(matched=corrected_transcription is not None)
+        return corrected_transcription
 
     def correct_transcription(self, original_transcription, fix_transcription):
-        """Use LLM to correct the original transcription based on fix transcription."""
+        """
+        Correct the original transcription based on the fix transcription, locally if the fix
+        just names known proper nouns and otherwise with the LLM.
+        """
+        corrected_transcription = self._correct_locally(original_transcription, fix_transcription)
+        if corrected_transcription is not None:
+            return corrected_transcription
+        return self._correct_with_llm(original_transcription, fix_transcription)
+
+    def _correct_with_llm(self, original_transcription, fix_transcription):
         prompt = (
             "You are an assistant that corrects transcriptions based on user's corrections.\n"
             "Given the original transcription and the user's correction, output the corrected transcription.\n"
@@ -56,10 +264,81 @@ class NERManager:
             f"User's correction: \"{fix_transcription}\"\n"
             "Corrected transcription:"
         )
-        response = self.call_gpt_api(prompt)
+        with span("correct_transcription", chars_in=len(original_transcription) + len(fix_transcription)):
+            response = self.call_gpt_api(prompt)
         if response:
             corrected_transcription = response.strip()
             return corrected_transcription
         else:
             print("No response received from LLM for correction.")
             return original_transcription
+
+    def correct_and_extract(self, original_transcription, fix_transcription):
+        """
+        Correct the transcription and extract its proper nouns in a single LLM request, or with
+        no request for the correction if the fix can be applied locally (see correct_locally).
+
+        Returns (corrected_transcription, proper_nouns). If the response is not valid JSON in the
+        expected shape, falls back to separate correct_transcription and extract_proper_nouns calls.
+        If the request fails, LLMError is raised rather than trying again with more requests.
+        """
+        corrected_transcription = self._correct_locally(original_transcription, fix_transcription)
+        if corrected_transcription is not None:
+            return corrected_transcription, self.extract_proper_nouns(corrected_transcription)
+
+        prompt = (
+            "You are an assistant that corrects transcriptions based on user's corrections and extracts proper nouns.\n"
+            "Given the original transcription and the user's correction, produce the corrected transcription, "
+            "making the minimal changes needed to incorporate the corrections. Then list every proper noun in the "
+            "corrected transcription.\n"
+            "Respond with only a JSON object of the form "
+            '{"corrected_transcription": "<text>", "proper_nouns": ["<noun>", ...]}.\n'
+            f"Original transcription: {json.dumps(original_transcription)}\n"
+            f"User's correction: {json.dumps(fix_transcription)}\n"
+        )
+        with span("correct_and_extract", chars_in=len(original_transcription) + len(fix_transcription)) as correct:
+            response = self.call_gpt_api(prompt, generation_config={"response_mime_type": "application/json"})
+            result = self.parse_correction(response)
+            correct.set(valid=result is not None)
+        if result is None:
+            print("Invalid combined correction response, falling back to separate requests.")
+            corrected_transcription = self._correct_with_llm(original_transcription, fix_transcription)
+            return corrected_transcription, self.extract_proper_nouns(corrected_transcription)
+
+        corrected_transcription, proper_nouns = result
+        with self.lock:
+            # A later extract_proper_nouns on the corrected text is now a cache hit
+            self._cache_result(self.normalize(corrected_transcription), proper_nouns)
+            self.update_memory(proper_nouns)
+        return corrected_transcription, proper_nouns
+
+    @staticmethod
+    def parse_correction(response):
+        """Validate a combined correction response. Returns (text, proper_nouns) or None."""
+        if not response:
+            return None
+        text = response.strip()
+        if text.startswith("```"):
+            # Strip a Markdown code fence
+            text = text.strip('`').strip()
+            if text.startswith("json"):
+                text = text[4:]
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+
+        if not isinstance(data, dict):
+            return None
+        corrected_transcription = data.get("corrected_transcription")
+        proper_nouns = data.get("proper_nouns")
+        if not isinstance(corrected_transcription, str) or not corrected_transcription.strip():
+            return None
+        if not isinstance(proper_nouns, list) or not all(isinstance(noun, str) for noun in proper_nouns):
+            return None
+
+        unique_nouns = []
+        for noun in (noun.strip() for noun in proper_nouns):
+            if noun and noun not in unique_nouns:
+                unique_nouns.append(noun)
+        return corrected_transcription.strip(), unique_nouns
@@ -1,63 +1,108 @@
-import os
-import pyaudio
-import wave
-import gtts
-import pydub
-from gtts import gTTS
-from pydub import AudioSegment
+import threading
+from .devices import get_device_manager
+from .metrics import span
+from .time_stretch import stretch_blocks, time_stretch
+from .tts import GTTSProvider, TTSProvider, create_provider
+from .tts_cache import TTSCache
+from .utils import AudioClip
 
 class Playback:
     """Class for handling text-to-speech playback."""
 
-    def __init__(self):
-        """Initialize Playback settings."""
-        self.audio_file_mp3 = "transcription_playback.mp3"
-        self.audio_file_wav = "transcription_playback.wav"
+    def __init__(self, cache=None, lang='en', device=None, provider=None, preserve_pitch=True):
+        """
+        Initialize Playback settings.
 
-    def text_to_speech(self, text, speed):
-        """Convert text to speech and save it as an MP3 file, then convert to WAV."""
-        # Generate speech and save as MP3
-        tts = gtts.gTTS(text=text, lang='en')
-        tts.save(self.audio_file_mp3)
+        `provider` is a TTSProvider or the name of one ("gtts" or the offline "espeak");
+        the default is gTTS. `preserve_pitch=False` speeds speech up by resampling instead.
+        """
+        self.lang = lang
+        self.preserve_pitch = preserve_pitch
+        self.cache = cache if cache is not None else TTSCache()
+        self.prewarm_thread = None
+        self.device = device if device is not None else get_device_manager()
+        if provider is None:
+            provider = GTTSProvider()
+        elif not isinstance(provider, TTSProvider):
+            provider = create_provider(provider)
+        self.provider = provider
+        # Voices differ between providers, so they share the cache under different keys
+        self.cache_lang = lang if provider.name == "gtts" else f"{lang}/{provider.name}"
+        self.clip = None  # The speech made by the last text_to_speech call
+
+    def synthesize(self, text, speed):
+        """Return the speech for `text` as an AudioClip, synthesizing it only on a cache miss."""
+        clip = self.cache.get(text, self.cache_lang, speed)
+        if clip is None:
+            clip = self.render_speech(text, speed)
+            self.cache.put(text, self.cache_lang, speed, clip)
+        return clip
 
-        # Convert MP3 to WAV
-        sound = pydub.AudioSegment.from_mp3(self.audio_file_mp3)
+    def render_speech(self, text, speed):
+        """Synthesize `text` with the provider straight to PCM in memory, bypassing the cache."""
+        clip = self.provider.synthesize(text, self.lang)
         if speed != 1.0:
-            sound = sound.speedup(playback_speed=speed)
-        sound.export(self.audio_file_wav, format="wav")
+            with span("time_stretch", audio_seconds=clip.duration, bytes_in=len(clip.pcm)):
+                clip = time_stretch(clip, speed, self.preserve_pitch)
+        return clip
+
+    def stream(self, text, speed):
+        """
+        Yield the speech for `text` as AudioClip blocks, so playback can start before a long
+        phrase has been fully sped up. The whole clip is cached once the last block is made.
+        """
+        clip = self.cache.get(text, self.cache_lang, speed)
+        if clip is not None:
+            yield clip
+            return
+
+        clip = self.provider.synthesize(text, self.lang)
+        if speed == 1.0:
+            blocks = [clip]
+        else:
+            blocks = []
+            for block in stretch_blocks(clip, speed, self.preserve_pitch):
+                blocks.append(block)
+                yield block
+        self.cache.put(text, self.cache_lang, speed,
+                       AudioClip(b''.join(block.pcm for block in blocks), clip.sample_width, clip.channels, clip.rate))
+        if speed == 1.0:
+            yield clip
+
+    def text_to_speech(self, text, speed):
+        """Convert text to speech and keep it in memory for play_audio."""
+        self.clip = self.synthesize(text, speed)
+
+    def prewarm(self, phrases, speed=1.3, background=True):
+        """Synthesize phrases ahead of time so they play back straight from the cache."""
+        def warm():
+            for text in phrases:
+                try:
+                    self.synthesize(text, speed)
+                except Exception as e:
+                    print(f"Could not prewarm TTS cache for '{text}': {e}")
+
+        if background:
+            self.prewarm_thread = threading.Thread(target=warm, daemon=True)
+            self.prewarm_thread.start()
+        else:
+            warm()
 
     def play_audio(self):
-        """Play the generated WAV audio file using pyaudio."""
-        chunk = 1024  # Define chunk size for playback
-        wf = wave.open(self.audio_file_wav, 'rb')
-        p = pyaudio.PyAudio()
-
-        # Open a stream to play audio
-        stream = p.open(format=p.get_format_from_width(wf.getsampwidth()),
-                        channels=wf.getnchannels(),
-                        rate=wf.getframerate(),
-                        output=True)
-
-        # Read audio in chunks and play
-        data = wf.readframes(chunk)
-        while data:
-            stream.write(data)
-            data = wf.readframes(chunk)
-
-        # Cleanup
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
-        wf.close()
+        """Play the speech made by the last text_to_speech call."""
+        if self.clip is not None:
+            self.play_clip(self.clip)
+
+    def play_clip(self, clip):
+        """Play an AudioClip from memory through the shared output stream."""
+        with span("play_audio", audio_seconds=clip.duration, bytes_in=len(clip.pcm)):
+            self.device.play(clip)
 
     def playback_transcription(self, text):
-        """Convert text to speech, convert format, and play it back."""
-        self.text_to_speech(text, speed=1.3)
-        self.play_audio()
+        """Convert text to speech (or fetch it from the cache) and play it back as it is sped up."""
+        for block in self.stream(text, speed=1.3):
+            self.play_clip(block)
 
     def cleanup(self):
-        """Remove the audio files after playback."""
-        if os.path.exists(self.audio_file_mp3):
-            os.remove(self.audio_file_mp3)
-        if os.path.exists(self.audio_file_wav):
-            os.remove(self.audio_file_wav)
+        """Release the speech kept for play_audio after playback."""
+        self.clip = None
@@ -0,0 +1,136 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .devices import get_device_manager
+from .metrics import span
+
+class _Item:
+    __slots__ = ("text", "speed", "future", "blocks", "cancelled")
+
+    def __init__(self, text, speed):
+        self.text = text
+        self.speed = speed
+        self.future = None
+        self.blocks = queue.Queue()  # AudioClip blocks as they are made, then None or the error
+        self.cancelled = False
+
+
+class PlaybackQueue:
+    """
+    Class that plays phrases back to back while synthesizing the next ones on worker threads.
+
+    Up to `depth` phrases after the one that is playing are synthesized ahead of time, and all
+    audio goes to the shared device manager's persistent output stream, so consecutive phrases
+    play without gaps. Each phrase is played block by block as Playback.stream speeds it up, so
+    a long phrase starts playing before it has been fully stretched.
+    """
+
+    def __init__(self, playback, depth=2, speed=1.3, device=None, chunk=1024):
+        """Initialize the queue and start its player thread."""
+        self.playback = playback
+        self.depth = max(1, depth)
+        self.speed = speed
+        self.device = device if device is not None else get_device_manager()
+        self.chunk = chunk
+        self.executor = ThreadPoolExecutor(max_workers=self.depth, thread_name_prefix="tts")
+        self.items = deque()
+        self.generation = 0  # Bumped on cancel so the player drops what it was doing
+        self.playing = False
+        self.current = None  # The item being played
+        self.closed = False
+        self.condition = threading.Condition()
+        self.player = threading.Thread(target=self._run, daemon=True)
+        self.player.start()
+
+    def enqueue(self, text, speed=None):
+        """Add a phrase to the end of the queue."""
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("PlaybackQueue is closed")
+            self.items.append(_Item(text, self.speed if speed is None else speed))
+            self._schedule()
+            self.condition.notify_all()
+
+    def _schedule(self):
+        """Start synthesis for the next `depth` phrases that are waiting to play."""
+        for index, item in enumerate(self.items):
+            if index >= self.depth:
+                break
+            if item.future is None:
+                item.future = self.executor.submit(self._synthesize, item)
+
+    def _synthesize(self, item):
+        """Put the blocks of an item's speech on its queue as they are made."""
+        end = None
+        try:
+            for block in self.playback.stream(item.text, item.speed):
+                if item.cancelled:
+                    break
+                item.blocks.put(block)
+        except Exception as e:
+            end = e
+        item.blocks.put(end)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.items and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                item = self.items.popleft()
+                self._schedule()
+                self.current = item
+                self.playing = True
+                generation = self.generation
+
+            while generation == self.generation:
+                block = item.blocks.get()
+                if generation != self.generation or block is None:
+                    break
+                if isinstance(block, Exception):
+                    print(f"Could not synthesize '{item.text}': {block}")
+                    break
+                self._play(block, generation)
+
+            with self.condition:
+                self.current = None
+                self.playing = False
+                self.condition.notify_all()
+
+    def _play(self, clip, generation):
+        with span("play_audio", audio_seconds=clip.duration, bytes_in=len(clip.pcm)) as play:
+            clip = self.device.prepare_output(clip)
+            frame_bytes = self.chunk * clip.sample_width * clip.channels
+            for start in range(0, len(clip.pcm), frame_bytes):
+                if generation != self.generation:
+                    play.set(cancelled=True)
+                    return
+                self.device.write(clip.pcm[start:start + frame_bytes])
+
+    def wait(self, timeout=None):
+        """Block until everything queued so far has been played. Returns False on timeout."""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.items and not self.playing, timeout)
+
+    def cancel(self):
+        """Drop all queued phrases and stop the one that is playing."""
+        with self.condition:
+            self.generation += 1
+            for item in list(self.items) + ([self.current] if self.current is not None else []):
+                item.cancelled = True
+                if item.future is not None:
+                    item.future.cancel()
+                item.blocks.put(None)  # Wakes the player if it is waiting for this item's next block
+            self.items.clear()
+            self.condition.notify_all()
+
+    def close(self):
+        """Cancel everything and stop the player thread. The shared output stream stays open."""
+        self.cancel()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.player.join()
+        self.executor.shutdown(wait=False, cancel_futures=True)
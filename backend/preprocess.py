@@ -0,0 +1,68 @@
+import math
+import numpy as np
+import speech_recognition
+
+def resample(pcm, source_rate, target_rate, sample_width=2):
+    """
+    Resample 16-bit mono PCM with an FFT (band-limited, so nothing above the new Nyquist
+    frequency aliases). Returns bytes.
+    """
+    if sample_width != 2:
+        raise ValueError("resample needs 16-bit PCM")
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    if source_rate == target_rate or not len(samples):
+        return bytes(pcm)
+
+    # Pad to a whole number of resampling periods so the output length is exact
+    divisor = math.gcd(source_rate, target_rate)
+    period_in = source_rate // divisor
+    period_out = target_rate // divisor
+    length_out = len(samples) * target_rate // source_rate
+    padded = -(-len(samples) // period_in) * period_in
+    spectrum = np.fft.rfft(samples.astype(np.float32), n=padded)
+
+    padded_out = padded // period_in * period_out
+    bins = padded_out // 2 + 1
+    if bins <= len(spectrum):
+        spectrum = spectrum[:bins]
+        if padded_out % 2 == 0:
+            spectrum[-1] = spectrum[-1].real  # The Nyquist bin of an even-length signal is real
+    output = np.fft.irfft(spectrum, n=padded_out)[:length_out] * (padded_out / padded)
+    return np.clip(np.rint(output), -32768, 32767).astype(np.int16).tobytes()
+
+
+class FLACAudioData(speech_recognition.AudioData):
+    """AudioData that encodes its FLAC once, so recognize_google uploads it without re-encoding."""
+
+    def __init__(self, frame_data, sample_rate, sample_width):
+        super().__init__(frame_data, sample_rate, sample_width)
+        self.flac_data = super().get_flac_data()
+
+    def get_flac_data(self, convert_rate=None, convert_width=None):
+        if convert_rate in (None, self.sample_rate) and convert_width in (None, self.sample_width):
+            return self.flac_data
+        return super().get_flac_data(convert_rate, convert_width)
+
+
+def prepare_upload(audio, target_rate=16000, compress=True):
+    """
+    Downsample an AudioData object to `target_rate` (never up) and, with `compress`, encode it to
+    FLAC up front. Returns (audio, stats) where stats has the bytes captured, the bytes that will
+    be uploaded and the difference.
+    """
+    pcm = audio.frame_data
+    rate = audio.sample_rate
+    if audio.sample_width != 2:
+        pcm = audio.get_raw_data(convert_width=2)
+    if target_rate and rate > target_rate:
+        pcm = resample(pcm, rate, target_rate)
+        rate = target_rate
+
+    if compress:
+        prepared = FLACAudioData(pcm, rate, 2)
+        upload_bytes = len(prepared.flac_data)
+    else:
+        prepared = speech_recognition.AudioData(pcm, rate, 2)
+        upload_bytes = len(pcm)
+    raw_bytes = len(audio.frame_data)
+    return prepared, {"bytes_in": raw_bytes, "bytes_out": upload_bytes, "bytes_saved": raw_bytes - upload_bytes}
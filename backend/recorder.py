@@ -1,46 +1,50 @@
 import os
-import pyaudio
 import wave
 import threading
+from .capture_buffer import CaptureBuffer
+from .devices import get_device_manager
+from .metrics import span
+from .recording_store import get_recording_store
 
 class AudioRecorder:
     """Class responsible for recording audio from the user."""
 
-    def __init__(self):
-        """Initialize the audio recorder."""
+    def __init__(self, max_seconds=None, ring=False, device=None, store=None):
+        """
+        Initialize the audio recorder.
+
+        `max_seconds` caps how much audio is kept in memory; past it only the most recent audio
+        is kept. With `ring=True` that much memory is allocated up front. Recordings are archived
+        to `store`, by default the process-wide RecordingStore.
+        """
         self.chunk = 1024
-        self.format = pyaudio.paInt16
+        self.sample_width = 2  # 16-bit samples
         self.channels = 1
         self.rate = 44100
-        self.frames = []
+        max_bytes = None if max_seconds is None else int(max_seconds * self.rate) * self.sample_width * self.channels
+        self.buffer = CaptureBuffer(block_size=self.rate * self.sample_width * self.channels * 10,  # 10 s blocks
+                                    max_bytes=max_bytes, ring=ring, sample_width=self.sample_width)
+        self.chunk_queue = None  # Optional queue that receives each chunk as it is recorded
+        self.archive_thread = None
         self.is_recording = False
 
-        self.audio = pyaudio.PyAudio()
-        self.audio_file = self._get_next_audio_file_name()
-        self.fix_audio_file = None  # Will be set when fix recording starts
-
-    def _get_next_audio_file_name(self):
-        """Find the next available filename in the current directory."""
-
-        index = 1
-        while os.path.exists(f"output{index}.wav"):
-            index += 1
-        return f"output{index}.wav"
+        self.device = device if device is not None else get_device_manager()  # Shared, long-lived streams
+        self._store = store
+        self.take_id = None  # Store id of the last archived take
+        self.fix_id = None  # Store id of the last archived fix recording
 
-    def _get_next_fix_audio_file_name(self):
-        """Find the next available filename for fix audio."""
-        index = 1
-        while os.path.exists(f"fix_output{index}.wav"):
-            index += 1
-        return f"fix_output{index}.wav"
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_recording_store()  # Opened on first use, so recording alone never touches disk
+        return self._store
 
     def start_recording(self):
         """Start recording the user's audio input in a separate thread."""
 
         if not self.is_recording:
             self.is_recording = True
-            self.frames = []  # Clear previous audio frames
-            self.audio_file = self._get_next_audio_file_name()
+            self.buffer.clear()  # Clear previous audio frames
             self.recording_thread = threading.Thread(target=self.record_audio)
             self.recording_thread.start()
             print("Recording started...")
@@ -49,8 +53,7 @@ class AudioRecorder:
         """Start recording the user's audio input for the fix in a separate thread."""
         if not self.is_recording:
             self.is_recording = True
-            self.frames = []  # Clear previous audio frames
-            self.fix_audio_file = self._get_next_fix_audio_file_name()
+            self.buffer.clear()  # Clear previous audio frames
             self.recording_thread = threading.Thread(target=self.record_audio)
             self.recording_thread.start()
             print("Fix recording started...")
@@ -59,19 +62,18 @@ class AudioRecorder:
         """Record audio in the background until stopped."""
 
         try:
-            stream = self.audio.open(format=self.format,
-                                     channels=self.channels,
-                                     rate=self.rate,
-                                     input=True,
-                                     frames_per_buffer=self.chunk)
-
-            while self.is_recording:
-                data = stream.read(self.chunk, exception_on_overflow=False)  # Safeguard against overflow
-                self.frames.append(data)
-
-            # Stop and close the stream
-            stream.stop_stream()
-            stream.close()
+            with span("capture") as capture:
+                stream = self.device.open_input(self.sample_width, self.channels, self.rate, self.chunk)
+
+                while self.is_recording:
+                    data = stream.read(self.chunk)
+                    self.buffer.append(data)
+                    if self.chunk_queue is not None:
+                        self.chunk_queue.put(data)
+                capture.set(audio_seconds=self.seconds(len(self.buffer)), bytes_in=len(self.buffer))
+
+            # Pause the shared stream so the next recording can reuse it
+            self.device.pause_input()
             print("Recording finished.")
 
         except Exception as e:
@@ -90,27 +92,88 @@ class AudioRecorder:
         self.stop_recording()
         print("Fix recording stopped.")
 
-    def save_audio(self, filename=None):
-        """Save the recorded audio to a file."""
-        if not self.frames:
-            print("No audio data to save.")
-            return
+    def seconds(self, nbytes):
+        """Return how many seconds of audio `nbytes` of recorded PCM hold."""
+        return nbytes / float(self.rate * self.sample_width * self.channels)
+
+    def get_pcm(self):
+        """Return a zero-copy view of the recorded audio as raw PCM."""
+        return self.buffer.view()
+
+    def get_level(self):
+        """Return the RMS level of the most recent chunk, for level metering."""
+        return self.buffer.level(self.chunk * self.sample_width * self.channels)
+
+    def save_audio(self, filename=None, pcm=None, recording_id=None):
+        """
+        Save the recorded audio (or the given PCM) as a WAV file at `filename`, or if no filename
+        is given, to the recording store as a new take (or under an already allocated id).
+        """
+        if pcm is None:
+            if not len(self.buffer):
+                print("No audio data to save.")
+                return
+            pcm = self.get_pcm()
 
-        if filename is None:
-            filename = self.audio_file
-
-        # Save the recorded frames as a .wav file
         try:
-            wf = wave.open(filename, 'wb')
-            wf.setnchannels(self.channels)
-            wf.setsampwidth(self.audio.get_sample_size(self.format))
-            wf.setframerate(self.rate)
-            wf.writeframes(b''.join(self.frames))
-            wf.close()
+            with span("save_audio", audio_seconds=self.seconds(len(pcm)), bytes_in=len(pcm)) as save:
+                if filename is None:
+                    if recording_id is None:
+                        recording_id = self.take_id = self.store.allocate("take")
+                    written = self.store.write(recording_id, pcm, self.sample_width, self.channels, self.rate)
+                    if written is None:
+                        print("Recording was evicted before it could be saved.")
+                        return
+                    filename, size = written
+                else:
+                    wf = wave.open(filename, 'wb')
+                    wf.setnchannels(self.channels)
+                    wf.setsampwidth(self.sample_width)
+                    wf.setframerate(self.rate)
+                    wf.writeframes(pcm)
+                    wf.close()
+                    size = os.path.getsize(filename)
+                save.set(bytes_out=size)
             print(f"Audio saved to {filename}")
         except Exception as e:
             print(f"Error saving audio: {e}")
 
     def save_fix_audio(self):
-        """Save the recorded fix audio to a file."""
-        self.save_audio(self.fix_audio_file)
+        """Save the recorded fix audio to the recording store, linked to the last take."""
+        self.fix_id = self.store.allocate("fix", parent_id=self.take_id)
+        self.save_audio(recording_id=self.fix_id)
+
+    def save_audio_async(self, filename=None, kind="take", pcm=None):
+        """
+        Archive the recorded audio (or the given PCM, e.g. with the silence trimmed) in a background
+        thread. Returns the store id, if it goes to the store.
+        """
+        if pcm is None:
+            pcm = self.get_pcm()
+        if not len(pcm):
+            print("No audio data to save.")
+            return None
+
+        recording_id = None
+        if filename is None:
+            # Allocating is a single indexed insert, so the id is known before the file is written
+            if kind == "fix":
+                recording_id = self.fix_id = self.store.allocate("fix", parent_id=self.take_id)
+            else:
+                recording_id = self.take_id = self.store.allocate("take")
+
+        # The next recording clears into a fresh buffer, so this view stays intact
+        self.wait_for_archive()
+        self.archive_thread = threading.Thread(target=self.save_audio, args=(filename, pcm, recording_id))
+        self.archive_thread.start()
+        return recording_id
+
+    def save_fix_audio_async(self, pcm=None):
+        """Archive the recorded fix audio in a background thread, linked to the last take."""
+        return self.save_audio_async(kind="fix", pcm=pcm)
+
+    def wait_for_archive(self):
+        """Block until the last background archive has been written."""
+        if self.archive_thread is not None:
+            self.archive_thread.join()
+            self.archive_thread = None
@@ -0,0 +1,254 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import wave
+from .utils import AudioClip
+
+DEFAULT_ROOT = "recordings"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    parent_id TEXT REFERENCES recordings(id) ON DELETE CASCADE,
+    path TEXT,
+    format TEXT,
+    created REAL NOT NULL,
+    duration REAL,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS recordings_created ON recordings(created);
+CREATE INDEX IF NOT EXISTS recordings_parent ON recordings(parent_id);
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recording_id TEXT NOT NULL REFERENCES recordings(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_recording ON transcripts(recording_id);
+CREATE TABLE IF NOT EXISTS entities (
+    transcript_id INTEGER NOT NULL REFERENCES transcripts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    noun TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entities_transcript ON entities(transcript_id);
+CREATE INDEX IF NOT EXISTS entities_noun ON entities(noun);
+"""
+
+class RecordingStore:
+    """
+    Class that archives recordings under unique ids, with an SQLite index linking each take to
+    its fix recordings, and each recording to its transcripts and their proper nouns.
+
+    Files live at <root>/<first two hex digits of the id>/<id>.wav (or .flac), so allocating and
+    finding one never scans a directory. With `max_bytes` or `max_age_days` set, the oldest takes
+    (with their fixes and transcripts) are evicted after each write, except the one just written
+    and takes still being written or corrected.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, compress=False, max_bytes=None, max_age_days=None):
+        """Open (or create) the store in `root`. `compress=True` stores new recordings as FLAC."""
+        self.root = root
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        os.makedirs(root, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("PRAGMA foreign_keys=ON")
+            self.db.executescript(SCHEMA)
+            self.total_bytes = self.db.execute("SELECT COALESCE(SUM(bytes), 0) FROM recordings").fetchone()[0]
+
+    def allocate(self, kind="take", parent_id=None):
+        """
+        Reserve a new recording id. A fix recording names the take it corrects as `parent_id`; if
+        that take has already been evicted, the fix is kept on its own.
+        """
+        recording_id = uuid.uuid4().hex
+        with self.lock, self.db:
+            try:
+                self.db.execute("INSERT INTO recordings (id, kind, parent_id, created) VALUES (?, ?, ?, ?)",
+                                (recording_id, kind, parent_id, time.time()))
+            except sqlite3.IntegrityError:
+                print(f"Recording {parent_id} was evicted, so the {kind} is saved without it.")
+                self.db.execute("INSERT INTO recordings (id, kind, parent_id, created) VALUES (?, ?, NULL, ?)",
+                                (recording_id, kind, time.time()))
+        return recording_id
+
+    def path_for(self, recording_id, extension):
+        return os.path.join(self.root, recording_id[:2], f"{recording_id}.{extension}")
+
+    def write(self, recording_id, pcm, sample_width, channels, rate):
+        """
+        Write the audio of an allocated recording, atomically, and index it. Returns the path and
+        size in bytes, or None if the recording was evicted meanwhile.
+        """
+        compress = self.compress and channels == 1  # The bundled FLAC encoder takes mono audio
+        extension = "flac" if compress else "wav"
+        path = self.path_for(recording_id, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        try:
+            if compress:
+                import speech_recognition  # For its bundled FLAC encoder
+
+                with open(tmp_path, "wb") as f:
+                    f.write(speech_recognition.AudioData(bytes(pcm), rate, sample_width).get_flac_data())
+            else:
+                with wave.open(tmp_path, 'wb') as wf:
+                    wf.setnchannels(channels)
+                    wf.setsampwidth(sample_width)
+                    wf.setframerate(rate)
+                    wf.writeframes(pcm)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        size = os.path.getsize(path)
+        with self.lock, self.db:
+            updated = self.db.execute("UPDATE recordings SET path = ?, format = ?, duration = ?, bytes = ? WHERE id = ?",
+                                      (os.path.relpath(path, self.root), extension,
+                                       len(pcm) / float(sample_width * channels * rate), size, recording_id)).rowcount
+            if updated:
+                self.total_bytes += size
+                parent_id = self.db.execute("SELECT parent_id FROM recordings WHERE id = ?",
+                                            (recording_id,)).fetchone()[0]
+        if not updated:
+            os.remove(path)  # Evicted while it was being written
+            return None
+        self.enforce_retention(keep=(parent_id or recording_id,))
+        return path, size
+
+    def save(self, pcm, sample_width, channels, rate, kind="take", parent_id=None):
+        """Allocate and write a recording in one step. Returns its id."""
+        recording_id = self.allocate(kind, parent_id)
+        self.write(recording_id, pcm, sample_width, channels, rate)
+        return recording_id
+
+    def add_transcript(self, recording_id, text, kind="transcription", proper_nouns=()):
+        """Index a transcript of a recording and the proper nouns in it. Returns the transcript id."""
+        with self.lock, self.db:
+            transcript_id = self.db.execute(
+                "INSERT INTO transcripts (recording_id, kind, text, created) VALUES (?, ?, ?, ?)",
+                (recording_id, kind, text, time.time())).lastrowid
+            self.db.executemany("INSERT INTO entities (transcript_id, position, noun) VALUES (?, ?, ?)",
+                                [(transcript_id, position, noun) for position, noun in enumerate(proper_nouns)])
+        return transcript_id
+
+    def get(self, recording_id):
+        """Return a recording's index row as a dict, or None."""
+        with self.lock:
+            row = self.db.execute("SELECT * FROM recordings WHERE id = ?", (recording_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def fixes(self, take_id):
+        """Return the fix recordings of a take, oldest first."""
+        with self.lock:
+            rows = self.db.execute("SELECT * FROM recordings WHERE parent_id = ? ORDER BY created", (take_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def transcripts(self, recording_id):
+        """Return a recording's transcripts, oldest first, each with its list of proper nouns."""
+        with self.lock:
+            rows = self.db.execute("SELECT * FROM transcripts WHERE recording_id = ? ORDER BY id",
+                                   (recording_id,)).fetchall()
+            result = []
+            for row in rows:
+                transcript = dict(row)
+                transcript["proper_nouns"] = [entity["noun"] for entity in self.db.execute(
+                    "SELECT noun FROM entities WHERE transcript_id = ? ORDER BY position", (row["id"],))]
+                result.append(transcript)
+        return result
+
+    def find_by_noun(self, noun):
+        """Return the ids of the recordings whose transcripts mention a proper noun."""
+        with self.lock:
+            rows = self.db.execute("SELECT DISTINCT t.recording_id FROM entities e JOIN transcripts t "
+                                   "ON t.id = e.transcript_id WHERE e.noun = ?", (noun,)).fetchall()
+        return [row[0] for row in rows]
+
+    def load(self, recording_id):
+        """Return a recording's audio as an AudioClip."""
+        row = self.get(recording_id)
+        if row is None or row["path"] is None:
+            raise KeyError(recording_id)
+        path = os.path.join(self.root, row["path"])
+        if row["format"] == "flac":
+            import speech_recognition
+
+            with speech_recognition.AudioFile(path) as source:
+                audio = speech_recognition.Recognizer().record(source)
+            return AudioClip(audio.frame_data, audio.sample_width, 1, audio.sample_rate)
+        with wave.open(path, 'rb') as wf:
+            return AudioClip(wf.readframes(wf.getnframes()), wf.getsampwidth(), wf.getnchannels(), wf.getframerate())
+
+    def enforce_retention(self, keep=()):
+        """
+        Evict the oldest takes until the store is within its size and age limits. Returns how many
+        went. The takes in `keep`, takes not yet written and takes with a fix not yet written are
+        never evicted, even if the store stays over its limits.
+        """
+        if self.max_bytes is None and self.max_age_days is None:
+            return 0
+        evicted = 0
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days is not None else None
+        keep = tuple(keep)
+        while True:
+            with self.lock:
+                over_size = self.max_bytes is not None and self.total_bytes > self.max_bytes
+                row = self.db.execute(
+                    "SELECT id, created FROM recordings r WHERE parent_id IS NULL AND path IS NOT NULL "
+                    "AND NOT EXISTS (SELECT 1 FROM recordings f WHERE f.parent_id = r.id AND f.path IS NULL) "
+                    f"AND id NOT IN ({', '.join('?' * len(keep))}) ORDER BY created LIMIT 1", keep).fetchone()
+            if row is None or not (over_size or (cutoff is not None and row["created"] < cutoff)):
+                return evicted
+            self.delete(row["id"])
+            evicted += 1
+
+    def delete(self, recording_id):
+        """Delete a recording with its fixes, transcripts and files."""
+        with self.lock:
+            rows = self.db.execute("SELECT path, bytes FROM recordings WHERE id = ? OR parent_id = ?",
+                                   (recording_id, recording_id)).fetchall()
+            with self.db:
+                self.db.execute("DELETE FROM recordings WHERE id = ?", (recording_id,))  # Cascades to the rest
+            self.total_bytes -= sum(row["bytes"] for row in rows)
+        for row in rows:
+            if row["path"] is not None:
+                try:
+                    os.remove(os.path.join(self.root, row["path"]))
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_recording_store():
+    """Return the process-wide RecordingStore, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RecordingStore()
+        return _store
+
+
+def set_recording_store(store):
+    """Replace the process-wide RecordingStore."""
+    global _store
+    with _store_lock:
+        _store = store
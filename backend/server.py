@@ -0,0 +1,419 @@
+import asyncio
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import WSMsgType, web
+from .api import PROMPTS, fix_phrases
+from .devices import convert_pcm
+from .llm_client import CircuitOpenError, LLMError
+from .metrics import span
+from .ner_manager import NERManager
+from .playback import Playback
+from .transcriber import Transcriber
+from .utils import AudioClip
+from .vad import EnergyVAD
+
+class Overloaded(Exception):
+    """Raised when the worker pool already has as much work queued as the server accepts."""
+
+
+class Session:
+    """
+    State of one client: its transcripts, its own proper noun memory and a private temp directory.
+
+    Sessions only share the stateless engines (recognizer, TTS and its cache), so concurrent
+    clients never see each other's transcripts or overwrite each other's files.
+    """
+
+    def __init__(self, session_id, directory, ner_manager):
+        self.id = session_id
+        self.directory = directory
+        os.makedirs(directory)
+        self.ner_manager = ner_manager
+        self.transcription = ""
+        self.proper_nouns = []
+        self.fix_transcription = ""
+        self.stream = bytearray()  # PCM streamed over the WebSocket since the last take or fix
+        self.stream_format = (16000, 2)  # (rate, sample_width) of the streamed PCM
+        self.lock = asyncio.Lock()  # One pipeline run per session at a time
+        self.last_active = time.monotonic()
+
+    def path(self, name):
+        """Return the path of a file in the session's temp directory."""
+        return os.path.join(self.directory, name)
+
+    def state(self):
+        return {"session": self.id, "transcription": self.transcription, "proper_nouns": self.proper_nouns,
+                "fix_transcription": self.fix_transcription, "known_nouns": dict(self.ner_manager.get_memory())}
+
+    def close(self):
+        """Remove the session's temp directory."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def check_format(rate, sample_width, nbytes=0):
+    """Raise ValueError unless `nbytes` of PCM at this rate and sample width can be processed."""
+    if sample_width not in (1, 2, 4):
+        raise ValueError(f"sample width must be 1, 2 or 4 bytes, got {sample_width}")
+    if rate <= 0:
+        raise ValueError(f"sample rate must be positive, got {rate}")
+    if nbytes % sample_width:
+        raise ValueError(f"{nbytes} bytes is not a whole number of {sample_width}-byte samples")
+
+
+def decode_audio(body, rate=16000, sample_width=2):
+    """
+    Decode an uploaded WAV file, or raw PCM of the given format, to (pcm, rate, sample_width)
+    as mono PCM. Raises ValueError (or wave.Error, EOFError) for audio that can't be processed.
+    """
+    if body[:4] != b'RIFF':
+        check_format(rate, sample_width, len(body))
+        return body, rate, sample_width
+    with wave.open(io.BytesIO(body), 'rb') as wf:
+        source_format = (wf.getsampwidth(), wf.getnchannels(), wf.getframerate())
+        pcm = wf.readframes(wf.getnframes())
+    check_format(source_format[2], source_format[0])
+    if source_format[1] != 1:
+        pcm = convert_pcm(pcm, source_format, (source_format[0], 1, source_format[2]))
+    return pcm, source_format[2], source_format[0]
+
+
+class DictationServer:
+    """
+    HTTP/WebSocket service that runs dictation sessions for many clients at once.
+
+    Transcription, NER and TTS run on a bounded pool of `workers` threads shared by all sessions.
+    At most `max_pending` jobs may be running or queued; past that new work is turned away with
+    503 and a Retry-After header instead of piling up, and new sessions are refused past
+    `max_sessions`. Sessions idle for `session_ttl` seconds are closed.
+
+        POST   /sessions                  start a session
+        GET    /sessions/{id}             its transcripts and known proper nouns
+        DELETE /sessions/{id}             end it
+        POST   /sessions/{id}/take        transcribe a take (WAV, or raw PCM with ?rate=&width=)
+        POST   /sessions/{id}/fix         correct the last take with a spoken fix
+        GET    /sessions/{id}/speech      the spoken reply to the last take or fix (?speak=1)
+        GET    /sessions/{id}/ws          stream PCM as binary messages, then send {"type": "take"}
+        GET    /stats                     load and queue counters
+    """
+
+    def __init__(self, transcriber=None, ner_factory=NERManager, playback=None, workers=4, max_pending=None,
+                 max_sessions=256, session_ttl=600.0, root=None, vad=True, speed=1.3, max_seconds=120,
+                 fix_playback="changes"):
+        """
+        Initialize the server.
+
+        `transcriber` and `playback` are shared by every session; `ner_factory` makes each
+        session's NERManager, e.g. backend.fakes.FakeNERManager for local stand-ins. Session temp
+        directories go under `root`, by default a fresh temp directory. Takes longer than
+        `max_seconds` are rejected. The reply to a fix speaks only what it changed unless
+        `fix_playback` is "full"; see api.fix_phrases.
+        """
+        self.transcriber = transcriber if transcriber is not None else Transcriber()
+        self.ner_factory = ner_factory
+        self.playback = playback if playback is not None else Playback()
+        self.playback.prewarm(PROMPTS, speed)
+        self.workers = workers
+        self.max_pending = max_pending or workers * 2
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.owns_root = root is None
+        self.root = tempfile.mkdtemp(prefix="dictation-") if root is None else root
+        self.vad = vad  # Trim silence and skip takes with no speech
+        self.speed = speed
+        self.max_seconds = max_seconds
+        self.fix_playback = fix_playback
+        self.sessions = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session")
+        self.pending = 0  # Jobs running or queued on the pool; only touched on the event loop
+        self.counters = {"sessions_opened": 0, "sessions_closed": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self.reaper = None
+
+    # Pipeline, run on the worker pool
+
+    def _trim(self, pcm, rate, sample_width):
+        """Return the audio with silence trimmed, or None if it holds no speech."""
+        if not self.vad or sample_width != 2:
+            return pcm
+        with span("vad", audio_seconds=len(pcm) / (rate * sample_width)) as s:
+            trimmed, stats = EnergyVAD(rate).trim(pcm)
+            s.set(trimmed_seconds=stats["trimmed_seconds"], speech=stats["speech"])
+        return trimmed if stats["speech"] else None
+
+    def _speak(self, session, phrases):
+        """Synthesize the reply into the session's directory and return its URL."""
+        clips = [self.playback.synthesize(text, self.speed) for text in phrases if text]
+        if not clips:
+            return None
+        audio_format = (clips[0].sample_width, clips[0].channels, clips[0].rate)
+        pcm = b''.join(convert_pcm(clip.pcm, (clip.sample_width, clip.channels, clip.rate), audio_format)
+                       for clip in clips)
+        reply = AudioClip(pcm, *audio_format)
+        tmp_path = session.path("speech.wav.tmp")
+        with wave.open(tmp_path, 'wb') as wf:
+            wf.setnchannels(reply.channels)
+            wf.setsampwidth(reply.sample_width)
+            wf.setframerate(reply.rate)
+            wf.writeframes(reply.pcm)
+        os.replace(tmp_path, session.path("speech.wav"))  # A download in progress keeps the old reply
+        return f"/sessions/{session.id}/speech"
+
+    def take(self, session, pcm, rate, sample_width, speak=False):
+        """Transcribe a take and extract its proper nouns."""
+        pcm = self._trim(pcm, rate, sample_width)
+        if pcm is None:
+            session.transcription, session.proper_nouns = "", []
+            return {"transcription": "", "proper_nouns": [], "speech": None}
+
+        session.transcription = self.transcriber.transcribe_audio(pcm, rate, sample_width)
+        if not session.transcription.startswith("Transcription failed"):
+            session.transcription, _ = session.ner_manager.snap_names(session.transcription)
+        session.proper_nouns = session.ner_manager.extract_proper_nouns(session.transcription)
+        result = {"transcription": session.transcription, "proper_nouns": session.proper_nouns, "speech": None}
+        if speak:
+            phrases = [session.transcription, PROMPTS[0], ', '.join(session.proper_nouns)]
+            result["speech"] = self._speak(session, phrases)
+        return result
+
+    def fix(self, session, pcm, rate, sample_width, speak=False):
+        """Correct the session's last take with a spoken fix."""
+        pcm = self._trim(pcm, rate, sample_width)
+        if pcm is None:
+            return {"fix_transcription": "", "transcription": session.transcription,
+                    "proper_nouns": session.proper_nouns, "speech": None}
+
+        session.fix_transcription = self.transcriber.transcribe_audio(pcm, rate, sample_width)
+        original = session.transcription
+        session.transcription, session.proper_nouns = session.ner_manager.correct_and_extract(
+            session.transcription, session.fix_transcription)
+        result = {"fix_transcription": session.fix_transcription, "transcription": session.transcription,
+                  "proper_nouns": session.proper_nouns, "speech": None}
+        if speak:
+            result["speech"] = self._speak(session, fix_phrases(original, session.transcription,
+                                                                session.proper_nouns, self.fix_playback))
+        return result
+
+    # Scheduling
+
+    async def run(self, session, kind, pcm, rate, sample_width, speak=False):
+        """
+        Run a take or fix for a session on the worker pool. Raises Overloaded rather than queue
+        past `max_pending`.
+        """
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise Overloaded(f"{self.pending} jobs pending")
+        method = self.take if kind == "take" else self.fix
+        submitted = time.perf_counter()
+
+        def job():
+            with span(f"server_{kind}", queue_seconds=time.perf_counter() - submitted,
+                      audio_seconds=len(pcm) / (rate * sample_width)):
+                return method(session, pcm, rate, sample_width, speak)
+
+        self.pending += 1
+        try:
+            async with session.lock:
+                result = await asyncio.get_running_loop().run_in_executor(self.executor, job)
+            self.counters["completed"] += 1
+            return result
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+        finally:
+            self.pending -= 1
+            session.last_active = time.monotonic()
+
+    # Sessions
+
+    def open_session(self):
+        if len(self.sessions) >= self.max_sessions:
+            self.counters["rejected"] += 1
+            raise Overloaded(f"{len(self.sessions)} sessions open")
+        session_id = uuid.uuid4().hex
+        session = self.sessions[session_id] = Session(session_id, os.path.join(self.root, session_id),
+                                                      self.ner_factory())
+        self.counters["sessions_opened"] += 1
+        return session
+
+    def close_session(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+            self.counters["sessions_closed"] += 1
+        return session
+
+    async def _reap(self):
+        """Close sessions that have been idle for longer than `session_ttl`."""
+        while True:
+            await asyncio.sleep(max(1.0, self.session_ttl / 4))
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if now - session.last_active > self.session_ttl and not session.lock.locked():
+                    self.close_session(session.id)
+
+    def stats(self):
+        stats = {"sessions": len(self.sessions), "pending": self.pending, "max_pending": self.max_pending,
+                 "workers": self.workers}
+        stats.update(self.counters)
+        return stats
+
+    # HTTP
+
+    def _session(self, request):
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "unknown session"}), content_type="application/json")
+        session.last_active = time.monotonic()
+        return session
+
+    @staticmethod
+    def _failure(e):
+        """Return (status, error, retry_after) for a run that was refused or whose LLM request failed."""
+        if isinstance(e, Overloaded):
+            return 503, "overloaded", 1
+        if isinstance(e, CircuitOpenError):
+            return 503, "llm unavailable", max(1, math.ceil(e.retry_after))
+        return 502, "llm request failed", None
+
+    def _failure_response(self, e):
+        status, error, retry_after = self._failure(e)
+        headers = {"Retry-After": str(retry_after)} if retry_after else None
+        return web.json_response({"error": error, "detail": str(e)}, status=status, headers=headers)
+
+    async def handle_open(self, request):
+        try:
+            session = self.open_session()
+        except Overloaded as e:
+            return self._failure_response(e)
+        return web.json_response({"session": session.id}, status=201)
+
+    async def handle_get(self, request):
+        return web.json_response(self._session(request).state())
+
+    async def handle_close(self, request):
+        self.close_session(self._session(request).id)
+        return web.json_response({"closed": True})
+
+    async def handle_audio(self, request):
+        session = self._session(request)
+        kind = request.match_info["kind"]
+        if kind == "fix" and not session.transcription:
+            return web.json_response({"error": "no take to fix"}, status=409)
+        try:
+            rate = int(request.query.get("rate", 16000))
+            sample_width = int(request.query.get("width", 2))
+            pcm, rate, sample_width = decode_audio(await request.read(), rate, sample_width)
+        except (ValueError, EOFError, wave.Error) as e:
+            return web.json_response({"error": f"bad audio: {e}"}, status=400)
+        if len(pcm) > self.max_seconds * rate * sample_width:
+            return web.json_response({"error": "take too long"}, status=413)
+        speak = request.query.get("speak", "0") not in ("0", "false", "")
+        try:
+            result = await self.run(session, kind, pcm, rate, sample_width, speak)
+        except (Overloaded, LLMError) as e:
+            return self._failure_response(e)
+        return web.json_response(result)
+
+    async def handle_speech(self, request):
+        path = self._session(request).path("speech.wav")
+        if not os.path.exists(path):
+            return web.json_response({"error": "no speech yet"}, status=404)
+        return web.FileResponse(path, headers={"Content-Type": "audio/wav"})
+
+    async def handle_ws(self, request):
+        session = self._session(request)
+        try:
+            session.stream_format = (int(request.query.get("rate", 16000)), int(request.query.get("width", 2)))
+            check_format(*session.stream_format)
+        except ValueError as e:
+            return web.json_response({"error": f"bad audio: {e}"}, status=400)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        max_bytes = self.max_seconds * session.stream_format[0] * session.stream_format[1]
+
+        # Messages are handled one at a time, so a slow pipeline run backs up the client's sends
+        async for message in ws:
+            session.last_active = time.monotonic()
+            if message.type == WSMsgType.BINARY:
+                if len(session.stream) + len(message.data) > max_bytes:
+                    await ws.send_json({"type": "error", "status": 413, "error": "take too long"})
+                    session.stream.clear()
+                    continue
+                session.stream += message.data
+            elif message.type == WSMsgType.TEXT:
+                try:
+                    command = json.loads(message.data)
+                except ValueError:
+                    await ws.send_json({"type": "error", "status": 400, "error": "commands are JSON"})
+                    continue
+                kind = command.get("type")
+                if kind == "reset":
+                    session.stream.clear()
+                    await ws.send_json({"type": "reset"})
+                elif kind in ("take", "fix"):
+                    if kind == "fix" and not session.transcription:
+                        await ws.send_json({"type": "error", "status": 409, "error": "no take to fix"})
+                        continue
+                    try:
+                        check_format(*session.stream_format, len(session.stream))
+                    except ValueError as e:
+                        await ws.send_json({"type": "error", "status": 400, "error": f"bad audio: {e}"})
+                        session.stream.clear()
+                        continue
+                    try:
+                        result = await self.run(session, kind, bytes(session.stream), *session.stream_format,
+                                                speak=bool(command.get("speak")))
+                    except (Overloaded, LLMError) as e:
+                        # Keep the audio so the client can ask again
+                        status, error, retry_after = self._failure(e)
+                        await ws.send_json({"type": "error", "status": status, "error": error,
+                                            "retry_after": retry_after})
+                        continue
+                    session.stream.clear()
+                    result["type"] = kind
+                    await ws.send_json(result)
+                else:
+                    await ws.send_json({"type": "error", "status": 400, "error": f"unknown command {kind!r}"})
+        return ws
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats())
+
+    async def _start(self, app):
+        self.reaper = asyncio.create_task(self._reap())
+
+    async def _stop(self, app):
+        if self.reaper is not None:
+            self.reaper.cancel()
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+        if self.owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def make_app(self):
+        """Return the aiohttp application."""
+        # Uploads are bounded by the longest take, as 16-bit stereo 48 kHz WAV
+        app = web.Application(client_max_size=int(self.max_seconds * 48000 * 4) + 1024)
+        app.router.add_post("/sessions", self.handle_open)
+        app.router.add_get("/sessions/{session_id}", self.handle_get)
+        app.router.add_delete("/sessions/{session_id}", self.handle_close)
+        app.router.add_post("/sessions/{session_id}/{kind:take|fix}", self.handle_audio)
+        app.router.add_get("/sessions/{session_id}/speech", self.handle_speech)
+        app.router.add_get("/sessions/{session_id}/ws", self.handle_ws)
+        app.router.add_get("/stats", self.handle_stats)
+        app.on_startup.append(self._start)
+        app.on_cleanup.append(self._stop)
+        return app
+
+    def serve(self, host="127.0.0.1", port=8765):
+        """Run the server until interrupted."""
+        web.run_app(self.make_app(), host=host, port=port)
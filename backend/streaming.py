@@ -0,0 +1,114 @@
+import queue
+import threading
+import numpy as np
+
+class PauseSegmenter:
+    """Class that cuts a stream of PCM chunks into segments at pauses in speech."""
+
+    def __init__(self, rate, sample_width=2, silence_threshold=500, min_pause=0.6,
+                 min_segment=1.0, max_segment=15.0):
+        """Initialize the segmenter. Durations are in seconds, the threshold is an int16 RMS level."""
+        self.rate = rate
+        self.sample_width = sample_width
+        self.silence_threshold = silence_threshold
+        self.min_pause = min_pause
+        self.min_segment = min_segment
+        self.max_segment = max_segment
+        self._reset()
+
+    def _reset(self):
+        self.chunks = []
+        self.frames = 0
+        self.silent_frames = 0
+        self.has_speech = False
+
+    def _rms(self, chunk):
+        samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+        return float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+
+    def push(self, chunk):
+        """Add a chunk of audio. Returns a finished segment as bytes, or None."""
+        chunk_frames = len(chunk) // self.sample_width
+        self.chunks.append(chunk)
+        self.frames += chunk_frames
+
+        if self._rms(chunk) >= self.silence_threshold:
+            self.has_speech = True
+            self.silent_frames = 0
+        else:
+            self.silent_frames += chunk_frames
+
+        if not self.has_speech:
+            # Only keep a short lead-in of silence before speech starts
+            while self.chunks and self.frames - len(self.chunks[0]) // self.sample_width >= self.min_pause * self.rate:
+                self.frames -= len(self.chunks.pop(0)) // self.sample_width
+            self.silent_frames = self.frames
+            return None
+
+        duration = self.frames / self.rate
+        paused = self.silent_frames >= self.min_pause * self.rate
+        if (paused and duration >= self.min_segment) or duration >= self.max_segment:
+            return self._cut()
+        return None
+
+    def flush(self):
+        """Return whatever speech is left in the current segment, or None."""
+        if not self.has_speech:
+            self._reset()
+            return None
+        return self._cut()
+
+    def _cut(self):
+        segment = b''.join(self.chunks)
+        self._reset()
+        return segment
+
+
+class StreamingTranscriber:
+    """Class that transcribes segments of a recording in the background while it is still being recorded."""
+
+    def __init__(self, transcribe, rate, sample_width=2, segmenter=None):
+        """
+        Initialize the streaming transcriber.
+
+        `transcribe` is called as transcribe(pcm, rate, sample_width) and returns the text of one segment.
+        """
+        self.transcribe = transcribe
+        self.rate = rate
+        self.sample_width = sample_width
+        self.segmenter = segmenter or PauseSegmenter(rate, sample_width)
+        self.chunks = queue.Queue()  # The recorder pushes raw chunks here
+        self.texts = []
+        self.error = None
+        self.worker = None
+
+    def start(self):
+        """Start the background worker."""
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def _run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self._transcribe_segment(self.segmenter.flush())
+                break
+            self._transcribe_segment(self.segmenter.push(chunk))
+
+    def _transcribe_segment(self, segment):
+        if not segment or self.error is not None:
+            return
+        try:
+            text = self.transcribe(segment, self.rate, self.sample_width)
+            if text:
+                self.texts.append(text.strip())
+        except Exception as e:
+            print(f"Error transcribing streamed segment: {e}")
+            self.error = e
+
+    def finish(self):
+        """Signal the end of the recording, wait for the last segment and return the full text."""
+        self.chunks.put(None)
+        if self.worker is not None:
+            self.worker.join()
+        return ' '.join(self.texts)
@@ -0,0 +1,180 @@
+import numpy as np
+from .utils import AudioClip
+
+class TimeStretcher:
+    """
+    Class that changes the speed of 16-bit PCM block by block, so output can be played while
+    later blocks are still being processed.
+
+    With `preserve_pitch=True` it uses WSOLA (waveform-similarity overlap-add): Hann-windowed
+    frames are taken from the input every `speed` times the output hop, each shifted by up to
+    `search_ms` to line up with the natural continuation of the previous frame, and overlap-added.
+    Without it the audio is simply resampled, which raises the pitch along with the speed.
+    """
+
+    def __init__(self, speed, rate, channels=1, preserve_pitch=True, frame_ms=40, search_ms=12):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.speed = float(speed)
+        self.channels = channels
+        self.preserve_pitch = preserve_pitch
+        self.frame = max(4, int(rate * frame_ms / 1000) // 2 * 2)
+        self.hop = self.frame // 2  # Synthesis hop; a periodic Hann window sums to 1 at 50% overlap
+        self.tolerance = int(rate * search_ms / 1000)
+        self.decimation = max(1, rate // 4000)  # Search on a ~4 kHz copy, then refine at full rate
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.frame) / self.frame)).astype(np.float32)[:, None]
+
+        self.input = np.zeros((0, channels), dtype=np.float32)
+        self.input_start = 0  # Absolute index of self.input[0]
+        self.input_total = 0
+        self.output_total = 0
+        self.held = np.zeros((0, channels), dtype=np.float32)  # Output past the running target, not yet returned
+        self.finished = False
+
+        # WSOLA state
+        self.frames_done = 0
+        self.previous = None  # Absolute input position of the last frame that was added
+        self.accumulator = np.zeros((self.frame, channels), dtype=np.float32)
+        # Resampling state
+        self.position = 0.0  # Absolute input position of the next output sample
+
+    def process(self, pcm):
+        """Add a block of PCM and return the stretched PCM that is ready so far."""
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        samples = samples[:len(samples) - len(samples) % self.channels].reshape(-1, self.channels)
+        self.input = np.concatenate([self.input, samples.astype(np.float32)])
+        self.input_total += len(samples)
+        return self._run()
+
+    def flush(self):
+        """Process whatever input is left and return the rest of the output."""
+        self.finished = True
+        return self._run()
+
+    def _run(self):
+        output = self._wsola() if self.preserve_pitch else self._resample()
+        if len(self.held):
+            output = np.concatenate([self.held, output])
+        # Never return more than the stretched length of the input so far; at high speeds a block
+        # can run ahead of it, and the whole clip's output stops at exactly that length
+        target = int(round(self.input_total / self.speed)) - self.output_total
+        self.held = output[max(target, 0):]
+        output = output[:max(target, 0)]
+        if self.finished:
+            # Pad to exactly the stretched length of the input, dropping anything past it
+            self.held = self.held[:0]
+            if len(output) < target:
+                output = np.concatenate([output, np.zeros((target - len(output), self.channels), np.float32)])
+        self.output_total += len(output)
+        return np.clip(np.rint(output), -32768, 32767).astype(np.int16).tobytes()
+
+    def _slice(self, start, length):
+        """Return input[start:start + length] by absolute index, zero-padded past the end."""
+        local = start - self.input_start
+        chunk = self.input[max(local, 0):local + length]
+        if len(chunk) < length:
+            pad = np.zeros((length - len(chunk), self.channels), np.float32)
+            chunk = np.concatenate([pad, chunk]) if local < 0 else np.concatenate([chunk, pad])
+        return chunk
+
+    def _best_offset(self, template, nominal):
+        """Return the input position near `nominal` whose waveform best matches `template`."""
+        low = max(nominal - self.tolerance, 0)
+        high = nominal + self.tolerance
+        length = len(template)
+        region = self._slice(low, high - low + length).mean(axis=1)
+        template = template.mean(axis=1)
+
+        step = self.decimation
+        coarse = np.correlate(region[::step], template[::step], mode='valid')
+        best = int(np.argmax(coarse)) * step
+        fine_low = max(best - step, 0)
+        fine_high = min(best + step, high - low)
+        fine = np.correlate(region[fine_low:fine_high + length], template, mode='valid')
+        return low + fine_low + int(np.argmax(fine))
+
+    def _wsola(self):
+        blocks = []
+        analysis_hop = self.hop * self.speed
+        end = self.input_start + len(self.input)
+        while True:
+            nominal = int(round(self.frames_done * analysis_hop))
+            if nominal >= self.input_total and self.finished:
+                break
+            needed = nominal + self.tolerance + self.frame
+            if self.previous is not None:
+                needed = max(needed, self.previous + self.hop + self.frame)
+            if needed > end and not self.finished:
+                break
+
+            if self.previous is None:
+                position = nominal
+            else:
+                # Line the frame up with how the previous frame would have carried on
+                template = self._slice(self.previous + self.hop, self.frame - self.hop)
+                position = self._best_offset(template, nominal)
+            self.accumulator += self._slice(position, self.frame) * self.window
+            blocks.append(self.accumulator[:self.hop].copy())
+            self.accumulator[:-self.hop] = self.accumulator[self.hop:]
+            self.accumulator[-self.hop:] = 0
+            self.previous = position
+            self.frames_done += 1
+
+        if self.finished:
+            blocks.append(self.accumulator[:self.frame - self.hop].copy())
+            self.accumulator[:] = 0
+
+        # Drop input that no later frame can reach
+        keep_from = min(int(round(self.frames_done * analysis_hop)) - self.tolerance,
+                        (self.previous if self.previous is not None else 0) + self.hop)
+        self._trim(keep_from)
+        return np.concatenate(blocks) if blocks else np.zeros((0, self.channels), np.float32)
+
+    def _resample(self):
+        end = self.input_start + len(self.input)
+        last = end - 1 if not self.finished else end  # Interpolating needs the next sample too
+        count = int(np.floor((last - 1 - self.position) / self.speed)) + 1 if last - 1 >= self.position else 0
+        if count <= 0:
+            return np.zeros((0, self.channels), np.float32)
+
+        positions = self.position + self.speed * np.arange(count)
+        local = positions - self.input_start
+        index = np.minimum(local.astype(np.int64), len(self.input) - 1)
+        following = np.minimum(index + 1, len(self.input) - 1)
+        fraction = (local - index)[:, None].astype(np.float32)
+        output = self.input[index] * (1 - fraction) + self.input[following] * fraction
+        self.position += self.speed * count
+        self._trim(int(self.position))
+        return output
+
+    def _trim(self, keep_from):
+        drop = min(keep_from - self.input_start, len(self.input))  # The next position can be past the input
+        if drop > 0:
+            self.input = self.input[drop:]
+            self.input_start += drop
+
+
+def time_stretch(clip, speed, preserve_pitch=True):
+    """Return a 16-bit AudioClip played `speed` times faster, with or without its original pitch."""
+    if clip.sample_width != 2:
+        raise ValueError("time_stretch needs 16-bit PCM")
+    if speed == 1.0:
+        return clip
+    stretcher = TimeStretcher(speed, clip.rate, clip.channels, preserve_pitch)
+    return AudioClip(stretcher.process(clip.pcm) + stretcher.flush(), 2, clip.channels, clip.rate)
+
+
+def stretch_blocks(clip, speed, preserve_pitch=True, block_seconds=0.5):
+    """Yield the stretched clip as a series of AudioClips, each covering `block_seconds` of input."""
+    if clip.sample_width != 2:
+        raise ValueError("time_stretch needs 16-bit PCM")
+    stretcher = TimeStretcher(speed, clip.rate, clip.channels, preserve_pitch)
+    block_bytes = max(1, int(block_seconds * clip.rate)) * 2 * clip.channels
+    pcm = memoryview(clip.pcm)
+    for start in range(0, len(pcm), block_bytes):
+        output = stretcher.process(pcm[start:start + block_bytes])
+        if output:
+            yield AudioClip(output, 2, clip.channels, clip.rate)
+    output = stretcher.flush()
+    if output:
+        yield AudioClip(output, 2, clip.channels, clip.rate)
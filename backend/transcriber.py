@@ -1,29 +1,93 @@
 import speech_recognition
 import os
+from .engines import Engine, GoogleEngine, create_engine
+from .metrics import span
+from .preprocess import prepare_upload
 
 class Transcriber:
-    """Class responsible for transcribing recorded audio using Google Web Speech API."""
+    """Class responsible for transcribing recorded audio using Google Web Speech API or another engine."""
 
-    def __init__(self):
-        """Initialize the recognizer for Google Web Speech API."""
+    def __init__(self, engine=None, target_rate=16000):
+        """
+        Initialize the recognizer.
+
+        `engine` is an Engine or the name of one (see engines.create_engine); the default is
+        the Google Web Speech API. Audio is downsampled to `target_rate` (None to disable) before
+        recognition, and FLAC-encoded in memory if the engine uploads it.
+        """
+        self.target_rate = target_rate
+        self.upload_stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0, "bytes_saved": 0}
         self.recognizer = speech_recognition.Recognizer()
+        if engine is None:
+            engine = GoogleEngine(self.recognizer)
+        elif not isinstance(engine, Engine):
+            engine = create_engine(engine)
+        self.engine = engine
 
-    def transcribe_audio(self, audio_file):
-        """Transcribe the given audio file using Google Web Speech API."""
-        try:
-            # Load the audio file
-            with speech_recognition.AudioFile(audio_file) as source:
-                audio = self.recognizer.record(source)  # Record the audio from the file
+    def transcribe_audio(self, audio, sample_rate=None, sample_width=None):
+        """
+        Transcribe audio with the transcriber's Engine: the Google Web Speech API by default, or
+        e.g. the offline sphinx or vosk engine. The audio is preprocessed for the engine first.
 
-            # Use Google Web Speech API to transcribe the audio
-            text = self.recognizer.recognize_google(audio)
+        `audio` can be a path to a WAV file, an AudioData object, or raw PCM (bytes, bytearray
+        or memoryview) together with its sample rate and sample width.
+        """
+        audio = self.preprocess(self.to_audio_data(audio, sample_rate, sample_width))
+        try:
+            # Hand the audio to the selected engine
+            with span("transcribe", engine=self.engine.name, **self.audio_attributes(audio)) as transcribe:
+                text = self.recognize(audio)
+                transcribe.set(chars_out=len(text))
             return text  # Return the transcribed text
 
         except speech_recognition.UnknownValueError:
-            print("Google Web Speech API could not understand the audio")
+            print(f"Speech recognition engine '{self.engine.name}' could not understand the audio")
             return "Transcription failed: Audio not understood."
 
         except speech_recognition.RequestError as e:
-            print(f"Could not request results from Google Web Speech API; {e}")
+            print(f"Could not request results from speech recognition engine '{self.engine.name}'; {e}")
             return f"Transcription failed: {e}"
 
+    def to_audio_data(self, audio, sample_rate=None, sample_width=None):
+        """Convert a file path or raw PCM buffer to an AudioData object without copying the PCM."""
+        if isinstance(audio, speech_recognition.AudioData):
+            return audio
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            if sample_rate is None or sample_width is None:
+                raise ValueError("sample_rate and sample_width are required for raw PCM audio")
+            return speech_recognition.AudioData(audio, sample_rate, sample_width)
+
+        # Load the audio file
+        with speech_recognition.AudioFile(os.fspath(audio)) as source:
+            return self.recognizer.record(source)  # Record the audio from the file
+
+    def preprocess(self, audio):
+        """Downsample (and for uploading engines, FLAC-encode) audio before recognition."""
+        if not self.engine.upload and (self.target_rate is None or audio.sample_rate <= self.target_rate):
+            return audio
+        with span("preprocess", **self.audio_attributes(audio)) as preprocess:
+            audio, stats = prepare_upload(audio, self.target_rate, compress=self.engine.upload)
+            preprocess.set(bytes_out=stats["bytes_out"], bytes_saved=stats["bytes_saved"])
+        self.upload_stats["requests"] += 1
+        for key, value in stats.items():
+            self.upload_stats[key] += value
+        return audio
+
+    def recognize(self, audio):
+        """Send an AudioData object to the engine and return the text."""
+        return self.engine.recognize(audio)
+
+    def transcribe_segment(self, pcm, rate, sample_width):
+        """Transcribe one streamed segment of raw PCM. Returns "" if no speech was understood."""
+        audio = self.preprocess(self.to_audio_data(pcm, rate, sample_width))
+        try:
+            with span("transcribe_segment", engine=self.engine.name, **self.audio_attributes(audio)):
+                return self.recognize(audio)
+        except speech_recognition.UnknownValueError:
+            return ""
+
+    @staticmethod
+    def audio_attributes(audio):
+        """Span attributes describing an AudioData object."""
+        nbytes = len(audio.frame_data)
+        return {"audio_seconds": nbytes / float(audio.sample_rate * audio.sample_width), "bytes_in": nbytes}
@@ -0,0 +1,59 @@
+import html
+
+MARKED_STYLE = "color: red; text-decoration: underline;"
+
+
+class Transcript:
+    """
+    Editor model of a transcription shown as clickable words.
+
+    Keeps each word's character offset in the rendered text and the set of words marked
+    wrong, so marking a word touches only that word's span and the WER is a running count
+    instead of a rescan of the document.
+    """
+
+    def __init__(self, text=""):
+        self.words = text.split()
+        self.offsets = []  # Start of each word in the text, words being separated by one space
+        position = 0
+        for word in self.words:
+            self.offsets.append(position)
+            position += len(word) + 1
+        self.marked = set()  # Indexes of the words marked wrong
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def text(self):
+        return ' '.join(self.words)
+
+    @property
+    def wer(self):
+        """Percentage of words marked wrong."""
+        return len(self.marked) / len(self.words) * 100 if self.words else 0.0
+
+    def span(self, index):
+        """Return the (start, end) character offsets of a word."""
+        start = self.offsets[index]
+        return start, start + len(self.words[index])
+
+    def toggle(self, index):
+        """Mark a word wrong, or unmark it if it was. Returns whether it is now marked."""
+        if index in self.marked:
+            self.marked.remove(index)
+            return False
+        self.marked.add(index)
+        return True
+
+    def render(self, start=0, end=None):
+        """Return the HTML for words [start, end), each a link to its index, marked words in red."""
+        end = len(self.words) if end is None else min(end, len(self.words))
+        formatted_words = []
+        for index in range(start, end):
+            word = html.escape(self.words[index])
+            if index in self.marked:
+                formatted_words.append(f'<a href="{index}" style="{MARKED_STYLE}">{word}</a>')
+            else:
+                formatted_words.append(f'<a href="{index}">{word}</a>')
+        return ' '.join(formatted_words)
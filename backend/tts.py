@@ -0,0 +1,106 @@
+import io
+import shutil
+import subprocess
+import wave
+from .metrics import span
+from .utils import AudioClip
+
+class TTSProvider:
+    """
+    Base class for text-to-speech providers used by Playback.
+
+    `synthesize(text, lang)` returns the speech at normal speed as an AudioClip of 16-bit PCM,
+    decoded entirely in memory.
+    """
+
+    name = "tts"
+
+    def synthesize(self, text, lang):
+        raise NotImplementedError
+
+
+def decode_mp3(data, rate=24000, channels=1, command=None):
+    """
+    Decode MP3 bytes to 16-bit PCM in memory.
+
+    Uses the miniaudio package in-process if it is installed, otherwise pipes the MP3 through
+    ffmpeg (`command`) without touching the disk.
+    """
+    if command is None:
+        try:
+            import miniaudio
+        except ImportError:
+            command = ["ffmpeg"]
+        else:
+            decoded = miniaudio.decode(data, output_format=miniaudio.SampleFormat.SIGNED16,
+                                       nchannels=channels, sample_rate=rate)
+            return decoded.samples.tobytes()
+
+    result = subprocess.run(list(command) + ["-v", "error", "-i", "pipe:0", "-f", "s16le",
+                                             "-ac", str(channels), "-ar", str(rate), "pipe:1"],
+                            input=data, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not decode MP3: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+class GTTSProvider(TTSProvider):
+    """Provider that synthesizes with Google Translate's TTS (gTTS) and decodes its MP3 in memory."""
+
+    name = "gtts"
+
+    def __init__(self, rate=24000, decoder=None):
+        """gTTS returns 24 kHz mono MP3; `decoder` overrides the ffmpeg command used to decode it."""
+        self.rate = rate
+        self.decoder = decoder
+
+    def synthesize(self, text, lang):
+        import gtts
+
+        with span("tts_synthesis", provider=self.name, chars_in=len(text)) as synthesis:
+            mp3 = io.BytesIO()
+            gtts.gTTS(text=text, lang=lang).write_to_fp(mp3)
+            synthesis.set(bytes_out=mp3.tell())
+
+        with span("mp3_decode", bytes_in=mp3.tell()) as decode:
+            pcm = decode_mp3(mp3.getvalue(), self.rate, 1, self.decoder)
+            decode.set(bytes_out=len(pcm), audio_seconds=len(pcm) / (2.0 * self.rate))
+        return AudioClip(pcm, 2, 1, self.rate)
+
+
+class EspeakProvider(TTSProvider):
+    """Offline provider that runs eSpeak NG (or eSpeak) and reads its WAV output from a pipe."""
+
+    name = "espeak"
+
+    def __init__(self, command=None, voice=None, words_per_minute=175):
+        """`voice` defaults to the playback language."""
+        self.command = command or [shutil.which("espeak-ng") or "espeak"]
+        self.voice = voice
+        self.words_per_minute = words_per_minute
+
+    def synthesize(self, text, lang):
+        with span("tts_synthesis", provider=self.name, chars_in=len(text)) as synthesis:
+            result = subprocess.run(list(self.command) + ["--stdout", "--stdin", "-v", self.voice or lang,
+                                                          "-s", str(self.words_per_minute)],
+                                    input=text.encode("utf-8"), capture_output=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"espeak failed: {result.stderr.decode(errors='replace').strip()}")
+            synthesis.set(bytes_out=len(result.stdout))
+
+        # eSpeak streams its WAV, so the header's sizes can't be trusted; take everything after it
+        with wave.open(io.BytesIO(result.stdout), 'rb') as wf:
+            sample_width, channels, rate = wf.getsampwidth(), wf.getnchannels(), wf.getframerate()
+        data = result.stdout.find(b"data")
+        pcm = result.stdout[data + 8:] if data != -1 else b""
+        frame_bytes = sample_width * channels
+        return AudioClip(pcm[:len(pcm) - len(pcm) % frame_bytes], sample_width, channels, rate)
+
+
+def create_provider(name, **options):
+    """Create a TTS provider by name: "gtts" or "espeak" (offline)."""
+    if name == "gtts":
+        return GTTSProvider(**options)
+    if name == "espeak":
+        return EspeakProvider(**options)
+    raise ValueError(f"Unknown TTS provider {name!r}")
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+import wave
+from collections import OrderedDict
+from .utils import AudioClip
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "voice_dictation", "tts")
+
+class TTSCache:
+    """
+    Two-tier cache of synthesized speech keyed by (text, lang, speed).
+
+    Decoded PCM is kept in an in-memory LRU and backed by WAV files on disk. Both tiers are
+    bounded by size and evict least recently used entries first.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_bytes=32 * 2**20, max_disk_bytes=256 * 2**20):
+        """Initialize the cache. Pass cache_dir=None to keep it in memory only."""
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()  # key -> AudioClip, least recently used first
+        self.memory_bytes = 0
+        self.disk = OrderedDict()  # key -> file size, least recently used first
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(text, lang, speed):
+        """Return the content address for a phrase."""
+        payload = json.dumps([text, lang, round(float(speed), 4)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU from file modification times."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".wav"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_bytes += size
+
+    def get(self, text, lang, speed, record_stats=True):
+        """Return the cached AudioClip for a phrase, or None."""
+        key = self.make_key(text, lang, speed)
+        with self.lock:
+            clip = self.memory.get(key)
+            if clip is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += record_stats
+                return clip
+            if key not in self.disk:
+                self.misses += record_stats
+                return None
+
+        clip = self._read(key)
+        with self.lock:
+            if clip is None:
+                self.misses += record_stats
+                return None
+            self.disk_hits += record_stats
+            if key in self.disk:
+                self.disk.move_to_end(key)
+            self._put_memory(key, clip)
+        return clip
+
+    def put(self, text, lang, speed, clip):
+        """Store a synthesized clip in both tiers."""
+        key = self.make_key(text, lang, speed)
+        with self.lock:
+            self._put_memory(key, clip)
+        if self.cache_dir is not None:
+            self._write(key, clip)
+
+    def _put_memory(self, key, clip):
+        if len(clip.pcm) > self.max_memory_bytes:
+            return
+        old = self.memory.pop(key, None)
+        if old is not None:
+            self.memory_bytes -= len(old.pcm)
+        self.memory[key] = clip
+        self.memory_bytes += len(clip.pcm)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted.pcm)
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with wave.open(path, 'rb') as wf:
+                clip = AudioClip(wf.readframes(wf.getnframes()), wf.getsampwidth(), wf.getnchannels(), wf.getframerate())
+            os.utime(path)  # Keep the on-disk LRU order across restarts
+            return clip
+        except (OSError, EOFError, wave.Error) as e:
+            print(f"Dropping unreadable TTS cache entry {path}: {e}")
+            with self.lock:
+                self._forget_disk(key)
+            return None
+
+    def _write(self, key, clip):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with wave.open(tmp_path, 'wb') as wf:
+                wf.setnchannels(clip.channels)
+                wf.setsampwidth(clip.sample_width)
+                wf.setframerate(clip.rate)
+                wf.writeframes(clip.pcm)
+            os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+        except OSError as e:
+            print(f"Could not write TTS cache entry {path}: {e}")
+            return
+
+        size = os.path.getsize(path)
+        with self.lock:
+            self.disk_bytes -= self.disk.pop(key, 0)
+            self.disk[key] = size
+            self.disk_bytes += size
+            while self.disk_bytes > self.max_disk_bytes and len(self.disk) > 1:
+                evicted = next(iter(self.disk))
+                self._forget_disk(evicted)
+                try:
+                    os.remove(self._path(evicted))
+                except OSError:
+                    pass
+
+    def _forget_disk(self, key):
+        self.disk_bytes -= self.disk.pop(key, 0)
+
+    def clear(self):
+        """Remove every entry from both tiers."""
+        with self.lock:
+            keys = list(self.disk)
+            self.memory.clear()
+            self.memory_bytes = 0
+            self.disk.clear()
+            self.disk_bytes = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return hit/miss counters and the size of each tier."""
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self.disk),
+                "disk_bytes": self.disk_bytes,
+            }
@@ -1,3 +1,31 @@
+import importlib
+import math
+from collections import namedtuple
+
 def spell_out(word):
     """Spell out the word letter by letter."""
     return ' '.join([letter.upper() for letter in word])
+
+class AudioClip(namedtuple('AudioClip', ['pcm', 'sample_width', 'channels', 'rate'])):
+    """Decoded PCM audio together with its format."""
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        """Length of the clip in seconds."""
+        return len(self.pcm) / (self.sample_width * self.channels * self.rate)
+
+def load_factory(spec):
+    """Load a recognizer factory given as "module:function"."""
+    module_name, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"Recognizer factory must look like module:function, got {spec!r}")
+    return getattr(importlib.import_module(module_name), attribute)
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
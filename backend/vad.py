@@ -0,0 +1,98 @@
+import numpy as np
+
+class EnergyVAD:
+    """
+    Class that finds speech in 16-bit mono PCM by the energy of short frames.
+
+    A frame is speech if its level (RMS after removing DC) reaches `threshold`, or `noise_factor`
+    times the recording's noise floor (its 10th-percentile frame level) if that is higher, though
+    never more than half the loudest frame's level. Bursts shorter than `min_speech` seconds are
+    ignored, and `padding` seconds of context are kept around speech so word onsets and endings
+    aren't clipped.
+    """
+
+    def __init__(self, rate, threshold=500, noise_factor=3.0, frame_ms=20, min_speech=0.1, padding=0.25,
+                 max_pause=None):
+        """`max_pause`, if set, shortens every pause between words longer than that many seconds to it."""
+        self.rate = rate
+        self.threshold = threshold
+        self.noise_factor = noise_factor
+        self.frame = max(1, int(rate * frame_ms / 1000))
+        self.min_speech = min_speech
+        self.padding = padding
+        self.max_pause = max_pause
+
+    def levels(self, samples):
+        """Return the level of each whole frame."""
+        count = len(samples) // self.frame
+        frames = samples[:count * self.frame].reshape(count, self.frame).astype(np.float32)
+        return frames.std(axis=1)
+
+    def speech_mask(self, samples):
+        """Return a boolean per frame saying whether it is (padded) speech."""
+        levels = self.levels(samples)
+        if not len(levels):
+            return np.zeros(0, dtype=bool)
+        noise_floor = float(np.percentile(levels, 10))
+        threshold = max(self.threshold, min(self.noise_factor * noise_floor, 0.5 * float(levels.max())))
+        mask = levels >= threshold
+
+        # Drop bursts shorter than min_speech
+        starts, ends = self._runs(mask)
+        min_frames = max(1, int(round(self.min_speech * self.rate / self.frame)))
+        for start, end in zip(starts, ends):
+            if end - start < min_frames:
+                mask[start:end] = False
+
+        # Keep some context around what's left
+        pad = int(round(self.padding * self.rate / self.frame))
+        if pad and mask.any():
+            mask = np.convolve(mask, np.ones(2 * pad + 1), mode='same') > 0
+        return mask
+
+    @staticmethod
+    def _runs(mask):
+        """Return the start and end (exclusive) indices of each run of True."""
+        edges = np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    def segments(self, pcm):
+        """Return the (start, end) sample ranges that contain speech."""
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        mask = self.speech_mask(samples)
+        starts, ends = self._runs(mask)
+        # Speech that runs into the last frame keeps the partial frame after it too
+        return [(int(start) * self.frame, len(samples) if end == len(mask) else int(end) * self.frame)
+                for start, end in zip(starts, ends)]
+
+    def trim(self, pcm):
+        """
+        Cut leading and trailing silence (and shorten long pauses if `max_pause` is set).
+
+        Returns (pcm, stats) where stats has input_seconds, output_seconds, trimmed_seconds and
+        speech. With no speech at all the returned PCM is empty.
+        """
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        segments = self.segments(pcm)
+        if not segments:
+            kept = samples[:0]
+        elif self.max_pause is None:
+            kept = samples[segments[0][0]:segments[-1][1]]
+        else:
+            keep = int(self.max_pause * self.rate)
+            pieces = [samples[segments[0][0]:segments[0][1]]]
+            for (_, previous_end), (start, end) in zip(segments, segments[1:]):
+                if start - previous_end > keep:
+                    # Keep half the allowed pause after the last word and half before the next
+                    pieces.append(samples[previous_end:previous_end + keep // 2])
+                    pieces.append(samples[start - (keep - keep // 2):end])
+                else:
+                    pieces.append(samples[previous_end:end])
+            kept = np.concatenate(pieces)
+
+        input_seconds = len(samples) / self.rate
+        output_seconds = len(kept) / self.rate
+        stats = {"input_seconds": input_seconds, "output_seconds": output_seconds,
+                 "trimmed_seconds": input_seconds - output_seconds, "speech": bool(segments)}
+        # Without changes, hand back the original buffer rather than a copy
+        return (pcm if len(kept) == len(samples) else kept.tobytes()), stats
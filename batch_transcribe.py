@@ -0,0 +1,28 @@
+import argparse
+import json
+from backend.batch import BatchTranscriber, find_inputs
+from backend.utils import load_factory
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe a directory or manifest of WAV files in parallel.")
+    parser.add_argument('source', help="Directory of WAV files, or a manifest with one path per line")
+    parser.add_argument('-o', '--output', default="transcriptions.jsonl", help="JSONL file to append results to")
+    parser.add_argument('-j', '--workers', type=int, default=4, help="Number of parallel workers")
+    parser.add_argument('--processes', action='store_true', help="Use worker processes instead of threads")
+    parser.add_argument('--recognizer', default="backend.batch:google_recognizer",
+                        help="Recognizer factory as module:function")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Don't print a line per file")
+    args = parser.parse_args()
+
+    paths = find_inputs(args.source)
+    batch = BatchTranscriber(load_factory(args.recognizer), workers=args.workers, processes=args.processes)
+
+    def progress(record):
+        if not args.quiet:
+            print(f"[{record['status']}] {record['path']} ({record['latency_s']:.2f}s)")
+
+    stats = batch.run(paths, args.output, progress=progress)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark peak memory and allocations for capturing a long dictation.
+
+Compares the old list-of-bytes capture (one bytes object per 1024-frame read, joined on save)
+with CaptureBuffer. Each mode runs in its own process so peak RSS is measured independently.
+
+    python -m benchmarks.bench_capture_buffer --seconds 3600
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from backend.capture_buffer import CaptureBuffer
+
+RATE = 44100
+CHUNK = 1024
+SAMPLE_WIDTH = 2
+
+
+def capture_list(chunks):
+    frames = []
+    for _ in range(chunks):
+        frames.append(bytes(CHUNK * SAMPLE_WIDTH))
+    return frames, b''.join(frames)  # save_audio joined every chunk into one more copy
+
+
+def capture_buffer(chunks):
+    buffer = CaptureBuffer(block_size=RATE * SAMPLE_WIDTH * 10)
+    for _ in range(chunks):
+        buffer.append(bytes(CHUNK * SAMPLE_WIDTH))
+    return buffer, buffer.view()
+
+
+def run_mode(mode, seconds, trace):
+    chunks = int(seconds * RATE / CHUNK)
+    capture = capture_list if mode == "list" else capture_buffer
+    blocks_before = sys.getallocatedblocks()
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    store, pcm = capture(chunks)
+    elapsed = time.perf_counter() - start
+    traced_peak = tracemalloc.get_traced_memory()[1] if trace else None
+    result = {
+        "mode": mode,
+        "seconds": seconds,
+        "chunks": chunks,
+        "pcm_bytes": len(pcm),
+        "capture_s": round(elapsed, 3),
+        "live_blocks": sys.getallocatedblocks() - blocks_before,
+        "traced_peak_mb": None if traced_peak is None else round(traced_peak / 2**20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if mode == "buffer":
+        result["reallocations"] = store.reallocations
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture buffer memory benchmark")
+    parser.add_argument('--seconds', type=float, default=3600)
+    parser.add_argument('--trace', action='store_true', help="Also record tracemalloc peaks (slower)")
+    parser.add_argument('--mode', choices=["list", "buffer"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.seconds, args.trace)))
+        return
+
+    for mode in ("list", "buffer"):
+        command = [sys.executable, "-m", "benchmarks.bench_capture_buffer", "--mode", mode, "--seconds", str(args.seconds)]
+        if args.trace:
+            command.append("--trace")
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        print(output.strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare the latency and real-time factor of the speech recognition engines.
+
+Each engine is created once (so local engines load their model before timing starts) and then
+transcribes every WAV file given, `--repeat` times.
+
+    python -m benchmarks.bench_engines recordings/*.wav --engines google sphinx vosk
+"""
+import argparse
+import json
+import time
+import speech_recognition
+from backend.engines import create_engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speech recognition engine latency benchmark")
+    parser.add_argument('files', nargs='+', help="WAV files to transcribe")
+    parser.add_argument('--engines', nargs='+', default=["google", "sphinx", "vosk"])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--vosk-model', help="Path to a Vosk model directory")
+    args = parser.parse_args()
+
+    recognizer = speech_recognition.Recognizer()
+    clips = []
+    for path in args.files:
+        with speech_recognition.AudioFile(path) as source:
+            clips.append(recognizer.record(source))
+
+    results = []
+    for name in args.engines:
+        options = {"model_path": args.vosk_model} if name == "vosk" and args.vosk_model else {}
+        engine = create_engine(name, **options)
+        try:
+            # Wait for local engines to load and warm up, so the first timed call is representative
+            start = time.perf_counter()
+            try:
+                engine.recognize(clips[0])
+            except speech_recognition.UnknownValueError:
+                pass
+            except speech_recognition.RequestError as e:
+                print(f"{name}: unavailable ({e})")
+                continue
+            startup = time.perf_counter() - start
+            engine.latencies.clear()
+            engine.rtfs.clear()
+
+            for _ in range(args.repeat):
+                for clip in clips:
+                    try:
+                        engine.recognize(clip)
+                    except (speech_recognition.UnknownValueError, speech_recognition.RequestError):
+                        pass
+            stats = engine.stats()
+            stats["first_call_s"] = startup
+            results.append(stats)
+            print(f"{name:<8} calls={stats['calls']:<4} p50={stats['latency_p50_s'] * 1000:8.1f} ms  "
+                  f"p95={stats['latency_p95_s'] * 1000:8.1f} ms  RTF={stats['rtf_mean']:.3f}  "
+                  f"first call={startup:.2f} s")
+        finally:
+            engine.close()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
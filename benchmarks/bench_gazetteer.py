@@ -0,0 +1,87 @@
+"""
+Gazetteer scaling benchmark.
+
+Fills a gazetteer with `--names` synthetic first/last name pairs and times loading it back
+from SQLite, exact and sound-alike lookups, prefix completion and snapping a transcription.
+
+    python -m benchmarks.bench_gazetteer --names 100000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from backend.utils import percentile
+from backend.gazetteer import Gazetteer
+
+SYLLABLES = ["ka", "ri", "van", "so", "mel", "ta", "nor", "vik", "lin", "da", "shan", "bro", "el", "mi", "ra",
+             "sen", "tor", "ga", "li", "on", "pa", "lo", "al", "to", "ber", "na", "deep", "ash", "win", "zo"]
+
+
+def make_name(rng, syllables):
+    return "".join(rng.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+def timed(function, inputs):
+    """Return per-call latencies in microseconds."""
+    latencies = []
+    for value in inputs:
+        start = time.perf_counter()
+        function(value)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return {"p50_us": round(percentile(latencies, 0.50), 1), "p95_us": round(percentile(latencies, 0.95), 1),
+            "p99_us": round(percentile(latencies, 0.99), 1)}
+
+
+def misspell(rng, name):
+    """A sound-alike misspelling, as a recognizer might produce."""
+    for old, new in (("k", "c"), ("c", "k"), ("ph", "f"), ("v", "w"), ("ee", "i"), ("sh", "sch")):
+        if old in name:
+            return name.replace(old, new, 1)
+    return name + name[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gazetteer scaling benchmark")
+    parser.add_argument('--names', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = list({f"{make_name(rng, rng.randint(1, 3))} {make_name(rng, rng.randint(2, 4))}" for _ in range(args.names)})
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "gazetteer.sqlite3")
+        gazetteer = Gazetteer(path)
+        start = time.perf_counter()
+        gazetteer.add(names, count=gazetteer.min_count)  # Seen often enough to be trusted for snapping
+        build = time.perf_counter() - start
+        gazetteer.close()
+
+        start = time.perf_counter()
+        gazetteer = Gazetteer(path)
+        load = time.perf_counter() - start
+
+        sample = rng.sample(names, min(args.queries, len(names)))
+        sentences = [f"Yesterday I met {misspell(rng, name)} and we talked about the plan for a while." for name in sample]
+        results = {
+            "names": len(gazetteer),
+            "build_s": round(build, 3),
+            "load_s": round(load, 3),
+            "exact": timed(lambda name: name in gazetteer, sample),
+            "sounds_like": timed(gazetteer.sounds_like, [misspell(rng, name) for name in sample]),
+            "match": timed(gazetteer.match, [misspell(rng, name) for name in sample]),
+            "complete": timed(gazetteer.complete, [name[:3] for name in sample]),
+            "snap_sentence": timed(gazetteer.snap, sentences),
+        }
+        # How often the misspelled name was snapped back to the right one, rather than left alone or mismatched
+        snapped = [name in gazetteer.snap(sentence)[0] for name, sentence in zip(sample, sentences)]
+        results["snap_recovered"] = round(sum(snapped) / len(snapped), 3)
+        gazetteer.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+End-to-end latency benchmark for VoiceDictationTool with local stand-in engines.
+
+Drives stop_recording and process_fix on canned audio through a headless device, with fake
+recognizer, LLM and TTS backends of configurable latency and jitter, and reports the time from
+pressing stop to each stage (text, proper nouns / correction, first audio, done).
+
+    python -m benchmarks.bench_pipeline --iterations 10 -o results.json
+    python -m benchmarks.bench_pipeline --compare results.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+import wave
+import numpy as np
+from backend.api import PROMPTS, VoiceDictationTool
+from backend.devices import AudioDeviceManager, NullBackend
+from backend.fakes import FakeNERManager, FakePlayback, FakeTranscriber, Latency
+from backend.metrics import HistogramSink, get_metrics
+
+RATE = 44100
+
+
+class TimingBackend(NullBackend):
+    """NullBackend that records when the first audio reaches the output after mark()."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.first_write = None
+
+    def mark(self):
+        self.first_write = None
+
+    def open_output(self, *args):
+        stream = super().open_output(*args)
+        write = stream.write
+
+        def timed_write(data):
+            if self.first_write is None:
+                self.first_write = time.perf_counter()
+            write(data)
+
+        stream.write = timed_write
+        return stream
+
+
+def canned_speech(seconds, rate=RATE):
+    """Speech-like audio: 0.8 s tone bursts separated by 0.4 s pauses."""
+    t = np.arange(int(seconds * rate)) / rate
+    voiced = (t % 1.2) < 0.8
+    return (np.sin(2 * np.pi * 180 * t) * 6000 * voiced).astype(np.int16).tobytes()
+
+
+def summarize(values):
+    ordered = sorted(values)
+    return {
+        "mean": round(statistics.fmean(ordered), 2),
+        "p50": round(ordered[len(ordered) // 2], 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 2),
+        "min": round(ordered[0], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_take(tool, backend, record_seconds, samples):
+    """Record one take and time stop_recording's stages."""
+    stages = {}
+    tool.start_recording()
+    time.sleep(record_seconds)
+    backend.mark()
+    start = time.perf_counter()
+    tool.stop_recording(progress=lambda stage, value: stages.setdefault(stage, time.perf_counter()))
+    end = time.perf_counter()
+
+    samples["stop_to_text_ms"].append((stages["transcription"] - start) * 1000)
+    samples["stop_to_proper_nouns_ms"].append((stages["proper_nouns"] - start) * 1000)
+    samples["stop_to_first_audio_ms"].append(((backend.first_write or end) - start) * 1000)
+    samples["stop_to_done_ms"].append((end - start) * 1000)
+
+
+def run_fix(tool, backend, record_seconds, samples):
+    """Record one fix and time process_fix's stages."""
+    stages = {}
+    tool.start_fix_recording()
+    time.sleep(record_seconds)
+    backend.mark()
+    start = time.perf_counter()
+    tool.process_fix(tool.transcription, progress=lambda stage, value: stages.setdefault(stage, time.perf_counter()))
+    end = time.perf_counter()
+
+    samples["stop_to_text_ms"].append((stages["fix_transcription"] - start) * 1000)
+    samples["stop_to_correction_ms"].append((stages["corrected_transcription"] - start) * 1000)
+    samples["stop_to_first_audio_ms"].append(((backend.first_write or end) - start) * 1000)
+    samples["stop_to_done_ms"].append((end - start) * 1000)
+
+
+def run(args):
+    if args.audio:
+        with wave.open(args.audio, 'rb') as wf:
+            speech = wf.readframes(wf.getnframes())
+    else:
+        speech = canned_speech(args.record_seconds + args.fix_seconds + 1)
+    # The input stream stays open across takes, so supply enough audio for every iteration
+    backend = TimingBackend(input_pcm=speech * (args.iterations + 1), realtime=True)
+    device = AudioDeviceManager(backend)
+    seed = args.seed
+    tool = VoiceDictationTool(
+        proper_nouns=args.mode, streaming=args.streaming, archive=False, device=device,
+        transcriber=FakeTranscriber(latency=Latency(args.asr_latency, args.asr_jitter, seed),
+                                    per_second=args.asr_per_second),
+        ner_manager=FakeNERManager(latency=Latency(args.llm_latency, args.llm_jitter, seed)),
+        playback=FakePlayback(latency=Latency(args.tts_latency, args.tts_jitter, seed),
+                              seconds_per_char=args.seconds_per_char, device=device),
+        warm_up=False,
+    )
+    tool.warm_up(background=False, modules=())
+    take_samples = {key: [] for key in ("stop_to_text_ms", "stop_to_proper_nouns_ms", "stop_to_first_audio_ms", "stop_to_done_ms")}
+    fix_samples = {key: [] for key in ("stop_to_text_ms", "stop_to_correction_ms", "stop_to_first_audio_ms", "stop_to_done_ms")}
+
+    stages = get_metrics().add_sink(HistogramSink())
+    for _ in range(args.iterations):
+        if not args.warm:
+            tool.ner_manager.clear_memory()
+            tool.playback.cache.clear()
+            tool.playback.prewarm(PROMPTS, background=False)
+        run_take(tool, backend, args.record_seconds, take_samples)
+        run_fix(tool, backend, args.fix_seconds, fix_samples)
+
+    tool.playback_queue.close()
+    get_metrics().remove_sink(stages)
+    return {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": {
+            "stop_recording": {key: summarize(values) for key, values in take_samples.items()},
+            "process_fix": {key: summarize(values) for key, values in fix_samples.items()},
+        },
+        "stages": stages.summary(),
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print p50 changes against a baseline. Returns the number of regressions."""
+    regressions = 0
+    print(f"{'scenario':<16}{'metric':<28}{'baseline':>10}{'current':>10}{'change':>9}")
+    for scenario, metrics in current["scenarios"].items():
+        for metric, summary in metrics.items():
+            old = baseline.get("scenarios", {}).get(scenario, {}).get(metric)
+            if old is None:
+                continue
+            change = (summary["p50"] - old["p50"]) / old["p50"] if old["p50"] else 0.0
+            regressed = change > threshold and summary["p50"] - old["p50"] > 5
+            regressions += regressed
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{scenario:<16}{metric:<28}{old['p50']:>10.1f}{summary['p50']:>10.1f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline latency benchmark")
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--mode', type=int, default=2, choices=[0, 1, 2], help="proper_nouns_enabled level")
+    parser.add_argument('--streaming', action='store_true', help="Transcribe while recording")
+    parser.add_argument('--warm', action='store_true', help="Keep NER and TTS caches between iterations")
+    parser.add_argument('--record-seconds', type=float, default=3.0)
+    parser.add_argument('--fix-seconds', type=float, default=1.5)
+    parser.add_argument('--asr-latency', type=float, default=0.4)
+    parser.add_argument('--asr-jitter', type=float, default=0.1)
+    parser.add_argument('--asr-per-second', type=float, default=0.05, help="Extra ASR latency per second of audio")
+    parser.add_argument('--llm-latency', type=float, default=0.6)
+    parser.add_argument('--llm-jitter', type=float, default=0.2)
+    parser.add_argument('--tts-latency', type=float, default=0.3)
+    parser.add_argument('--tts-jitter', type=float, default=0.1)
+    parser.add_argument('--seconds-per-char', type=float, default=0.06, help="Length of fake speech per character")
+    parser.add_argument('--audio', help="WAV file to record from instead of the canned audio (44.1 kHz mono 16-bit)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="Save results as JSON")
+    parser.add_argument('--compare', help="Baseline results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative p50 slowdown counted as a regression")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results["scenarios"], indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {baseline.get('version', 'unknown')}:")
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Load test for the dictation server.
+
+Opens `--sessions` sessions, `--concurrency` at a time; each uploads `--takes` takes and one
+fix (over HTTP, or streamed over a WebSocket with `--websocket`) and closes. Requests turned
+away with 503 are retried after their Retry-After. Reports sessions/s and request latency
+percentiles. Without `--url` a server with local stand-in engines is started in-process.
+
+    python -m benchmarks.bench_server --sessions 200 --concurrency 32 --workers 8
+    python -m benchmarks.bench_server --url http://127.0.0.1:8765 --websocket
+"""
+import argparse
+import asyncio
+import io
+import json
+import time
+import wave
+import aiohttp
+from aiohttp import web
+from backend.utils import percentile
+from backend.fakes import FakeNERManager, FakePlayback, FakeTranscriber, Latency
+from backend.server import DictationServer
+from benchmarks.bench_pipeline import canned_speech
+
+RATE = 16000
+
+
+def wav_bytes(pcm, rate=RATE):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class LoadTest:
+    def __init__(self, url, args):
+        self.url = url.rstrip("/")
+        self.args = args
+        self.take = canned_speech(args.seconds, RATE)
+        self.latencies = []
+        self.retries = 0
+        self.errors = 0
+
+    async def post(self, http, path, data=None):
+        """POST, retrying while the server is overloaded. Returns the JSON reply."""
+        while True:
+            start = time.perf_counter()
+            async with http.post(self.url + path, data=data) as response:
+                body = await response.json()
+                if response.status == 503:
+                    self.retries += 1
+                    await asyncio.sleep(float(response.headers.get("Retry-After", 1)) * self.args.retry_scale)
+                    continue
+                if response.status >= 400:
+                    self.errors += 1
+                else:
+                    self.latencies.append(time.perf_counter() - start)
+                return body
+
+    async def command(self, ws, kind):
+        """Send a take or fix command, retrying while the server is overloaded."""
+        while True:
+            start = time.perf_counter()
+            await ws.send_json({"type": kind})
+            reply = await ws.receive_json()
+            if reply.get("status") == 503:
+                self.retries += 1
+                await asyncio.sleep(reply.get("retry_after", 1) * self.args.retry_scale)
+                continue
+            if reply["type"] == "error":
+                self.errors += 1
+            else:
+                self.latencies.append(time.perf_counter() - start)
+            return reply
+
+    async def session(self, http):
+        session_id = (await self.post(http, "/sessions"))["session"]
+        path = f"/sessions/{session_id}"
+        if self.args.websocket:
+            async with http.ws_connect(f"{self.url}{path}/ws?rate={RATE}&width=2") as ws:
+                for kind in ["take"] * self.args.takes + ["fix"]:
+                    chunk = RATE // 10 * 2  # 100 ms messages
+                    for start in range(0, len(self.take), chunk):
+                        await ws.send_bytes(self.take[start:start + chunk])
+                    await self.command(ws, kind)
+        else:
+            audio = wav_bytes(self.take)
+            for _ in range(self.args.takes):
+                await self.post(http, f"{path}/take", audio)
+            await self.post(http, f"{path}/fix", audio)
+        async with http.delete(self.url + path):
+            pass
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def limited(http):
+            async with semaphore:
+                await self.session(http)
+
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as http:
+            await asyncio.gather(*(limited(http) for _ in range(self.args.sessions)))
+        elapsed = time.perf_counter() - start
+        return {
+            "sessions": self.args.sessions,
+            "requests": len(self.latencies),
+            "elapsed_s": round(elapsed, 3),
+            "sessions_per_s": round(self.args.sessions / elapsed, 2),
+            "requests_per_s": round(len(self.latencies) / elapsed, 2),
+            "latency_p50_ms": round(percentile(self.latencies, 0.50) * 1000, 1),
+            "latency_p95_ms": round(percentile(self.latencies, 0.95) * 1000, 1),
+            "retries_503": self.retries,
+            "errors": self.errors,
+        }
+
+
+async def main_async(args):
+    runner = None
+    url = args.url
+    if url is None:
+        server = DictationServer(
+            transcriber=FakeTranscriber(latency=Latency(args.asr_latency, args.asr_latency / 4)),
+            ner_factory=lambda: FakeNERManager(latency=Latency(args.llm_latency, args.llm_latency / 4)),
+            playback=FakePlayback(latency=Latency(0.0)),
+            workers=args.workers, max_pending=args.max_pending, max_sessions=args.sessions)
+        runner = web.AppRunner(server.make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+    try:
+        results = await LoadTest(url, args).run()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dictation server load test")
+    parser.add_argument('--url', help="Server to load; by default one with local stand-in engines is started")
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16, help="Sessions in flight at once")
+    parser.add_argument('--takes', type=int, default=2, help="Takes per session, each followed by one fix")
+    parser.add_argument('--seconds', type=float, default=2.0, help="Length of each take")
+    parser.add_argument('--websocket', action='store_true', help="Stream audio over a WebSocket instead of uploading")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-pending', type=int)
+    parser.add_argument('--asr-latency', type=float, default=0.2)
+    parser.add_argument('--llm-latency', type=float, default=0.3)
+    parser.add_argument('--retry-scale', type=float, default=0.1, help="Fraction of Retry-After to wait before retrying")
+    parser.add_argument('-o', '--output', help="Save results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Startup profile of the GUI.
+
+Imports gui in a fresh interpreter with -X importtime and reports the slowest modules, then
+times each step from a cold interpreter to an interactive window, and the background warm-up
+that follows it.
+
+    python -m benchmarks.bench_startup [--top 15] [--offscreen]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter and prints the seconds each step took as JSON
+STARTUP_SCRIPT = """
+import json, sys, time
+out, sys.stdout = sys.stdout, sys.stderr  # Keep the app's own messages out of the results
+times = {}
+start = last = time.perf_counter()
+def step(name):
+    global last
+    now = time.perf_counter()
+    times[name] = now - last
+    last = now
+
+from PyQt5.QtWidgets import QApplication
+step("import_qt")
+import gui
+step("import_gui")
+from backend.gazetteer import Gazetteer
+app = QApplication(sys.argv[:1])
+step("qapplication")
+gazetteer = Gazetteer(sys.argv[1] or None)
+step("gazetteer")
+window = gui.VoiceDictationToolGUI(gazetteer=gazetteer, warm_up=False)
+step("window")
+window.show()
+app.processEvents()
+step("show")
+times["interactive"] = last - start
+print(json.dumps(times), file=out, flush=True)
+times = window.dictation_tool.warm_up(background=False)
+print(json.dumps(times), file=out, flush=True)
+"""
+
+
+def import_times(statement, top=15):
+    """
+    Run `statement` in a fresh interpreter with -X importtime. Returns the `top` slowest modules
+    by cumulative import time, and the self time of the project's own modules, in milliseconds.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    slowest = sorted(modules, key=lambda module: -module[2])[:top]
+    own = {name: round(self_ms, 1) for name, self_ms, _ in modules if name == "gui" or name.startswith("backend.")}
+    return {"slowest_cumulative_ms": {name: round(cumulative_ms, 1) for name, _, cumulative_ms in slowest},
+            "project_self_ms": own}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GUI startup profile")
+    parser.add_argument('--top', type=int, default=15, help="How many of the slowest imports to list")
+    parser.add_argument('--gazetteer', help="Gazetteer to load, e.g. the real one to include its loading time; "
+                                            "by default an empty one in memory")
+    parser.add_argument('--offscreen', action='store_true', help="Render the window offscreen, e.g. without a display")
+    args = parser.parse_args()
+
+    results = {"imports": import_times("import gui", args.top)}
+
+    env = dict(os.environ)
+    if args.offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, "-c", STARTUP_SCRIPT, args.gazetteer or ""], cwd=ROOT, env=env,
+                             stdout=subprocess.PIPE, text=True)
+    startup = json.loads(child.stdout.readline())
+    cold_start = time.perf_counter() - start
+    warm_up = json.loads(child.stdout.readline())
+    child.wait()
+
+    results["startup_ms"] = {name: round(seconds * 1000, 1) for name, seconds in startup.items()}
+    results["startup_ms"]["cold_start_to_interactive"] = round(cold_start * 1000, 1)
+    results["warm_up_ms"] = {name: round(seconds * 1000, 1) for name, seconds in warm_up.items()}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark playback speed-up: pydub's AudioSegment.speedup against the NumPy time stretch.
+
+Runs on synthetic speech-like audio (a gliding harmonic tone with syllable-rate amplitude
+modulation) at gTTS's 24 kHz mono, and reports total time, real-time factor and, for the
+streaming stretch, how long until the first block is ready to play.
+
+    python -m benchmarks.bench_time_stretch --durations 10 300 --speed 1.3
+"""
+import argparse
+import json
+import time
+import numpy as np
+import pydub
+from backend.time_stretch import stretch_blocks, time_stretch
+from backend.utils import AudioClip
+
+RATE = 24000
+
+
+def speech_like(seconds, rate=RATE):
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    return AudioClip((voice * envelope * 6000).astype(np.int16).tobytes(), 2, 1, rate)
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def first_block_seconds(clip, speed, preserve_pitch):
+    start = time.perf_counter()
+    next(stretch_blocks(clip, speed, preserve_pitch))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-stretch benchmark")
+    parser.add_argument('--durations', type=float, nargs='+', default=[10, 300], help="Clip lengths in seconds")
+    parser.add_argument('--speed', type=float, default=1.3)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    for seconds in args.durations:
+        clip = speech_like(seconds)
+        segment = pydub.AudioSegment(data=clip.pcm, sample_width=2, frame_rate=RATE, channels=1)
+        methods = {
+            "pydub_speedup": lambda: segment.speedup(playback_speed=args.speed),
+            "wsola": lambda: time_stretch(clip, args.speed, preserve_pitch=True),
+            "resample": lambda: time_stretch(clip, args.speed, preserve_pitch=False),
+        }
+        for name, function in methods.items():
+            elapsed = min(timed(function) for _ in range(args.repeat))
+            result = {"clip_seconds": seconds, "method": name, "seconds": round(elapsed, 4),
+                      "rtf": round(elapsed / seconds, 5)}
+            if name != "pydub_speedup":
+                result["first_block_seconds"] = round(first_block_seconds(clip, args.speed, name == "wsola"), 4)
+            results.append(result)
+            print(f"{seconds:>6.0f} s  {name:<14} {elapsed * 1000:10.1f} ms  RTF {elapsed / seconds:.5f}"
+                  + (f"  first block {result['first_block_seconds'] * 1000:.1f} ms" if "first_block_seconds" in result else ""))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import json
+import sys
+from backend.evaluation import CorpusEvaluator, load_hypotheses, load_references
+
+def main():
+    parser = argparse.ArgumentParser(description="Score transcriptions against reference transcripts.")
+    parser.add_argument('hypotheses', help="JSONL output of batch_transcribe.py")
+    parser.add_argument('references', help="JSONL of {path, text[, proper_nouns]} records, or a directory "
+                                           "with a .txt reference next to each WAV file")
+    parser.add_argument('-o', '--output', help="Write the score of each file to this JSONL file")
+    parser.add_argument('-j', '--workers', type=int, help="Worker processes (default: one per core)")
+    parser.add_argument('--proper-nouns', action='store_true',
+                        help="Report proper-noun recall, extracting the nouns with the LLM")
+    parser.add_argument('--baseline', help="Summary JSON of an earlier run to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.0,
+                        help="Fail if WER or CER is more than this many points worse than the baseline")
+    parser.add_argument('--save-summary', help="Write the summary JSON here, e.g. to use as a baseline")
+    args = parser.parse_args()
+
+    references = load_references(args.references)
+    hypotheses = load_hypotheses(args.hypotheses)
+    items = [{"id": record["path"], "reference": record["text"], "hypothesis": hypotheses[path],
+              "reference_nouns": record.get("proper_nouns")}
+             for path, record in sorted(references.items()) if path in hypotheses]
+    missing = len(references) - len(items)
+    if missing:
+        print(f"{missing} of {len(references)} references have no transcription and are not scored.")
+
+    extract = None
+    if args.proper_nouns:
+        from backend.ner_manager import NERManager
+
+        extract = NERManager().extract_proper_nouns
+    records, summary = CorpusEvaluator(args.workers, extract).run(items)
+    summary["missing"] = missing
+
+    if args.output:
+        with open(args.output, "w") as output:
+            for record in records:
+                output.write(json.dumps(record) + "\n")
+    if args.save_summary:
+        with open(args.save_summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = [f"{rate.upper()} {baseline[rate]:.2%} -> {summary[rate]:.2%}" for rate in ("wer", "cer")
+                       if (summary[rate] - baseline[rate]) * 100 > args.max_regression]
+        if regressions:
+            print("Regression against the baseline: " + ", ".join(regressions))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
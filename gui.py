@@ -1,23 +1,51 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QWidget, QComboBox, QVBoxLayout, QHBoxLayout, QPushButton, QTextBrowser, QProgressBar, QLabel, QRadioButton, QButtonGroup
-from PyQt5.QtCore import QTimer, QUrl
-from PyQt5.QtGui import QColor
-from backend.api import VoiceDictationTool
-import speech_recognition
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtWidgets import QApplication, QWidget, QComboBox, QVBoxLayout, QHBoxLayout, QPushButton, QTextBrowser, QProgressBar, QLabel, QRadioButton, QButtonGroup, QFileDialog
+from PyQt5.QtCore import QObject, QTimer, QUrl, pyqtSignal
+from PyQt5.QtGui import QColor, QTextCharFormat, QTextCursor
+from backend.api import PipelineCancelled, VoiceDictationTool
+from backend.evaluation import score
+from backend.metrics import JSONLogSink, PrometheusTextfileSink, get_metrics
+from backend.gazetteer import DEFAULT_PATH as DEFAULT_GAZETTEER, Gazetteer
+from backend.recording_store import RecordingStore, set_recording_store
+from backend.transcript import Transcript
+from backend.vad import EnergyVAD
 import argparse
 
+PAGE_WORDS = 500  # Words rendered at a time; the rest are appended as the transcript is scrolled
+
+class PipelineSignals(QObject):
+    """Signals that carry pipeline progress from the worker thread to the GUI thread."""
+    progress = pyqtSignal(str, object)  # stage, value
+    finished = pyqtSignal(str, object)  # "take" or "fix", Future
+    scored = pyqtSignal(int, object)  # request number, Future
+
+
 class VoiceDictationToolGUI(QWidget):
     """GUI for Voice Dictation Tool with NER functionality."""
 
-    def __init__(self, proper_nouns=False):
+    def __init__(self, proper_nouns=False, streaming=False, engine=None, tts=None, vad=True, gazetteer=None,
+                 warm_up=True, fix_playback="changes", reference=None):
         super().__init__()
-        self.dictation_tool = VoiceDictationTool()  # Instantiate the voice dictation tool
+        # Instantiate the voice dictation tool; its engines are loaded once the window is up, or on first use
+        self.dictation_tool = VoiceDictationTool(streaming=streaming, engine=engine, tts=tts, vad=vad,
+                                                 gazetteer=gazetteer, warm_up=False, fix_playback=fix_playback)
+        self.warm_up_pending = warm_up
         self.is_recording = False  # Track whether we are recording
         self.is_fix_recording = False  # Track whether we are fix recording
+        self.signals = PipelineSignals()
+        self.signals.progress.connect(self.on_pipeline_progress)
+        self.signals.finished.connect(self.on_pipeline_finished)
+        self.signals.scored.connect(self.on_score_finished)
+        self.score_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="score")  # Keeps long alignments off the GUI thread
+        self.score_requests = 0  # Bumped per scoring run, so only the latest result is shown
+        self.transcript = Transcript()  # Words shown, their offsets and which are marked
+        self.rendered_words = 0  # How many words of the transcript are in the document so far
+        self.reference = reference  # What was actually said, to score each transcription against
         self.initUI()
-        self.marked_words = set()  # Set to track which words have been marked
         self.selected_mic_index = None  # For microphone
         self.transcription = ""  # Store the original transcription
+        self.llm_error = None  # Why the LLM couldn't be used in the current run, if it couldn't
 
     def initUI(self):
         """Set up the GUI layout."""
@@ -31,6 +59,10 @@ class VoiceDictationToolGUI(QWidget):
         self.output_text.setOpenExternalLinks(False)  # Disable external links
         self.output_text.setPlaceholderText("Transcribed text will appear here...")
         self.output_text.anchorClicked.connect(self.on_word_click)  # Connect word click handler
+        # Render more words of a long transcript when scrolled to the end, or while they all fit
+        self.output_text.verticalScrollBar().valueChanged.connect(self.on_scroll)
+        self.output_text.document().documentLayout().documentSizeChanged.connect(
+            lambda size: QTimer.singleShot(0, self.on_scroll))  # Once the scroll bar has caught up with the size
         layout.addWidget(self.output_text)
 
         # Proper nouns display area
@@ -56,6 +88,16 @@ class VoiceDictationToolGUI(QWidget):
         self.busy_indicator.setVisible(False)  # Hide it initially
         layout.addWidget(self.busy_indicator)
 
+        # Stage of the pipeline that is running, and a button to cancel it
+        status_layout = QHBoxLayout()
+        self.status_label = QLabel("", self)
+        status_layout.addWidget(self.status_label)
+        self.cancel_button = QPushButton('Cancel', self)
+        self.cancel_button.clicked.connect(self.on_cancel_click)
+        self.cancel_button.setEnabled(False)
+        status_layout.addWidget(self.cancel_button)
+        layout.addLayout(status_layout)
+
         # Bottom Layout for WER and Radio Buttons
         bottom_layout = QHBoxLayout()
 
@@ -88,12 +130,30 @@ class VoiceDictationToolGUI(QWidget):
         # Add the bottom layout to the main layout
         layout.addLayout(bottom_layout)
 
+        # Score against a reference transcript, when one is loaded
+        score_layout = QHBoxLayout()
+        self.score_label = QLabel("Reference loaded." if self.reference is not None else "No reference loaded.", self)
+        score_layout.addWidget(self.score_label)
+        self.reference_button = QPushButton('Load Reference', self)
+        self.reference_button.clicked.connect(self.on_reference_click)
+        score_layout.addWidget(self.reference_button)
+        layout.addLayout(score_layout)
+
         # Set the layout to the window
         self.setLayout(layout)
         self.setGeometry(300, 300, 400, 500)
 
+    def showEvent(self, event):
+        """Start loading the engines in the background once the window has been shown."""
+        super().showEvent(event)
+        if self.warm_up_pending:
+            self.warm_up_pending = False
+            QTimer.singleShot(0, self.dictation_tool.warm_up)  # After the window has painted
+
     def list_microphones(self):
         """List available microphones & dropdown menu"""
+        import speech_recognition
+
         mic_list = speech_recognition.Microphone.list_microphone_names()
         self.mic_dropdown.addItems(mic_list)
 
@@ -124,12 +184,8 @@ class VoiceDictationToolGUI(QWidget):
         """Handle the Stop button click to stop recording."""
         self.is_recording = False
         self.start_button.setEnabled(False)  # Disable button to prevent multiple clicks
+        self.fix_button.setEnabled(False)
 
-        # Stop the recording in the background with a delay
-        QTimer.singleShot(100, self.on_recording_finished)  # Delay of 100 ms before processing
-
-    def on_recording_finished(self):
-        """Handle the process after recording is finished."""
         if self.radio_button2.isChecked():  # Repeat + Noun Check
             self.dictation_tool.proper_nouns_enabled = 1  # Transcription + Noun Check
         elif self.radio_button1.isChecked():  # Repeat Only
@@ -137,76 +193,156 @@ class VoiceDictationToolGUI(QWidget):
         elif self.radio_button3.isChecked():  # Repeat + Noun Check + Spelling
             self.dictation_tool.proper_nouns_enabled = 2  # Noun Check + Spelling
 
-        # Stop recording and get the transcription and proper nouns
-        transcription, proper_nouns = self.dictation_tool.stop_recording()
-        self.transcription = transcription  # Store the original transcription
-
-        # Format transcription into clickable words
-        formatted_text = self.format_transcription(transcription) if transcription else "Transcription failed."
-
-        # Update the text box with the formatted clickable transcription
-        self.output_text.setHtml(formatted_text)
-
-        # Display proper nouns below transcription
-        proper_nouns_text = ', '.join(proper_nouns) if proper_nouns else "No proper nouns detected."
-        self.proper_nouns_text.setText(proper_nouns_text)
-
-        # Enable the Fix button since we have a transcription
-        self.fix_button.setEnabled(True)
-
-        # Hide the busy indicator and re-enable the button
+        # Stop recording and process it on the pipeline worker, so the window stays responsive
+        self.status_label.setText("Transcribing...")
+        self.cancel_button.setEnabled(True)
+        future = self.dictation_tool.stop_recording_async(progress=self.signals.progress.emit)
+        future.add_done_callback(lambda f: self.signals.finished.emit("take", f))
+
+    def on_pipeline_progress(self, stage, value):
+        """Show each stage's result as soon as the pipeline reports it."""
+        if stage == "transcription":
+            self.llm_error = None
+            # Format transcription into clickable words
+            self.transcription = value
+            if value:
+                self.format_transcription(value)
+            else:
+                self.output_text.setHtml("Transcription failed.")
+            self.status_label.setText("Finding proper nouns...")
+        elif stage == "proper_nouns":
+            # Display proper nouns below transcription
+            if value:
+                proper_nouns_text = ', '.join(value)
+            else:
+                proper_nouns_text = "Proper nouns unavailable." if self.llm_error else "No proper nouns detected."
+            self.proper_nouns_text.setText(proper_nouns_text)
+        elif stage == "llm_error":
+            self.llm_error = value
+            self.status_label.setText(f"LLM unavailable: {value}")
+        elif stage == "fix_transcription":
+            self.llm_error = None
+            self.status_label.setText("Correcting...")
+        elif stage == "corrected_transcription":
+            corrected_transcription, proper_nouns = value
+            self.format_transcription(corrected_transcription)
+            self.proper_nouns_text.setText(', '.join(proper_nouns) if proper_nouns else "No proper nouns detected.")
+        elif stage == "playback":
+            self.status_label.setText("Playing back...")
+
+    def on_pipeline_finished(self, kind, future):
+        """Handle the end of a pipeline run, whether it finished, failed or was cancelled."""
+        try:
+            result = future.result()
+        except PipelineCancelled:
+            self.status_label.setText("Cancelled.")
+        except Exception as e:
+            print(f"Error while processing the recording: {e}")
+            self.status_label.setText(f"Error: {e}")
+        else:
+            # Leave a degraded run's LLM error showing
+            self.status_label.setText(f"LLM unavailable: {self.llm_error}" if self.llm_error else "")
+            if kind == "fix":
+                if result:
+                    # Update self.transcription with the corrected transcription
+                    self.transcription = result
+                else:
+                    self.output_text.setHtml("Correction failed.")
+
+        # Hide the busy indicator and re-enable the buttons
         self.busy_indicator.setVisible(False)
+        self.cancel_button.setEnabled(False)
         self.start_button.setText('Start')  # Change button text back to "Start"
         self.start_button.setEnabled(True)  # Re-enable the button
+        self.fix_button.setText('Fix')  # Change button text back to "Fix"
+        self.fix_button.setEnabled(bool(self.transcription))
 
-    def format_transcription(self, text):
-        """Format the transcribed text to make each word clickable."""
-        words = text.split()
-        formatted_words = []
-
-        # Wrap each word in a clickable <a> tag with a unique href
-        for idx, word in enumerate(words):
-            formatted_words.append(f'<a href="{idx}">{word}</a>')
+    def on_cancel_click(self):
+        """Cancel the pipeline run that is in flight."""
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText("Cancelling...")
+        self.dictation_tool.cancel()
 
-        # Join the words back with spaces and return as HTML
-        return ' '.join(formatted_words)
+    def format_transcription(self, text):
+        """Show the transcribed text as clickable words, rendering only the first page of a long one."""
+        self.transcript = Transcript(text)
+        self.rendered_words = min(PAGE_WORDS, len(self.transcript))
+        self.output_text.setHtml(self.transcript.render(0, self.rendered_words))
+        self.update_wer()
+        self.update_score()
+
+    def on_scroll(self, *args):
+        """Append the next page of words once the end of what is rendered comes into view."""
+        scroll_bar = self.output_text.verticalScrollBar()
+        if self.rendered_words < len(self.transcript) and scroll_bar.value() >= scroll_bar.maximum() - scroll_bar.pageStep():
+            self.render_next_page()
+
+    def render_next_page(self):
+        """Append the next page of words to the end of the document."""
+        end = min(self.rendered_words + PAGE_WORDS, len(self.transcript))
+        cursor = QTextCursor(self.output_text.document())
+        cursor.movePosition(QTextCursor.End)
+        # Each page is its own paragraph, so restyling a word only lays out its page again. The paragraph
+        # break takes the place of the space between words, so the word offsets are unchanged.
+        cursor.insertBlock()
+        cursor.insertHtml(self.transcript.render(self.rendered_words, end))
+        self.rendered_words = end
 
     def on_word_click(self, url):
         """Handle the event when a word is clicked."""
         word_idx = int(url.toString())  # Get the index of the clicked word
-        words = self.output_text.toPlainText().split()
-
-        if word_idx < len(words):
-            clicked_word = words[word_idx]
-
-            # Use (index, word) tuple to uniquely identify each word instance
-            word_key = (word_idx, clicked_word)
-
-            # Toggle marking the word in red or removing the mark
-            if word_key in self.marked_words:
-                self.marked_words.remove(word_key)  # Unmark the word
-            else:
-                self.marked_words.add(word_key)  # Mark the word
-
-        # Update the text box with the modified word list
-        formatted_text = self.get_formatted_text(words)
-        self.output_text.setHtml(formatted_text)
-
-    def get_formatted_text(self, words):
-        """Generate HTML for the transcription with marked words in red."""
-        formatted_words = []
-        for idx, word in enumerate(words):
-            word_key = (idx, word)
-            if word_key in self.marked_words:
-                # Make the word clickable and apply red color if marked
-                formatted_words.append(f'<a href="{idx}" style="color: red; text-decoration: underline;">{word}</a>')
-            else:
-                # Make the word clickable if not marked
-                formatted_words.append(f'<a href="{idx}">{word}</a>')
-
-        rate = len(self.marked_words) / len(words) * 100 if words else 0
-        self.wer_label.setText(f'WER: {rate:.2f}%')
-        return ' '.join(formatted_words)
+        if word_idx >= self.rendered_words:
+            return
+
+        # Toggle marking the word in red, restyling just that word in place
+        marked = self.transcript.toggle(word_idx)
+        start, end = self.transcript.span(word_idx)
+        cursor = QTextCursor(self.output_text.document())
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        char_format = QTextCharFormat()
+        char_format.setForeground(QColor('red') if marked else self.output_text.palette().link().color())
+        cursor.mergeCharFormat(char_format)
+        self.update_wer()
+
+    def update_wer(self):
+        """Show the share of words marked wrong."""
+        self.wer_label.setText(f'WER: {self.transcript.wer:.2f}%')
+
+    def on_reference_click(self):
+        """Load a reference transcript from a text file and score the transcription against it."""
+        path, _ = QFileDialog.getOpenFileName(self, "Load Reference", "", "Text files (*.txt);;All files (*)")
+        if path:
+            with open(path) as f:
+                self.reference = f.read().strip()
+            self.update_score()
+
+    def update_score(self):
+        """Show the WER and CER of the transcription against the reference, if one is loaded."""
+        if self.reference is None:
+            return
+        if not len(self.transcript):
+            self.score_requests += 1
+            self.score_label.setText("Reference loaded.")
+            return
+        self.score_requests += 1
+        request = self.score_requests
+        self.score_label.setText("Scoring...")
+        future = self.score_executor.submit(score, self.reference, self.transcript.text)
+        future.add_done_callback(lambda f: self.signals.scored.emit(request, f))
+
+    def on_score_finished(self, request, future):
+        """Show a finished score, unless the transcription or reference has changed since."""
+        if request != self.score_requests:
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error scoring against the reference: {e}")
+            self.score_label.setText("Scoring failed.")
+            return
+        self.score_label.setText(f"Reference WER: {result['wer']:.2%} (S {result['substitutions']}, "
+                                 f"D {result['deletions']}, I {result['insertions']}), CER: {result['cer']:.2%}")
 
     def on_fix_button_click(self):
         """Handle the Fix button click."""
@@ -230,32 +366,57 @@ class VoiceDictationToolGUI(QWidget):
         """Handle the Fix button click to stop fix recording."""
         self.is_fix_recording = False
         self.fix_button.setEnabled(False)  # Disable button to prevent multiple clicks
+        self.start_button.setEnabled(False)
 
-        # Stop the fix recording and process it
-        QTimer.singleShot(100, self.on_fix_recording_finished)  # Delay before processing
-
-    def on_fix_recording_finished(self):
-        """Handle the process after fix recording is finished."""
-        # Stop recording and get the fix transcription and corrected transcription
-        corrected_transcription = self.dictation_tool.process_fix(self.transcription)
-        if corrected_transcription:
-            # Update the text box with the corrected transcription
-            formatted_text = self.format_transcription(corrected_transcription)
-            self.output_text.setHtml(formatted_text)
-
-            # Update self.transcription with the corrected transcription
-            self.transcription = corrected_transcription
-        else:
-            self.output_text.setHtml("Correction failed.")
-
-        # Hide the busy indicator and re-enable the button
-        self.busy_indicator.setVisible(False)
-        self.fix_button.setText('Fix')  # Change button text back to "Fix"
-        self.fix_button.setEnabled(True)  # Re-enable the button
+        # Stop the fix recording and process it on the pipeline worker
+        self.status_label.setText("Transcribing fix...")
+        self.cancel_button.setEnabled(True)
+        future = self.dictation_tool.process_fix_async(self.transcription, progress=self.signals.progress.emit)
+        future.add_done_callback(lambda f: self.signals.finished.emit("fix", f))
 
 # Main execution for running the GUI
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    gui = VoiceDictationToolGUI()
+    parser = argparse.ArgumentParser(description="Voice Dictation Tool")
+    parser.add_argument('--streaming', action='store_true', help="Transcribe while recording")
+    parser.add_argument('--engine', default="google", choices=["google", "vosk", "sphinx"],
+                        help="Speech recognition engine; vosk and sphinx run offline")
+    parser.add_argument('--tts', default="gtts", choices=["gtts", "espeak"],
+                        help="Text-to-speech provider; espeak runs offline")
+    parser.add_argument('--fix-playback', default="changes", choices=["changes", "full"],
+                        help="Speak back only what a fix changed, or the whole corrected transcription")
+    parser.add_argument('--reference', help="Text file with what will be said, to score each transcription against")
+    parser.add_argument('--no-vad', action='store_true', help="Transcribe recordings without trimming silence")
+    parser.add_argument('--vad-threshold', type=float, default=500, help="Minimum RMS level counted as speech")
+    parser.add_argument('--max-pause', type=float, help="Shorten pauses between words to this many seconds")
+    parser.add_argument('--no-warm-up', action='store_true',
+                        help="Load the speech, LLM and TTS engines on first use instead of once the window is shown")
+    parser.add_argument('--gazetteer', default=DEFAULT_GAZETTEER,
+                        help="Where the proper nouns seen so far are kept, to correct names without the LLM")
+    parser.add_argument('--archive-dir', default="recordings", help="Where takes, fixes and transcripts are archived")
+    parser.add_argument('--flac', action='store_true', help="Archive recordings as FLAC")
+    parser.add_argument('--max-archive-mb', type=float, help="Evict the oldest takes past this size")
+    parser.add_argument('--max-archive-days', type=float, help="Evict takes older than this")
+    parser.add_argument('--metrics-log', help="Append a JSON line with the timing of each pipeline stage to this file")
+    parser.add_argument('--metrics-textfile', help="Export stage timings as a Prometheus textfile (.prom)")
+    args, qt_args = parser.parse_known_args()
+
+    set_recording_store(RecordingStore(args.archive_dir, compress=args.flac, max_age_days=args.max_archive_days,
+                                       max_bytes=int(args.max_archive_mb * 2**20) if args.max_archive_mb else None))
+    if args.metrics_log:
+        get_metrics().add_sink(JSONLogSink(path=args.metrics_log))
+    if args.metrics_textfile:
+        get_metrics().add_sink(PrometheusTextfileSink(args.metrics_textfile))
+
+    reference = None
+    if args.reference:
+        with open(args.reference) as f:
+            reference = f.read().strip()
+
+    vad = False if args.no_vad else EnergyVAD(44100, threshold=args.vad_threshold, max_pause=args.max_pause)
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    gui = VoiceDictationToolGUI(streaming=args.streaming, engine=args.engine, tts=args.tts, vad=vad,
+                                gazetteer=Gazetteer(args.gazetteer), warm_up=not args.no_warm_up,
+                                fix_playback=args.fix_playback, reference=reference)
     gui.show()
     sys.exit(app.exec_())
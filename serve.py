@@ -0,0 +1,43 @@
+import argparse
+from backend.fakes import FakeNERManager, FakePlayback, FakeTranscriber, Latency
+from backend.metrics import JSONLogSink, get_metrics
+from backend.ner_manager import NERManager
+from backend.playback import Playback
+from backend.server import DictationServer
+from backend.transcriber import Transcriber
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve voice dictation sessions over HTTP and WebSocket.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('-j', '--workers', type=int, default=4, help="Worker threads shared by all sessions")
+    parser.add_argument('--max-pending', type=int, help="Jobs accepted before answering 503 (default: 2 per worker)")
+    parser.add_argument('--max-sessions', type=int, default=256)
+    parser.add_argument('--session-ttl', type=float, default=600.0, help="Close sessions idle this many seconds")
+    parser.add_argument('--engine', default="google", choices=["google", "vosk", "sphinx"])
+    parser.add_argument('--tts', default="gtts", choices=["gtts", "espeak"])
+    parser.add_argument('--fix-playback', default="changes", choices=["changes", "full"],
+                        help="Speak back only what a fix changed, or the whole corrected transcription")
+    parser.add_argument('--fake', type=float, metavar="SECONDS",
+                        help="Use local stand-in engines with this much latency, e.g. for load tests")
+    parser.add_argument('--metrics-log', help="Append a JSON line with the timing of each pipeline stage to this file")
+    args = parser.parse_args()
+
+    if args.metrics_log:
+        get_metrics().add_sink(JSONLogSink(path=args.metrics_log))
+    if args.fake is not None:
+        transcriber = FakeTranscriber(latency=Latency(args.fake))
+        ner_factory = lambda: FakeNERManager(latency=Latency(args.fake))
+        playback = FakePlayback(latency=Latency(args.fake))
+    else:
+        transcriber = Transcriber(args.engine)
+        ner_factory = NERManager
+        playback = Playback(provider=args.tts)
+
+    server = DictationServer(transcriber, ner_factory, playback, workers=args.workers, max_pending=args.max_pending,
+                             max_sessions=args.max_sessions, session_ttl=args.session_ttl,
+                             fix_playback=args.fix_playback)
+    server.serve(args.host, args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import unittest
+from backend.alignment import changed_phrases, changed_spans, new_nouns
+from backend.api import PROMPTS, fix_phrases
+
+ORIGINAL = "Yesterday I met Vic Srinivasan in Palo Alto and we walked over to Stanford for lunch."
+
+
+class TestAlignment(unittest.TestCase):
+    def test_substitution_with_context(self):
+        corrected = ORIGINAL.replace("Vic", "Vik")
+        self.assertEqual(changed_spans(ORIGINAL, corrected), [(1, 6)])
+        self.assertEqual(changed_phrases(ORIGINAL, corrected), ["I met Vik Srinivasan in"])
+        self.assertEqual(changed_phrases(ORIGINAL, corrected, context=0), ["Vik"])
+
+    def test_nearby_changes_merge(self):
+        corrected = "Yesterday I met Vik Srinivasan in Palo Alto and we walked over to Stanford for dinner."
+        corrected = corrected.replace("Palo Alto", "Menlo Park")
+        self.assertEqual(changed_phrases(ORIGINAL, corrected, context=0), ["Vik", "Menlo Park", "dinner."])
+        self.assertEqual(changed_phrases(ORIGINAL, corrected, context=1),
+                         ["met Vik Srinivasan in Menlo Park and", "for dinner."])
+
+    def test_insertion_and_deletion(self):
+        self.assertEqual(changed_phrases("we walked to Stanford", "we walked over to Stanford", context=1),
+                         ["walked over to"])
+        self.assertEqual(changed_phrases("we walked over to Stanford", "we walked to Stanford", context=1),
+                         ["walked to"])
+        self.assertEqual(changed_phrases("um", "", context=1), [])
+
+    def test_case_and_punctuation_are_not_changes(self):
+        self.assertEqual(changed_spans(ORIGINAL, ORIGINAL.lower().replace(".", "")), [])
+
+    def test_new_nouns(self):
+        self.assertEqual(new_nouns(ORIGINAL, ["Vik Srinivasan", "Palo Alto", "Stanford", "Alto"]),
+                         ["Vik Srinivasan"])
+
+
+class TestFixPhrases(unittest.TestCase):
+    def test_changes(self):
+        corrected = ORIGINAL.replace("Vic", "Vik")
+        self.assertEqual(fix_phrases(ORIGINAL, corrected, ["Vik Srinivasan", "Palo Alto", "Stanford"]),
+                         ["I met Vik Srinivasan in", PROMPTS[0], "Vik Srinivasan",
+                          "Vik Srinivasan is V I K   S R I N I V A S A N"])
+        self.assertEqual(fix_phrases(ORIGINAL, ORIGINAL, ["Stanford"]), [PROMPTS[2]])
+
+    def test_full(self):
+        self.assertEqual(fix_phrases(ORIGINAL, ORIGINAL, ["Stanford"], mode="full"),
+                         [ORIGINAL, PROMPTS[0], "Stanford", "Stanford is S T A N F O R D"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+import subprocess
+import sys
+import unittest
+import tempfile
+import time
+import numpy as np
+from backend.api import PROMPTS, PipelineCancelled, VoiceDictationTool
+from backend.devices import AudioDeviceManager, NullBackend
+from backend.fakes import FakeEngine, FakeNERManager, FakePlayback, FakeTranscriber
+from backend.llm_client import CircuitOpenError
+from backend.recording_store import RecordingStore
+
+RECORD_SECONDS = 0.3  # Well past the VAD's shortest speech, however late the first read comes
+# A second of a loud 300 Hz tone, so the VAD hears speech
+SPEECH = (np.sin(2 * np.pi * 300 * np.arange(44100) / 44100) * 6000).astype(np.int16).tobytes()
+
+
+class TestVoiceDictationTool(unittest.TestCase):
+    def setUp(self):
+        """Build a headless tool whose engines are local fakes."""
+        self.backend = NullBackend(input_pcm=SPEECH, realtime=True)
+        self.device = AudioDeviceManager(self.backend)
+        self.transcriber = FakeTranscriber()
+        self.ner_manager = FakeNERManager()
+        self.playback = FakePlayback(seconds_per_char=0.001, device=self.device)
+        self.tool = VoiceDictationTool(proper_nouns=1, archive=False, device=self.device,
+                                       transcriber=self.transcriber, ner_manager=self.ner_manager,
+                                       playback=self.playback, warm_up=False)
+
+    def tearDown(self):
+        self.tool.playback_queue.close()
+
+    def test_stop_recording(self):
+        """Test a full take runs through transcription, NER and playback with the fakes."""
+        stages = []
+        self.tool.start_recording()
+        time.sleep(RECORD_SECONDS)
+        transcription, proper_nouns = self.tool.stop_recording(progress=lambda stage, value: stages.append(stage))
+
+        self.assertEqual(transcription, self.transcriber.text)
+        self.assertListEqual(proper_nouns, ["Vik Srinivasan", "Palo Alto", "Stanford"])
+        self.assertListEqual(stages, ["transcription", "proper_nouns", "playback", "done"])
+        self.assertEqual(self.transcriber.calls, 1)
+        self.assertGreater(len(self.backend.output), 0)
+
+    def test_known_names_are_snapped(self):
+        """Test a misrecognized known name is corrected without asking the LLM."""
+        self.ner_manager.update_memory(["Vik Srinivasan", "Palo Alto", "Stanford"] * 2)
+        self.transcriber.engine.text = "I met Vic Srinivasan in Palo Alto near Stanford"
+        self.tool.start_recording()
+        time.sleep(RECORD_SECONDS)
+        transcription, proper_nouns = self.tool.stop_recording()
+
+        self.assertEqual(transcription, "I met Vik Srinivasan in Palo Alto near Stanford")
+        self.assertListEqual(proper_nouns, ["Vik Srinivasan", "Palo Alto", "Stanford"])
+        self.assertEqual(self.ner_manager.calls, 0)
+
+    def test_process_fix(self):
+        """Test a fix is corrected with a single combined LLM request."""
+        self.ner_manager.corrected_transcription = "I met Vic Srinivasan in Palo Alto"
+        self.tool.start_fix_recording()
+        time.sleep(RECORD_SECONDS)
+        corrected = self.tool.process_fix("I met Vic in Palo Alto")
+
+        self.assertEqual(corrected, "I met Vic Srinivasan in Palo Alto")
+        self.assertEqual(self.ner_manager.calls, 1)
+
+    def test_fix_plays_back_only_the_changes(self):
+        """Test a one-word fix to a long dictation speaks back only the words around it."""
+        original = "I met Vic Srinivasan in Palo Alto. " + "We talked about the plan for a while. " * 50
+        self.ner_manager.corrected_transcription = original.replace("Vic", "Vik")
+        self.ner_manager.canned_nouns = ["Vik Srinivasan", "Palo Alto"]
+        phrases = []
+        enqueue = self.tool.playback_queue.enqueue
+        self.tool.playback_queue.enqueue = lambda text, speed=None: (phrases.append(text), enqueue(text, speed))
+
+        self.tool.start_fix_recording()
+        time.sleep(RECORD_SECONDS)
+        self.tool.process_fix(original)
+        self.assertEqual(phrases, ["I met Vik Srinivasan in", PROMPTS[0], "Vik Srinivasan",
+                                   "Vik Srinivasan is V I K   S R I N I V A S A N"])
+
+    def test_llm_failure_degrades(self):
+        """Test a take and a fix still finish, and are archived, when the LLM can't be reached."""
+        def unavailable(prompt, generation_config=None):
+            raise CircuitOpenError(4.2)
+
+        self.ner_manager.call_gpt_api = unavailable
+        with tempfile.TemporaryDirectory() as directory:
+            store = RecordingStore(directory)
+            self.tool.archive = True
+            self.tool.proper_nouns_enabled = 0  # Repeat Only still finds nouns to index the take
+            self.tool.audio_recorder._store = store
+            stages = []
+            progress = lambda stage, value: stages.append((stage, value))
+            self.tool.start_recording()
+            time.sleep(RECORD_SECONDS)
+            transcription, proper_nouns = self.tool.stop_recording(progress=progress)
+
+            self.assertEqual((transcription, proper_nouns), (self.transcriber.text, []))
+            self.assertEqual([stage for stage, _ in stages], ["transcription", "llm_error", "proper_nouns",
+                                                              "playback", "done"])
+            self.assertIn("circuit", stages[1][1].lower())
+            self.assertEqual(self.ner_manager.cache, {})
+
+            stages.clear()
+            self.tool.start_fix_recording()
+            time.sleep(RECORD_SECONDS)
+            self.assertEqual(self.tool.process_fix(transcription, progress=progress), transcription)
+            self.assertEqual([stage for stage, _ in stages], ["fix_transcription", "llm_error",
+                                                              "corrected_transcription", "playback", "done"])
+            self.tool.audio_recorder.wait_for_archive()
+            take_id = self.tool.take_id
+            self.assertEqual([t["kind"] for t in store.transcripts(take_id)], ["transcription"])
+            self.assertEqual(len(store.fixes(take_id)), 1)
+            store.close()
+
+    def test_archive(self):
+        """Test takes and fixes are archived with their transcripts and proper nouns."""
+        with tempfile.TemporaryDirectory() as directory:
+            store = RecordingStore(directory)
+            self.tool.archive = True
+            self.tool.audio_recorder._store = store
+            self.tool.start_recording()
+            time.sleep(RECORD_SECONDS)
+            self.tool.stop_recording()
+            self.tool.start_fix_recording()
+            time.sleep(RECORD_SECONDS)
+            self.tool.process_fix(self.tool.transcription)
+            self.tool.audio_recorder.wait_for_archive()
+
+            take_id = self.tool.take_id
+            self.assertEqual([t["kind"] for t in store.transcripts(take_id)],
+                             ["transcription", "corrected_transcription"])
+            self.assertIn("Stanford", store.transcripts(take_id)[0]["proper_nouns"])
+            fixes = store.fixes(take_id)
+            self.assertEqual(len(fixes), 1)
+            self.assertEqual(store.transcripts(fixes[0]["id"])[0]["kind"], "fix_transcription")
+            self.assertGreater(store.get(take_id)["bytes"], 0)
+            store.close()
+
+
+class TestAsyncPipeline(unittest.TestCase):
+    def setUp(self):
+        self.backend = NullBackend(input_pcm=SPEECH, realtime=True)
+        self.device = AudioDeviceManager(self.backend)
+        self.ner_manager = FakeNERManager()
+        self.tool = VoiceDictationTool(proper_nouns=2, archive=False, device=self.device,
+                                       transcriber=FakeTranscriber(), ner_manager=self.ner_manager,
+                                       playback=FakePlayback(seconds_per_char=0.001, device=self.device),
+                                       warm_up=False)
+        self.phrases = []
+        enqueue = self.tool.playback_queue.enqueue
+        self.tool.playback_queue.enqueue = lambda text, speed=None: (self.phrases.append(text), enqueue(text, speed))
+
+    def tearDown(self):
+        self.tool.playback_queue.close()
+        self.tool.executor.shutdown()
+
+    def record(self):
+        self.tool.start_recording()
+        time.sleep(RECORD_SECONDS)
+
+    def test_futures_resolve_with_the_result(self):
+        stages = []
+        self.record()
+        future = self.tool.stop_recording_async(progress=lambda stage, value: stages.append(stage))
+        transcription, proper_nouns = future.result(timeout=10)
+        self.assertEqual(transcription, "I met Vik Srinivasan in Palo Alto near Stanford")
+        self.assertListEqual(proper_nouns, ["Vik Srinivasan", "Palo Alto", "Stanford"])
+        self.assertListEqual(stages, ["transcription", "proper_nouns", "playback", "done"])
+
+        self.ner_manager.corrected_transcription = "I met Vik Srinivasan in Menlo Park"
+        self.tool.start_fix_recording()
+        time.sleep(RECORD_SECONDS)
+        future = self.tool.process_fix_async(transcription)
+        self.assertEqual(future.result(timeout=10), "I met Vik Srinivasan in Menlo Park")
+
+    def test_cancel_mid_run(self):
+        """Test cancelling stops the run after the current stage and drops the queued playback."""
+        stages = []
+
+        def progress(stage, value):
+            stages.append(stage)
+            if stage == "proper_nouns":
+                self.tool.cancel()
+
+        self.record()
+        future = self.tool.stop_recording_async(progress=progress)
+        with self.assertRaises(PipelineCancelled):
+            future.result(timeout=10)
+        self.assertListEqual(stages, ["transcription", "proper_nouns"])
+        self.assertListEqual(self.phrases, [self.tool.transcription])  # The noun playback was never queued
+        self.assertTrue(self.tool.playback_queue.wait(timeout=1))
+        self.assertFalse(self.tool.playback_queue.items)
+
+        # The next take runs normally
+        stages.clear()
+        self.phrases.clear()
+        self.record()
+        transcription, _ = self.tool.stop_recording_async(progress=lambda stage, value: stages.append(stage)).result(10)
+        self.assertEqual(transcription, "I met Vik Srinivasan in Palo Alto near Stanford")
+        self.assertListEqual(stages, ["transcription", "proper_nouns", "playback", "done"])
+        self.assertEqual(self.phrases[-1], PROMPTS[1])
+
+
+class TestStartup(unittest.TestCase):
+    def test_heavy_modules_are_not_imported_up_front(self):
+        script = "import sys, backend.api; print([m for m in backend.api.HEAVY_MODULES if m in sys.modules])"
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_warm_up(self):
+        """Test the engines are created on warm-up rather than with the tool."""
+        device = AudioDeviceManager(NullBackend())
+        tool = VoiceDictationTool(archive=False, device=device, engine=FakeEngine(), ner_manager=FakeNERManager(),
+                                  playback=FakePlayback(device=device), warm_up=False)
+        self.assertIsNone(tool._transcriber)
+        times = tool.warm_up(background=False, modules=())
+        self.assertEqual(list(times), ["transcriber", "llm", "tts_prompts", "audio_device"])
+        self.assertEqual(tool.transcriber.engine.name, "fake")
+        self.assertIsNotNone(tool.playback.cache.get('Proper nouns are: ', tool.playback.cache_lang, 1.3))
+        tool.playback_queue.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
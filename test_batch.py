@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+import wave
+from backend.batch import BatchTranscriber, find_inputs, google_recognizer, load_completed
+from backend.fakes import FakeEngine
+from backend.utils import percentile
+
+
+def fake_recognizer():
+    """Recognizer that 'transcribes' a file as its name, and fails on names containing 'bad'."""
+    def recognize(path):
+        time.sleep(0.01)
+        name = os.path.basename(path)
+        if "bad" in name:
+            raise RuntimeError("recognizer failed")
+        return name[:-4]
+    return recognize
+
+
+def write_wav(path, seconds=1.0, rate=16000):
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(bytes(int(seconds * rate) * 2))
+
+
+class TestBatchTranscriber(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.audio_dir = os.path.join(self.tmp.name, "audio")
+        os.makedirs(os.path.join(self.audio_dir, "nested"))
+        for name in ("a.wav", "b.wav", "nested/c.wav", "bad.wav"):
+            write_wav(os.path.join(self.audio_dir, name))
+        self.output = os.path.join(self.tmp.name, "out.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_output(self):
+        with open(self.output) as output:
+            return [json.loads(line) for line in output]
+
+    def test_transcribes_every_file(self):
+        stats = BatchTranscriber(fake_recognizer, workers=2).run(find_inputs(self.audio_dir), self.output)
+
+        records = {os.path.basename(r["path"]): r for r in self.read_output()}
+        self.assertEqual(records["c.wav"]["text"], "c")
+        self.assertEqual(records["bad.wav"]["status"], "error")
+        self.assertEqual(stats["files"], 4)
+        self.assertEqual(stats["errors"], 1)
+        self.assertAlmostEqual(stats["audio_seconds_per_s"] / stats["files_per_s"], 1.0, places=1)
+        self.assertGreater(stats["latency_p50_s"], 0)
+
+    def test_resumes_and_retries_errors(self):
+        paths = find_inputs(self.audio_dir)
+        BatchTranscriber(fake_recognizer).run(paths[:2], self.output)
+        with open(self.output, "a") as output:
+            output.write('{"path": "truncated')  # Simulate a crash mid-write
+
+        stats = BatchTranscriber(fake_recognizer, workers=1).run(paths, self.output)
+        self.assertEqual(stats["skipped"], 2)
+        self.assertEqual(stats["files"], 2)
+        self.assertEqual(load_completed(self.output), set(paths) - {os.path.join(self.audio_dir, "bad.wav")})
+
+    def test_manifest_paths_are_relative_to_the_manifest(self):
+        manifest = os.path.join(self.tmp.name, "manifest.txt")
+        with open(manifest, "w") as f:
+            f.write("# takes\naudio/a.wav\n\naudio/nested/c.wav\n")
+        self.assertEqual(find_inputs(manifest), [os.path.join(self.tmp.name, "audio/a.wav"),
+                                                 os.path.join(self.tmp.name, "audio/nested/c.wav")])
+
+    def test_default_recognizer_preprocesses_like_the_interactive_path(self):
+        """Test batch files are downsampled before recognition, as takes are in Transcriber."""
+        path = os.path.join(self.tmp.name, "take.wav")
+        write_wav(path, rate=44100)
+        engine = FakeEngine(text="hello")
+        received = []
+        recognize = engine._recognize
+        engine._recognize = lambda audio: (received.append(audio.sample_rate), recognize(audio))[1]
+
+        self.assertEqual(google_recognizer(engine)(path), "hello")
+        self.assertEqual(received, [16000])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from backend.capture_buffer import CaptureBuffer
+
+
+class TestCaptureBuffer(unittest.TestCase):
+    def test_grows_in_blocks_and_keeps_order(self):
+        buffer = CaptureBuffer(block_size=8)
+        for i in range(10):
+            buffer.append(bytes([i, i]))
+
+        self.assertEqual(bytes(buffer.view()), b''.join(bytes([i, i]) for i in range(10)))
+        self.assertEqual(buffer.capacity % 8, 0)
+        self.assertLess(buffer.reallocations, 10)
+
+    def test_view_does_not_copy(self):
+        buffer = CaptureBuffer(block_size=16)
+        buffer.append(b'\x01\x00\x02\x00')
+        view = buffer.view()
+        self.assertEqual(view.obj, buffer._buf)
+        self.assertEqual(len(view), 4)
+
+    def test_growth_while_view_is_exported(self):
+        buffer = CaptureBuffer(block_size=4)
+        buffer.append(b'abcd')
+        view = buffer.view()
+        buffer.append(b'efgh')
+
+        self.assertEqual(bytes(view), b'abcd')
+        self.assertEqual(bytes(buffer.view()), b'abcdefgh')
+
+    def test_memory_cap_keeps_latest_audio(self):
+        buffer = CaptureBuffer(block_size=4, max_bytes=8)
+        for chunk in (b'aabb', b'ccdd', b'eeff', b'gg'):
+            buffer.append(chunk)
+
+        self.assertEqual(bytes(buffer.view()), b'ddeeffgg')
+        self.assertEqual(buffer.capacity, 8)
+        self.assertEqual(buffer.dropped_bytes, 6)
+
+    def test_ring_mode_preallocates(self):
+        buffer = CaptureBuffer(max_bytes=6, ring=True)
+        self.assertEqual(buffer.capacity, 6)
+        buffer.append(b'abcd')
+        buffer.append(b'efgh')
+        self.assertEqual([bytes(part) for part in buffer.tail(4)], [b'ef', b'gh'])
+        self.assertEqual(bytes(buffer.view()), b'cdefgh')
+
+    def test_wrapped_ring_keeps_recording_after_a_view(self):
+        buffer = CaptureBuffer(max_bytes=6, ring=True)
+        buffer.append(b'abcdefgh')
+        buffer.append(b'ij')
+        self.assertEqual(bytes(buffer.view()), b'efghij')
+        buffer.append(b'kl')
+        self.assertEqual(bytes(buffer.view()), b'ghijkl')
+        self.assertEqual(buffer.capacity, 6)
+
+    def test_clear_leaves_old_views_intact(self):
+        buffer = CaptureBuffer(block_size=4)
+        buffer.append(b'abcd')
+        view = buffer.view()
+        buffer.clear()
+        buffer.append(b'wxyz')
+
+        self.assertEqual(bytes(view), b'abcd')
+        self.assertEqual(len(buffer), 4)
+
+    def test_level(self):
+        buffer = CaptureBuffer()
+        self.assertEqual(buffer.level(), 0.0)
+        buffer.append((1000).to_bytes(2, 'little', signed=True) * 8)
+        self.assertAlmostEqual(buffer.level(), 1000.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
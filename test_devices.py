@@ -0,0 +1,55 @@
+import time
+import unittest
+import numpy as np
+from backend.devices import AudioDeviceManager, NullBackend, convert_pcm
+from backend.recorder import AudioRecorder
+from backend.utils import AudioClip
+
+
+class TestConvertPcm(unittest.TestCase):
+    def test_same_format_is_untouched(self):
+        pcm = b'\x01\x00\x02\x00'
+        self.assertIs(convert_pcm(pcm, (2, 1, 16000), (2, 1, 16000)), pcm)
+
+    def test_resample_changes_length(self):
+        pcm = np.zeros(24000, dtype=np.int16).tobytes()
+        converted = convert_pcm(pcm, (2, 1, 24000), (2, 1, 48000))
+        self.assertEqual(len(converted), 48000 * 2)
+
+    def test_mono_to_stereo_and_width(self):
+        pcm = np.array([16384, -16384], dtype=np.int16).tobytes()
+        converted = np.frombuffer(convert_pcm(pcm, (2, 1, 8000), (4, 2, 8000)), dtype=np.int32)
+        self.assertEqual(list(converted), [2 ** 30, 2 ** 30, -2 ** 30, -2 ** 30])
+
+
+class TestAudioDeviceManager(unittest.TestCase):
+    def test_output_stream_is_opened_once(self):
+        backend = NullBackend()
+        device = AudioDeviceManager(backend)
+        device.play(AudioClip(bytes(480), 2, 1, 24000))
+        device.play(AudioClip(bytes(960), 2, 1, 48000))  # Converted, not reopened
+
+        self.assertEqual(backend.opened_outputs, 1)
+        self.assertEqual(len(backend.output), 960)
+        self.assertEqual(device.output_format, (2, 1, 24000))
+
+    def test_recorder_reuses_input_stream(self):
+        tone = (np.sin(np.arange(44100) / 10) * 1000).astype(np.int16).tobytes()
+        backend = NullBackend(input_pcm=tone, realtime=True)
+        device = AudioDeviceManager(backend)
+        recorder = AudioRecorder(device=device)
+
+        takes = []
+        for _ in range(2):
+            recorder.start_recording()
+            time.sleep(0.1)
+            recorder.stop_recording()
+            takes.append(bytes(recorder.get_pcm()))
+
+        self.assertEqual(backend.opened_inputs, 1)
+        self.assertTrue(tone.startswith(takes[0]))
+        # The second take continues from the same, still-open stream
+        self.assertGreater(tone.find(takes[1][:256]), 0)
+
+if __name__ == "__main__":
+    unittest.main()
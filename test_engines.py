@@ -0,0 +1,78 @@
+import unittest
+import os
+import speech_recognition
+from backend.engines import GoogleEngine, LocalEngine, create_engine
+from backend.transcriber import Transcriber
+
+
+def pid_recognizer(prefix="worker"):
+    """Worker-side factory whose recognizer reports the worker's pid, or "" for silence."""
+    def recognize(pcm, rate, sample_width):
+        if not any(pcm):
+            return ""
+        return f"{prefix} {os.getpid()} {rate} {len(pcm)}"
+    return recognize
+
+
+def broken_recognizer():
+    raise ImportError("no model installed")
+
+
+class TestLocalEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = LocalEngine("test_engines:pid_recognizer", {"prefix": "local"}, name="test", timeout=60)
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_worker_is_persistent(self):
+        """Test every request goes to the same warm worker process, with audio converted to 16 kHz."""
+        audio = speech_recognition.AudioData(b'\x10\x00' * 44100, 44100, 2)
+        first = self.engine.recognize(audio).split()
+        second = self.engine.recognize(audio).split()
+
+        self.assertEqual(first[0], "local")
+        self.assertNotEqual(int(first[1]), os.getpid())
+        self.assertEqual(first[1], second[1])
+        self.assertEqual(first[2:], ["16000", "32000"])
+
+    def test_stats(self):
+        """Test latency and real-time factor are reported per engine."""
+        audio = speech_recognition.AudioData(b'\x10\x00' * 16000, 16000, 2)
+        self.engine.recognize(audio)
+        self.engine.recognize(audio)
+
+        stats = self.engine.stats()
+        self.assertEqual(stats["engine"], "test")
+        self.assertEqual(stats["calls"], 2)
+        self.assertGreater(stats["latency_p50_s"], 0.0)
+        self.assertGreater(stats["rtf_mean"], 0.0)
+
+    def test_transcriber_with_local_engine(self):
+        """Test the Transcriber treats an empty result as audio that wasn't understood."""
+        transcriber = Transcriber(engine=self.engine)
+        self.assertTrue(transcriber.transcribe_audio(b'\x10\x00' * 16000, 16000, 2).startswith("local"))
+        self.assertEqual(transcriber.transcribe_audio(bytes(32000), 16000, 2),
+                         "Transcription failed: Audio not understood.")
+
+    def test_worker_that_fails_to_load(self):
+        """Test an engine whose model can't load fails with a RequestError."""
+        engine = LocalEngine("test_engines:broken_recognizer", name="broken", timeout=60)
+        try:
+            with self.assertRaises(speech_recognition.RequestError):
+                engine.recognize(speech_recognition.AudioData(b'\x10\x00' * 1600, 16000, 2))
+        finally:
+            engine.close()
+
+
+class TestCreateEngine(unittest.TestCase):
+    def test_default_engine_is_google(self):
+        self.assertIsInstance(Transcriber().engine, GoogleEngine)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            create_engine("nope")
+
+
+if __name__ == '__main__':
+    unittest.main()
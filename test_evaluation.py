@@ -0,0 +1,137 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+from backend import evaluation
+from backend.evaluation import CorpusEvaluator, align, edit_distance, load_hypotheses, load_references, score
+
+REFERENCE = "I met Vik Srinivasan in Palo Alto near Stanford."
+
+
+def slow_edit_distance(reference, hypothesis):
+    previous = list(range(len(hypothesis) + 1))
+    for i, token in enumerate(reference, 1):
+        row = [i]
+        for j, other in enumerate(hypothesis, 1):
+            row.append(min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (token != other)))
+        previous = row
+    return previous[-1]
+
+
+def fake_proper_nouns(text):
+    return [word.strip(".,") for word in text.split()[1:] if word[0].isupper()]
+
+
+class TestAlignment(unittest.TestCase):
+    def test_matches_the_textbook_algorithm(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            reference = [rng.choice("abc") for _ in range(rng.randint(0, 10))]
+            hypothesis = [rng.choice("abc") for _ in range(rng.randint(0, 10))]
+            distance = slow_edit_distance(reference, hypothesis)
+            self.assertEqual(edit_distance(reference, hypothesis), distance)
+            ops = align(reference, hypothesis)
+            self.assertEqual(sum(op != "equal" for op, _, _ in ops), distance)
+            self.assertEqual([reference[i] for _, i, _ in ops if i is not None], reference)
+            self.assertEqual([hypothesis[j] for _, _, j in ops if j is not None], hypothesis)
+
+    def test_align(self):
+        self.assertEqual(align("a b c d".split(), "a x c d e".split()),
+                         [("equal", 0, 0), ("substitute", 1, 1), ("equal", 2, 2), ("equal", 3, 3),
+                          ("insert", None, 4)])
+
+    def test_long_inputs_stay_valid_past_the_table_limit(self):
+        rng = random.Random(1)
+        cells, evaluation.MAX_WORD_CELLS = evaluation.MAX_WORD_CELLS, 4
+        try:
+            for _ in range(200):
+                reference = [rng.choice("abcdefgh") for _ in range(rng.randint(0, 20))]
+                hypothesis = [rng.choice("abcdefgh") for _ in range(rng.randint(0, 20))]
+                ops = align(reference, hypothesis)
+                self.assertGreaterEqual(sum(op != "equal" for op, _, _ in ops),
+                                        slow_edit_distance(reference, hypothesis))
+                self.assertEqual([reference[i] for _, i, _ in ops if i is not None], reference)
+                self.assertEqual([hypothesis[j] for _, _, j in ops if j is not None], hypothesis)
+                for op, i, j in ops:
+                    if op == "equal":
+                        self.assertEqual(reference[i], hypothesis[j])
+            words = [f"w{n % 50}" for n in range(2000)]
+            hypothesis = words[:300] + ["x"] + words[301:1200] + words[1210:] + ["y", "z"]
+            self.assertEqual(sum(op != "equal" for op, _, _ in align(words, hypothesis)), 13)
+        finally:
+            evaluation.MAX_WORD_CELLS = cells
+
+
+class TestScore(unittest.TestCase):
+    def test_breakdown(self):
+        """Test substitutions, deletions and insertions are counted, ignoring case and punctuation."""
+        result = score(REFERENCE, "i met Vic Srinivasan in the Palo Alto, Stanford")
+        self.assertEqual((result["hits"], result["substitutions"], result["deletions"], result["insertions"]),
+                         (7, 1, 1, 1))
+        self.assertAlmostEqual(result["wer"], 3 / 9)
+        self.assertEqual(result["reference_chars"], len("i met vik srinivasan in palo alto near stanford"))
+        self.assertEqual(result["char_edits"], 1 + 4 + 5)
+        self.assertEqual(score(REFERENCE, REFERENCE.upper())["wer"], 0.0)
+        self.assertEqual(score("", "")["wer"], 0.0)
+
+    def test_long_transcripts_compare_only_the_differences(self):
+        hypothesis = REFERENCE.replace("Vik", "Vic").replace(" near", "")
+        exact = score(REFERENCE, hypothesis)
+        cells, evaluation.MAX_CHAR_CELLS = evaluation.MAX_CHAR_CELLS, 0
+        try:
+            self.assertEqual(score(REFERENCE, hypothesis), exact)
+        finally:
+            evaluation.MAX_CHAR_CELLS = cells
+
+    def test_noun_recall(self):
+        result = score(REFERENCE, REFERENCE, ["Vik Srinivasan", "Palo Alto", "Stanford"], ["palo alto", "Stanford"])
+        self.assertAlmostEqual(result["noun_recall"], 2 / 3)
+        self.assertNotIn("noun_recall", score(REFERENCE, REFERENCE))
+
+
+class TestCorpusEvaluator(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        words = REFERENCE.split()
+        self.items = []
+        for index in range(40):
+            hypothesis = [word for word in words if rng.random() > 0.2]
+            self.items.append({"id": f"utt{index}", "reference": REFERENCE, "hypothesis": ' '.join(hypothesis)})
+
+    def test_parallel_matches_serial(self):
+        serial_records, serial = CorpusEvaluator(workers=1).run(self.items)
+        parallel_records, parallel = CorpusEvaluator(workers=2).run(self.items)
+        self.assertEqual(serial_records, parallel_records)
+        for key in evaluation.COUNTS + ("wer", "cer"):
+            self.assertEqual(serial[key], parallel[key])
+        self.assertEqual(serial["utterances"], 40)
+        self.assertAlmostEqual(serial["wer"], serial["deletions"] / (40 * 9))
+
+    def test_proper_noun_recall(self):
+        items = [{"id": "a", "reference": REFERENCE, "hypothesis": REFERENCE.replace("Stanford", "stamford")},
+                 {"id": "b", "reference": REFERENCE, "hypothesis": REFERENCE, "reference_nouns": ["Stanford"]}]
+        records, summary = CorpusEvaluator(workers=1, extract_proper_nouns=fake_proper_nouns).run(items)
+        self.assertEqual((records[0]["nouns_found"], records[0]["reference_nouns"]), (4, 5))  # All but Stanford
+        self.assertEqual(records[1]["noun_recall"], 1.0)
+        self.assertAlmostEqual(summary["noun_recall"], 5 / 6)
+
+    def test_load_corpus(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "a.txt"), "w") as f:
+                f.write(REFERENCE + "\n")
+            with open(os.path.join(directory, "out.jsonl"), "w") as f:
+                f.write(json.dumps({"path": os.path.join(directory, "a.wav"), "status": "ok", "text": "I met"}) + "\n")
+                f.write(json.dumps({"path": os.path.join(directory, "b.wav"), "status": "error"}) + "\n")
+            with open(os.path.join(directory, "refs.jsonl"), "w") as f:
+                f.write(json.dumps({"path": "a.wav", "text": REFERENCE, "proper_nouns": ["Stanford"]}) + "\n")
+
+            hypotheses = load_hypotheses(os.path.join(directory, "out.jsonl"))
+            self.assertEqual(hypotheses, {os.path.join(directory, "a.wav"): "I met"})
+            self.assertEqual(load_references(directory)[os.path.join(directory, "a.wav")]["text"], REFERENCE)
+            records = load_references(os.path.join(directory, "refs.jsonl"))
+            self.assertEqual(records[os.path.join(directory, "a.wav")]["proper_nouns"], ["Stanford"])
+
+
+if __name__ == '__main__':
+    unittest.main()
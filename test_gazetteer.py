@@ -0,0 +1,152 @@
+import os
+import tempfile
+import unittest
+from backend.fakes import FakeNERManager
+from backend.gazetteer import Gazetteer, phonetic_keys
+from backend.ner_manager import NERManager
+
+DAY = 86400
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPhoneticKeys(unittest.TestCase):
+    def test_sound_alikes_share_a_key(self):
+        for first, second in [("Vic", "Vik"), ("Catherine", "Kathryn"), ("Stephen", "Steven"), ("Phillip", "Filip"),
+                              ("Knight", "Night"), ("Srinivasan", "Srinivassan")]:
+            self.assertEqual(phonetic_keys(first)[0], phonetic_keys(second)[0], (first, second))
+
+    def test_different_names_differ(self):
+        self.assertNotEqual(phonetic_keys("Vik")[0], phonetic_keys("Rick")[0])
+        self.assertNotEqual(phonetic_keys("Palo")[0], phonetic_keys("Pablo")[0])
+
+    def test_alternate_pronunciation(self):
+        self.assertEqual(phonetic_keys("Michael"), ("MXL", "MKL"))
+
+
+class TestGazetteer(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.gazetteer = Gazetteer(clock=self.clock, half_life_days=30)
+        self.gazetteer.add(["Vik Srinivasan", "Palo Alto", "Stanford", "Kathryn"])
+
+    def test_decay(self):
+        self.gazetteer.add(["Stanford"])
+        self.assertEqual(self.gazetteer.counts["Stanford"], 2)
+        self.clock.now += 30 * DAY
+        self.assertAlmostEqual(self.gazetteer.weight("Stanford"), 1.0)
+        self.gazetteer.add(["Stanford"])
+        self.assertAlmostEqual(self.gazetteer.weight("Stanford"), 2.0)
+
+        self.clock.now += 60 * DAY  # Everything else is down to 0.125
+        self.assertEqual(self.gazetteer.prune(), 3)
+        self.assertEqual(list(self.gazetteer.counts), ["Stanford"])
+        self.assertEqual(self.gazetteer.sounds_like("Kathryn"), [])
+        self.assertEqual(self.gazetteer.max_words, 1)
+
+    def test_memory_updates_prune_decayed_names(self):
+        ner_manager = NERManager(gazetteer=self.gazetteer)
+        ner_manager.update_memory(["Stanford"])
+        self.clock.now += 90 * DAY
+        ner_manager.update_memory(["Stanford"])
+        self.assertEqual(list(ner_manager.get_memory()), ["Stanford"])
+        self.assertEqual(self.gazetteer.max_words, 1)  # "Vik Srinivasan" and "Palo Alto" are gone
+
+        self.gazetteer.add(["Vik Srinivasan"])
+        self.gazetteer.min_weight = 1.1
+        self.clock.now += DAY / 2
+        ner_manager.update_memory(["Stanford"])
+        self.assertIn("Vik Srinivasan", self.gazetteer)  # Under the minimum, but swept at most daily
+        self.clock.now += DAY / 2
+        ner_manager.update_memory(["Stanford"])
+        self.assertNotIn("Vik Srinivasan", self.gazetteer)
+
+    def test_snap(self):
+        """Test misrecognized names are replaced by the known names they sound like."""
+        self.gazetteer.add(["Vik Srinivasan", "Palo Alto", "Stanford", "Kathryn"])
+        text, replacements = self.gazetteer.snap("I met Vic Srinivasan in Pallo Alto near Stanford. Then Catherine.")
+        self.assertEqual(text, "I met Vik Srinivasan in Palo Alto near Stanford. Then Kathryn.")
+        self.assertEqual(replacements, [("Vic Srinivasan", "Vik Srinivasan"), ("Pallo Alto", "Palo Alto"),
+                                        ("Catherine", "Kathryn")])
+
+    def test_snap_needs_a_clear_winner(self):
+        self.gazetteer.add(["Vik Srinivasan", "Vick Srinivasan", "Vick Srinivasan"])
+        self.assertEqual(self.gazetteer.snap("Vic Srinivasan")[1], [])
+        self.gazetteer.add(["Vik Srinivasan"] * 3)
+        self.assertEqual(self.gazetteer.snap("Vic Srinivasan")[0], "Vik Srinivasan")
+
+    def test_one_sighting_is_not_enough(self):
+        self.assertEqual(self.gazetteer.snap("I met Catherine")[1], [])
+        self.gazetteer.add(["Kathryn"])
+        self.assertEqual(self.gazetteer.snap("I met Catherine")[0], "I met Kathryn")
+
+    def test_everyday_words_are_not_snapped(self):
+        """Test words that merely sound like known names are left alone."""
+        self.gazetteer.add(["Ben", "Sean", "Rose", "Mark"] * 3)
+        for text in ["Been there done that.", "Seen it already", "Rows of corn", "Marc is here",
+                     "We walked past Rows of corn. Marc is here."]:
+            self.assertEqual(self.gazetteer.snap(text), (text, []))
+        self.assertEqual(self.gazetteer.snap("I met Benn and Marc today")[0], "I met Ben and Mark today")
+
+    def test_decayed_names_do_not_match(self):
+        self.gazetteer.add(["Kathryn"])
+        self.assertEqual(self.gazetteer.match("Catherine"), "Kathryn")
+        self.clock.now += 90 * DAY
+        self.assertIsNone(self.gazetteer.match("Catherine"))
+
+    def test_complete(self):
+        self.gazetteer.add(["Palo Verde", "Palo Verde", "Paris"])
+        self.assertEqual(self.gazetteer.complete("pal"), ["Palo Verde", "Palo Alto"])
+        self.assertEqual(self.gazetteer.complete("Pa", limit=1), ["Palo Verde"])
+        self.assertEqual(self.gazetteer.complete("x"), [])
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "names.sqlite3")
+            gazetteer = Gazetteer(path)
+            gazetteer.add(["Vik Srinivasan", "Vik Srinivasan", "Stanford"])
+            gazetteer.close()
+
+            gazetteer = Gazetteer(path)
+            self.assertEqual(gazetteer.counts, {"Vik Srinivasan": 2, "Stanford": 1})
+            self.assertEqual(gazetteer.match("Vic Srinivasan"), "Vik Srinivasan")
+            self.assertEqual(gazetteer.complete("st"), ["Stanford"])
+            gazetteer.close()
+
+
+class TestLocalCorrection(unittest.TestCase):
+    def setUp(self):
+        self.ner_manager = FakeNERManager()
+        self.ner_manager.update_memory(["Vik Srinivasan", "Palo Alto", "Vik"])
+
+    def test_fix_naming_a_known_noun_skips_the_llm(self):
+        corrected, proper_nouns = self.ner_manager.correct_and_extract("I met Vic Srinivasan in Palo Alto",
+                                                                       "No, it's Vik Srinivasan.")
+        self.assertEqual(corrected, "I met Vik Srinivasan in Palo Alto")
+        self.assertEqual(proper_nouns, ["Vik Srinivasan", "Palo Alto"])
+        self.assertEqual(self.ner_manager.calls, 0)
+
+    def test_other_corrections_go_to_the_llm(self):
+        self.ner_manager.corrected_transcription = "I met Vik on Tuesday"
+        corrected, _ = self.ner_manager.correct_and_extract("I met Vic on Monday", "Vik, and it was Tuesday")
+        self.assertEqual(corrected, "I met Vik on Tuesday")
+        self.assertEqual(self.ner_manager.calls, 1)
+
+    def test_ambiguous_target_goes_to_the_llm(self):
+        self.assertIsNone(self.ner_manager.correct_locally("Vic told Vick", "it's Vik"))
+
+    def test_memory_lookup(self):
+        """Test known names are found by exact lookup, so extraction skips the LLM."""
+        self.assertEqual(self.ner_manager.extract_proper_nouns("Vik Srinivasan, from Palo Alto."),
+                         ["Vik Srinivasan", "Palo Alto"])
+        self.assertEqual(self.ner_manager.calls, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
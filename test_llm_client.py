@@ -0,0 +1,242 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from google.api_core import exceptions
+from google.auth.exceptions import DefaultCredentialsError
+from backend.fakes import FakeLLMServer, Latency
+from backend.llm_client import (CircuitBreaker, CircuitOpenError, GeminiTransport, HTTPTransport, LLMClient, LLMError,
+                                TokenBucket, TransientLLMError, parse_retry_after)
+from backend.metrics import HistogramSink, get_metrics
+from backend.ner_manager import NERManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(), 0.5)  # In debt: wait for the next token
+        clock.now += 1.0
+        self.assertAlmostEqual(bucket.reserve(), 0.0)
+
+    def test_acquire_gives_up_past_timeout(self):
+        bucket = TokenBucket(rate=1, capacity=1)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertIsNone(bucket.acquire(timeout=0.1))
+        self.assertLess(bucket.tokens, 1)  # The refused token was given back, not spent
+        self.assertGreater(bucket.tokens, -0.5)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_and_recovers(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        clock.now += 10
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # Only one trial request at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")  # The trial failed
+
+        clock.now += 10
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+
+class FailingModel:
+    """Stands in for a Gemini model whose every request raises `error`."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def generate_content(self, prompt, generation_config=None, request_options=None):
+        raise self.error
+
+
+class BrokenTransport:
+    def generate(self, prompt, generation_config, timeout):
+        raise RuntimeError("bug in the transport")
+
+
+class TestTransportErrors(unittest.TestCase):
+    def test_gemini_errors_are_mapped(self):
+        """Test errors outside google.api_core come out as LLMError, and connection errors as retryable."""
+        transport = GeminiTransport()
+        for error, expected in [(exceptions.ServiceUnavailable("down"), TransientLLMError),
+                                (exceptions.InvalidArgument("bad"), LLMError),
+                                (DefaultCredentialsError("no key"), LLMError),
+                                (ConnectionResetError("reset"), TransientLLMError),
+                                (ValueError("bad configuration"), LLMError)]:
+            transport.model = FailingModel(error)
+            with self.assertRaises(LLMError) as raised:
+                transport.generate("Find the names", None, 1.0)
+            self.assertIs(type(raised.exception), expected)
+
+    def test_retry_after(self):
+        self.assertEqual(parse_retry_after("2"), 2.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)  # Already passed
+        later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(later), 30, delta=2)
+
+
+class TestLLMClient(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeLLMServer()
+        self.transport = HTTPTransport(self.server.url)
+        self.client = LLMClient(self.transport, timeout=1.0, deadline=5.0, backoff=0.01, rate=None,
+                                failure_threshold=3, reset_timeout=60, seed=0)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.close()
+
+    def test_retries_transient_failures(self):
+        """Test rate limits and server errors are retried and the metrics count the retries."""
+        histograms = get_metrics().add_sink(HistogramSink())
+        try:
+            self.server.fail_next(503, 429)
+            self.assertEqual(self.client.generate("Find the names"), '["Vik Srinivasan", "Palo Alto", "Stanford"]')
+        finally:
+            get_metrics().remove_sink(histograms)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.client.stats()["retries"], 2)
+        self.assertEqual(histograms.summary()["llm_request"]["retries"], 2)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.fail_next(500, 500, 500, 500, 500)
+        self.client.max_retries = 2
+        with self.assertRaises(TransientLLMError):
+            self.client.generate("Find the names")
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.client.stats()["failures"], 1)
+
+    def test_malformed_reply_is_retried(self):
+        """Test a 200 reply that isn't the expected JSON is retried like a server error."""
+        self.server.fail_next(200)
+        self.assertEqual(self.client.generate("Find the names"), '["Vik Srinivasan", "Palo Alto", "Stanford"]')
+        self.assertEqual(self.client.stats()["retries"], 1)
+
+        self.client.max_retries = 0
+        self.server.fail_next(200)
+        with self.assertRaises(TransientLLMError):
+            self.client.generate("Find the names")
+        self.assertEqual(self.client.stats()["failures"], 1)
+
+    def test_rejected_requests_are_not_retried(self):
+        self.server.fail_next(400)
+        with self.assertRaises(LLMError):
+            self.client.generate("Find the names")
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(self.client.breaker.state, "closed")
+
+    def test_timeout_is_retried(self):
+        self.server.latency = Latency(0.3)
+        self.client.timeout = 0.1
+        self.client.max_retries = 1
+        with self.assertRaises(TransientLLMError):
+            self.client.generate("Find the names")
+        self.assertEqual(self.client.stats()["attempts"], 2)
+
+    def test_deadline_stops_retries(self):
+        self.server.fail_next(*[503] * 10)
+        self.server.retry_after = 1
+        self.client.max_retries = 10
+        start = time.monotonic()
+        with self.assertRaises(TransientLLMError):
+            self.client.generate("Find the names", deadline=0.5)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(self.server.requests, 1)  # Waiting the Retry-After would pass the deadline
+
+    def test_circuit_breaker_stops_error_storms(self):
+        """Test that once the API keeps failing, requests fail fast without reaching it."""
+        self.server.fail_rate = 1.0
+        self.client.max_retries = 0
+        for _ in range(3):
+            with self.assertRaises(TransientLLMError):
+                self.client.generate("Find the names")
+        with self.assertRaises(CircuitOpenError):
+            self.client.generate("Find the names")
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.client.stats()["rejected"], 1)
+        self.assertEqual(self.client.stats()["circuit"], "open")
+
+    def test_trial_request_is_released_on_every_exit(self):
+        """Test a half-open trial that ends on the rate limit or an unmapped error doesn't keep the circuit open."""
+        clock = FakeClock()
+        self.client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        self.client.breaker.record_failure()
+        clock.now += 10
+        self.client.bucket = TokenBucket(rate=0.1, capacity=1)
+        self.client.bucket.reserve()  # The next token is 10 s away
+        with self.assertRaises(LLMError):
+            self.client.generate("Find the names", deadline=0.1)
+        self.assertEqual(self.server.requests, 0)
+        self.assertTrue(self.client.breaker.allow())  # Another trial is still let through
+        self.client.breaker.release()
+
+        self.client.bucket = None
+        self.client.transport = BrokenTransport()
+        with self.assertRaises(RuntimeError):
+            self.client.generate("Find the names")
+        self.assertEqual(self.client.breaker.state, "open")  # The trial failed
+        clock.now += 10
+        self.client.transport = self.transport
+        self.assertEqual(self.client.generate("Find the names"), '["Vik Srinivasan", "Palo Alto", "Stanford"]')
+        self.assertEqual(self.client.breaker.state, "closed")
+
+    def test_rate_limit(self):
+        client = LLMClient(self.transport, rate=20, burst=1)
+        threads = [threading.Thread(target=client.generate, args=("Find the names",)) for _ in range(6)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)  # 5 requests past the burst at 20/s
+        self.assertEqual(self.server.requests, 6)
+
+
+class TestNERManagerErrors(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeLLMServer()
+        self.ner_manager = NERManager(client=LLMClient(HTTPTransport(self.server.url), max_retries=0, rate=None))
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_failure_is_raised_and_not_cached(self):
+        """Test a failed request surfaces as an error instead of an empty noun list."""
+        self.server.fail_next(503)
+        with self.assertRaises(LLMError):
+            self.ner_manager.extract_proper_nouns("I met Vik Srinivasan in Palo Alto near Stanford")
+        self.assertEqual(self.ner_manager.extract_proper_nouns("I met Vik Srinivasan in Palo Alto near Stanford"),
+                         ["Vik Srinivasan", "Palo Alto", "Stanford"])
+
+    def test_failed_correction_is_not_retried_as_separate_requests(self):
+        self.server.fail_next(503)
+        with self.assertRaises(LLMError):
+            self.ner_manager.correct_and_extract("I met Vic", "it's Vik")
+        self.assertEqual(self.server.requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import io
+import json
+import os
+import tempfile
+from backend.metrics import HistogramSink, JSONLogSink, Metrics, PrometheusTextfileSink, Span, get_metrics, set_metrics, span
+
+
+class ListSink:
+    def __init__(self):
+        self.spans = []
+
+    def record(self, span):
+        self.spans.append(span)
+
+
+class FailingSink:
+    def record(self, span):
+        raise RuntimeError("sink is down")
+
+
+def make_span(name, duration, **attributes):
+    span = Span(name, attributes)
+    span.duration = duration
+    return span
+
+
+class TestMetrics(unittest.TestCase):
+    def test_span_records_duration_and_attributes(self):
+        """Test a span reaches the sinks with its duration and attributes."""
+        sink = ListSink()
+        metrics = Metrics([sink])
+        with metrics.span("transcribe", audio_seconds=2.0) as s:
+            s.set(chars_out=12)
+
+        self.assertEqual(len(sink.spans), 1)
+        self.assertEqual(sink.spans[0].name, "transcribe")
+        self.assertGreaterEqual(sink.spans[0].duration, 0.0)
+        self.assertEqual(sink.spans[0].attributes, {"audio_seconds": 2.0, "chars_out": 12})
+
+    def test_span_records_errors(self):
+        """Test a failing stage is still recorded, with its exception type."""
+        sink = ListSink()
+        metrics = Metrics([sink])
+        with self.assertRaises(ValueError):
+            with metrics.span("extract_proper_nouns"):
+                raise ValueError("bad response")
+        self.assertEqual(sink.spans[0].error, "ValueError")
+
+    def test_failing_sink_does_not_break_pipeline(self):
+        """Test a sink that raises doesn't stop the other sinks or the stage."""
+        sink = ListSink()
+        metrics = Metrics([FailingSink(), sink])
+        with metrics.span("play_audio"):
+            pass
+        self.assertEqual(len(sink.spans), 1)
+
+    def test_module_span_uses_process_metrics(self):
+        """Test the module-level span() goes to the process-wide Metrics."""
+        previous = get_metrics()
+        sink = ListSink()
+        set_metrics(Metrics([sink]))
+        try:
+            with span("save_audio", bytes_in=10):
+                pass
+        finally:
+            set_metrics(previous)
+        self.assertEqual([s.name for s in sink.spans], ["save_audio"])
+
+
+class TestSinks(unittest.TestCase):
+    def test_json_log_sink(self):
+        """Test each span is logged as one JSON line."""
+        stream = io.StringIO()
+        sink = JSONLogSink(stream)
+        sink.record(make_span("mp3_decode", 0.25, bytes_in=100, bytes_out=4000))
+        sink.record(make_span("play_audio", 1.5))
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        record = json.loads(lines[0])
+        self.assertEqual(record["span"], "mp3_decode")
+        self.assertEqual(record["duration_s"], 0.25)
+        self.assertEqual(record["bytes_out"], 4000)
+
+    def test_histogram_sink(self):
+        """Test the histogram counts spans per stage and sums numeric attributes."""
+        sink = HistogramSink(buckets=(0.1, 1.0))
+        for duration in (0.05, 0.5, 0.5, 2.0):
+            sink.record(make_span("transcribe", duration, audio_seconds=3.0, source="llm"))
+
+        summary = sink.summary()["transcribe"]
+        self.assertEqual(summary["count"], 4)
+        self.assertAlmostEqual(summary["mean_s"], 0.7625)
+        self.assertAlmostEqual(summary["audio_seconds"], 12.0)
+        self.assertNotIn("source", summary)
+        self.assertTrue(0.1 <= sink.quantile("transcribe", 0.5) <= 1.0)
+        self.assertIsNone(sink.quantile("missing", 0.5))
+
+    def test_prometheus_textfile(self):
+        """Test the textfile holds cumulative buckets, sum and count for each stage."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dictation.prom")
+            sink = PrometheusTextfileSink(path, histograms=HistogramSink(buckets=(0.1, 1.0)), interval=0)
+            sink.record(make_span("transcribe", 0.05, bytes_in=100))
+            sink.record(make_span("transcribe", 0.5, bytes_in=100))
+            with open(path) as f:
+                text = f.read()
+            self.assertEqual(os.listdir(directory), ["dictation.prom"])
+
+        self.assertIn('voice_dictation_stage_duration_seconds_bucket{stage="transcribe",le="0.1"} 1', text)
+        self.assertIn('voice_dictation_stage_duration_seconds_bucket{stage="transcribe",le="+Inf"} 2', text)
+        self.assertIn('voice_dictation_stage_duration_seconds_count{stage="transcribe"} 2', text)
+        self.assertIn('voice_dictation_stage_bytes_in_total{stage="transcribe"} 200', text)
+
+    def test_prometheus_textfile_is_flushed_on_close(self):
+        """Test spans recorded between timed writes still reach the textfile when the metrics are closed."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dictation.prom")
+            metrics = Metrics([PrometheusTextfileSink(path, interval=60)])
+            metrics.record(make_span("transcribe", 0.05))
+            metrics.record(make_span("transcribe", 0.5))
+            with open(path) as f:
+                self.assertIn('voice_dictation_stage_duration_seconds_count{stage="transcribe"} 1', f.read())
+            metrics.close()
+            with open(path) as f:
+                self.assertIn('voice_dictation_stage_duration_seconds_count{stage="transcribe"} 2', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,22 @@
 import unittest
 from backend.ner_manager import NERManager
+import google.generativeai as genai
 import os
+import threading
+import time
 from dotenv import load_dotenv
 load_dotenv()
 google_key = os.getenv('GOOGLE_KEY')
+if google_key:
+    genai.configure(api_key=google_key)
 
 
 class TestNERManager(unittest.TestCase):
     def setUp(self):
         """Set up the NERManager instance before each test."""
-        self.ner_manager = NERManager(google_key)
+        self.ner_manager = NERManager()
 
+    @unittest.skipUnless(google_key, "GOOGLE_KEY is not set")
     def test_extract_proper_nouns(self):
         """Test the extraction of proper nouns from a transcription."""
         transcription = "I met Vik Srinivasan in Palo Alto near Stanford."
@@ -40,5 +46,107 @@ class TestNERManager(unittest.TestCase):
         self.assertIn("Palo Alto", memory)
         self.assertEqual(len(memory), 2)  # Should have two entries
 
+class CountingNERManager(NERManager):
+    """NERManager whose LLM returns a canned response and counts how often it is called."""
+
+    def __init__(self, response, delay=0.0):
+        super().__init__()
+        self.response = response
+        self.delay = delay
+        self.calls = 0
+
+    def call_gpt_api(self, prompt, generation_config=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.response
+
+
+class TestNERManagerCache(unittest.TestCase):
+    def test_repeated_text_is_served_from_cache(self):
+        ner_manager = CountingNERManager("['Stanford', 'The Lab']")
+        first = ner_manager.extract_proper_nouns("We went to Stanford and The Lab.")
+        second = ner_manager.extract_proper_nouns("We went to  Stanford and The Lab. ")
+
+        self.assertEqual(first, ["Stanford", "The Lab"])
+        self.assertEqual(second, first)
+        self.assertEqual(ner_manager.calls, 1)
+        self.assertEqual(ner_manager.memory["Stanford"], 2)
+
+    def test_known_nouns_skip_the_llm(self):
+        ner_manager = CountingNERManager("")
+        ner_manager.update_memory(["Vik Srinivasan", "Palo Alto"])
+
+        proper_nouns = ner_manager.extract_proper_nouns("I met Vik Srinivasan near Palo Alto and Vik Srinivasan again")
+        self.assertEqual(proper_nouns, ["Vik Srinivasan", "Palo Alto"])
+        self.assertEqual(ner_manager.extract_proper_nouns("no names here"), [])
+        self.assertEqual(ner_manager.calls, 0)
+
+    def test_unknown_capitalized_span_goes_to_the_llm(self):
+        ner_manager = CountingNERManager("['Palo Alto', 'Stanford']")
+        ner_manager.update_memory(["Palo Alto"])
+
+        self.assertEqual(ner_manager.extract_proper_nouns("Palo Alto is near Stanford"), ["Palo Alto", "Stanford"])
+        self.assertEqual(ner_manager.calls, 1)
+
+    def test_concurrent_identical_requests_are_coalesced(self):
+        ner_manager = CountingNERManager("['Brooklyn']", delay=0.1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(ner_manager.extract_proper_nouns("From Brooklyn")))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [["Brooklyn"]] * 5)
+        self.assertEqual(ner_manager.calls, 1)
+        self.assertEqual(ner_manager.memory["Brooklyn"], 5)
+
+    def test_failed_responses_are_not_cached(self):
+        ner_manager = CountingNERManager("")
+        self.assertEqual(ner_manager.extract_proper_nouns("Hello Mars"), [])
+        self.assertEqual(ner_manager.extract_proper_nouns("Hello Mars"), [])
+        self.assertEqual(ner_manager.calls, 2)
+
+
+class TestCorrectAndExtract(unittest.TestCase):
+    def test_single_request_returns_text_and_nouns(self):
+        ner_manager = CountingNERManager('{"corrected_transcription": "I met Seán O\'Brien in Washington, D.C.", '
+                                         '"proper_nouns": ["Seán O\'Brien", "Washington, D.C."]}')
+        corrected, proper_nouns = ner_manager.correct_and_extract("I met Sean O Brian in Washington", "It's Seán O'Brien")
+
+        self.assertEqual(corrected, "I met Seán O'Brien in Washington, D.C.")
+        self.assertEqual(proper_nouns, ["Seán O'Brien", "Washington, D.C."])
+        self.assertEqual(ner_manager.calls, 1)
+
+        # The nouns for the corrected text are cached
+        self.assertEqual(ner_manager.extract_proper_nouns(corrected), proper_nouns)
+        self.assertEqual(ner_manager.calls, 1)
+
+    def test_invalid_response_falls_back_to_separate_requests(self):
+        ner_manager = CountingNERManager('{"corrected": 3}')
+        corrected, proper_nouns = ner_manager.correct_and_extract("hello Bob", "it's Rob")
+
+        # The combined request plus a plain correction; the corrected text has no capitalized spans
+        self.assertEqual(corrected, '{"corrected": 3}')
+        self.assertEqual(proper_nouns, [])
+        self.assertEqual(ner_manager.calls, 2)
+
+    def test_parse_correction(self):
+        parse = NERManager.parse_correction
+        self.assertEqual(parse('```json\n{"corrected_transcription": "Hi Ann", "proper_nouns": ["Ann", "Ann"]}\n```'),
+                         ("Hi Ann", ["Ann"]))
+        self.assertIsNone(parse('{"corrected_transcription": "", "proper_nouns": []}'))
+        self.assertIsNone(parse('{"corrected_transcription": "Hi", "proper_nouns": "Ann"}'))
+        self.assertIsNone(parse('not json'))
+        self.assertIsNone(parse(''))
+
+    def test_parse_noun_list_keeps_commas_and_apostrophes(self):
+        parse = NERManager.parse_noun_list
+        self.assertEqual(parse('["O\'Brien", "Washington, D.C."]'), ["O'Brien", "Washington, D.C."])
+        self.assertEqual(parse("['John', 'Mary']"), ["John", "Mary"])
+        self.assertEqual(parse("John, Mary"), ["John", "Mary"])
+        self.assertEqual(parse("[]"), [])
+
 if __name__ == "__main__":
     unittest.main()
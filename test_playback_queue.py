@@ -0,0 +1,112 @@
+import time
+import unittest
+from backend import fakes
+from backend.devices import AudioDeviceManager, NullBackend
+from backend.playback_queue import PlaybackQueue
+from backend.utils import AudioClip
+
+
+class FakePlayback:
+    """Synthesizes each phrase as its own bytes at 20 frames per second, after a delay."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.started = []
+
+    def synthesize(self, text, speed):
+        self.started.append(text)
+        time.sleep(self.delay)
+        return AudioClip(text.encode() * 2, 1, 1, 20)
+
+    def stream(self, text, speed):
+        yield self.synthesize(text, speed)
+
+
+def null_device(realtime=False):
+    backend = NullBackend(realtime=realtime)
+    return backend, AudioDeviceManager(backend)
+
+
+class TestPlaybackQueue(unittest.TestCase):
+    def test_plays_phrases_in_order(self):
+        backend, device = null_device()
+        queue = PlaybackQueue(FakePlayback(delay=0.01), depth=3, device=device)
+        for text in ("one", "two", "three"):
+            queue.enqueue(text)
+
+        self.assertTrue(queue.wait(timeout=5))
+        self.assertEqual(bytes(backend.output), b"oneonetwotwothreethree")
+        self.assertEqual(backend.opened_outputs, 1)
+        queue.close()
+
+    def test_synthesizes_ahead_while_playing(self):
+        playback = FakePlayback()
+        backend, device = null_device(realtime=True)
+        queue = PlaybackQueue(playback, depth=2, device=device, chunk=1)
+        for text in ("a", "b", "c", "d"):
+            queue.enqueue(text)
+
+        # While "a" is still playing, only the next `depth` phrases have been synthesized
+        time.sleep(0.02)
+        self.assertEqual(playback.started, ["a", "b", "c"])
+        self.assertTrue(queue.wait(timeout=5))
+        self.assertEqual(playback.started, ["a", "b", "c", "d"])
+        queue.close()
+
+    def test_cancel_drops_queued_phrases(self):
+        backend, device = null_device(realtime=True)
+        queue = PlaybackQueue(FakePlayback(), depth=1, device=device, chunk=1)
+        queue.enqueue("long phrase")
+        queue.enqueue("never played")
+        time.sleep(0.05)
+        queue.cancel()
+
+        self.assertTrue(queue.wait(timeout=5))
+        played = bytes(backend.output)
+        self.assertNotIn(b"never", played)
+        self.assertLess(len(played), len(b"long phrase") * 2)
+        queue.close()
+
+    def test_long_phrases_play_while_being_stretched(self):
+        """Test the first block of a long phrase reaches the device before the rest has been sped up."""
+        class TimedPlayback(fakes.FakePlayback):
+            def stream(self, text, speed):
+                yield from super().stream(text, speed)
+                self.stretched_at = time.monotonic()
+
+        class TimedDevice(AudioDeviceManager):
+            def write(self, pcm):
+                if self.first_write_at is None:
+                    self.first_write_at = time.monotonic()
+                super().write(pcm)
+
+        backend = NullBackend()
+        device = TimedDevice(backend)
+        device.first_write_at = None
+        playback = TimedPlayback(device=device)
+        queue = PlaybackQueue(playback, device=device)
+        text = "A long phrase to read back. " * 20
+        queue.enqueue(text, speed=1.3)
+        self.assertTrue(queue.wait(timeout=30))
+        self.assertLess(device.first_write_at, playback.stretched_at)
+        self.assertEqual(bytes(backend.output), playback.synthesize(text, 1.3).pcm)  # Cached whole once played
+        queue.close()
+
+    def test_synthesis_errors_are_skipped(self):
+        class FailingPlayback(FakePlayback):
+            def synthesize(self, text, speed):
+                if text == "bad":
+                    raise RuntimeError("tts down")
+                return super().synthesize(text, speed)
+
+        backend, device = null_device()
+        queue = PlaybackQueue(FailingPlayback(), device=device)
+        queue.enqueue("bad")
+        queue.enqueue("good")
+        self.assertTrue(queue.wait(timeout=5))
+        self.assertEqual(bytes(backend.output), b"goodgood")
+        queue.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
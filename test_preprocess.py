@@ -0,0 +1,84 @@
+import unittest
+import numpy as np
+import speech_recognition
+from backend.engines import Engine
+from backend.preprocess import FLACAudioData, prepare_upload, resample
+from backend.transcriber import Transcriber
+
+
+def tone(seconds, rate, frequency, amplitude=6000):
+    t = np.arange(int(seconds * rate)) / rate
+    return (np.sin(2 * np.pi * frequency * t) * amplitude).astype(np.int16)
+
+
+def spectrum_peak(samples, rate):
+    spectrum = np.abs(np.fft.rfft(samples.astype(np.float64)))
+    return np.fft.rfftfreq(len(samples), 1 / rate)[np.argmax(spectrum)], spectrum
+
+
+class UploadingEngine(Engine):
+    name = "uploading"
+    upload = True
+
+    def __init__(self):
+        super().__init__()
+        self.received = None
+
+    def _recognize(self, audio):
+        self.received = audio
+        return "hello"
+
+
+class TestResample(unittest.TestCase):
+    def test_length_and_pitch(self):
+        """Test 44.1 kHz audio comes out at 16 kHz with the same content."""
+        pcm = resample(tone(1.3, 44100, 440).tobytes(), 44100, 16000)
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        self.assertEqual(len(samples), int(1.3 * 44100) * 16000 // 44100)
+        self.assertAlmostEqual(spectrum_peak(samples, 16000)[0], 440, delta=2)
+
+    def test_anti_aliasing(self):
+        """Test a tone above the new Nyquist frequency is removed rather than folded down."""
+        mixed = tone(1.0, 44100, 440) + tone(1.0, 44100, 12000, amplitude=3000)
+        samples = np.frombuffer(resample(mixed.tobytes(), 44100, 16000), dtype=np.int16)
+        frequencies = np.fft.rfftfreq(len(samples), 1 / 16000)
+        _, spectrum = spectrum_peak(samples, 16000)
+        alias = spectrum[(frequencies > 3900) & (frequencies < 4100)].max()  # 12 kHz folds to 4 kHz
+        self.assertLess(alias / spectrum.max(), 1e-3)
+
+
+class TestPrepareUpload(unittest.TestCase):
+    def test_flac_upload_is_smaller(self):
+        """Test downsampling plus FLAC cuts the upload well below the captured size."""
+        audio = speech_recognition.AudioData(tone(2.0, 44100, 300).tobytes(), 44100, 2)
+        prepared, stats = prepare_upload(audio)
+
+        self.assertIsInstance(prepared, FLACAudioData)
+        self.assertEqual(prepared.sample_rate, 16000)
+        self.assertEqual(stats["bytes_in"], len(audio.frame_data))
+        self.assertEqual(stats["bytes_out"], len(prepared.flac_data))
+        self.assertGreater(stats["bytes_in"] / stats["bytes_out"], 3)
+        self.assertEqual(stats["bytes_saved"], stats["bytes_in"] - stats["bytes_out"])
+        # recognize_google asks for 16-bit FLAC at the native rate, which is the cached encoding
+        self.assertIs(prepared.get_flac_data(convert_rate=None, convert_width=2), prepared.flac_data)
+
+    def test_never_upsamples(self):
+        audio = speech_recognition.AudioData(tone(0.5, 8000, 300).tobytes(), 8000, 2)
+        prepared, _ = prepare_upload(audio, compress=False)
+        self.assertEqual(prepared.sample_rate, 8000)
+        self.assertEqual(prepared.frame_data, audio.frame_data)
+
+    def test_transcriber_reports_bytes_saved(self):
+        engine = UploadingEngine()
+        transcriber = Transcriber(engine=engine)
+        pcm = tone(1.0, 44100, 300).tobytes()
+        self.assertEqual(transcriber.transcribe_audio(pcm, 44100, 2), "hello")
+
+        self.assertIsInstance(engine.received, FLACAudioData)
+        self.assertEqual(transcriber.upload_stats["requests"], 1)
+        self.assertEqual(transcriber.upload_stats["bytes_in"], len(pcm))
+        self.assertGreater(transcriber.upload_stats["bytes_saved"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
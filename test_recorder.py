@@ -0,0 +1,71 @@
+import os
+import tempfile
+import threading
+import unittest
+import wave
+from backend.recorder import AudioRecorder
+from backend.recording_store import RecordingStore
+
+PCM = b'\x10\x00\x20\x00' * 4000  # Half a second at 16 kHz
+
+
+class SlowStore(RecordingStore):
+    """RecordingStore whose writes wait until released."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.release = threading.Event()
+
+    def write(self, *args):
+        self.release.wait(5)
+        return super().write(*args)
+
+
+class TestSaveAudioAsync(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SlowStore(self.tmp.name)
+        self.recorder = AudioRecorder(store=self.store)
+        self.recorder.rate = 16000
+
+    def tearDown(self):
+        self.store.release.set()
+        self.recorder.wait_for_archive()
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_returns_before_the_file_is_written(self):
+        take_id = self.recorder.save_audio_async(pcm=memoryview(PCM))
+        self.assertEqual(self.recorder.take_id, take_id)
+        self.assertIsNone(self.store.get(take_id)["path"])  # Still waiting on the write
+
+        self.store.release.set()
+        self.recorder.wait_for_archive()
+        with wave.open(os.path.join(self.tmp.name, self.store.get(take_id)["path"])) as wf:
+            self.assertEqual((wf.getnchannels(), wf.getsampwidth(), wf.getframerate()), (1, 2, 16000))
+            self.assertEqual(wf.readframes(wf.getnframes()), PCM)
+
+    def test_fix_is_linked_to_its_take(self):
+        self.store.release.set()
+        take_id = self.recorder.save_audio_async(pcm=PCM)
+        fix_id = self.recorder.save_fix_audio_async(pcm=PCM)
+        self.recorder.wait_for_archive()
+        self.assertEqual([row["id"] for row in self.store.fixes(take_id)], [fix_id])
+
+    def test_take_over_the_size_limit(self):
+        """Test a take larger than the store's limit is archived, and its fix linked to it."""
+        self.store.release.set()
+        self.store.max_bytes = len(PCM) // 2
+        take_id = self.recorder.save_audio_async(pcm=PCM)
+        fix_id = self.recorder.save_fix_audio_async(pcm=PCM)
+        self.recorder.wait_for_archive()
+        self.assertIsNotNone(self.store.get(take_id)["path"])
+        self.assertEqual([row["id"] for row in self.store.fixes(take_id)], [fix_id])
+
+    def test_nothing_to_save(self):
+        self.assertIsNone(self.recorder.save_audio_async(pcm=b""))
+        self.assertIsNone(self.recorder.archive_thread)
+
+
+if __name__ == '__main__':
+    unittest.main()
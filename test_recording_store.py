@@ -0,0 +1,139 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from backend.recording_store import RecordingStore
+
+PCM = b'\x10\x00\x20\x00' * 8000  # One second at 16 kHz
+
+
+class TestRecordingStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = RecordingStore(self.tmp.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_save_and_load(self):
+        """Test a recording is written atomically under its id and can be loaded back."""
+        take_id = self.store.save(PCM, 2, 1, 16000)
+        row = self.store.get(take_id)
+
+        self.assertEqual(row["kind"], "take")
+        self.assertEqual(row["format"], "wav")
+        self.assertAlmostEqual(row["duration"], 1.0)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, row["path"])))
+        self.assertFalse(any(name.endswith(".tmp") for _, _, files in os.walk(self.tmp.name) for name in files))
+        self.assertEqual(self.store.load(take_id).pcm, PCM)
+
+    def test_flac(self):
+        """Test compressed storage round-trips the audio in fewer bytes."""
+        store = RecordingStore(os.path.join(self.tmp.name, "flac"), compress=True)
+        try:
+            take_id = store.save(PCM, 2, 1, 16000)
+            row = store.get(take_id)
+            self.assertEqual(row["format"], "flac")
+            self.assertLess(row["bytes"], len(PCM))
+            self.assertEqual(store.load(take_id).pcm, PCM)
+        finally:
+            store.close()
+
+    def test_ids_are_unique_across_threads(self):
+        ids = []
+        lock = threading.Lock()
+
+        def allocate():
+            for _ in range(50):
+                recording_id = self.store.allocate()
+                with lock:
+                    ids.append(recording_id)
+
+        threads = [threading.Thread(target=allocate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 200)
+
+    def test_links(self):
+        """Test takes link to their fixes, transcripts and proper nouns."""
+        take_id = self.store.save(PCM, 2, 1, 16000)
+        fix_id = self.store.save(PCM, 2, 1, 16000, kind="fix", parent_id=take_id)
+        self.store.add_transcript(take_id, "I met Vic in Palo Alto", proper_nouns=["Vic", "Palo Alto"])
+        self.store.add_transcript(fix_id, "it's Vik with a K", kind="fix_transcription")
+        self.store.add_transcript(take_id, "I met Vik in Palo Alto", kind="corrected_transcription",
+                                  proper_nouns=["Vik", "Palo Alto"])
+
+        self.assertEqual([row["id"] for row in self.store.fixes(take_id)], [fix_id])
+        transcripts = self.store.transcripts(take_id)
+        self.assertEqual([t["kind"] for t in transcripts], ["transcription", "corrected_transcription"])
+        self.assertEqual(transcripts[1]["proper_nouns"], ["Vik", "Palo Alto"])
+        self.assertEqual(self.store.transcripts(fix_id)[0]["proper_nouns"], [])
+        self.assertEqual(self.store.find_by_noun("Palo Alto"), [take_id])
+
+    def test_size_retention(self):
+        """Test the oldest takes, with their fixes and transcripts, are evicted past the size limit."""
+        store = RecordingStore(os.path.join(self.tmp.name, "small"), max_bytes=3 * len(PCM))
+        try:
+            first = store.save(PCM, 2, 1, 16000)
+            store.save(PCM, 2, 1, 16000, kind="fix", parent_id=first)
+            store.add_transcript(first, "old")
+            second = store.save(PCM, 2, 1, 16000)
+            third = store.save(PCM, 2, 1, 16000)
+
+            self.assertIsNone(store.get(first))
+            self.assertEqual(store.transcripts(first), [])
+            self.assertIsNotNone(store.get(second))
+            self.assertIsNotNone(store.get(third))
+            self.assertLessEqual(store.total_bytes, 3 * len(PCM))
+            files = [name for _, _, names in os.walk(store.root) for name in names if name.endswith(".wav")]
+            self.assertEqual(len(files), 2)
+        finally:
+            store.close()
+
+    def test_oversized_take_is_kept_for_its_fix(self):
+        """Test a take larger than the limit isn't evicted by its own write or its fix's."""
+        store = RecordingStore(os.path.join(self.tmp.name, "tiny"), max_bytes=len(PCM) // 2)
+        try:
+            take_id = store.allocate("take")
+            fix_id = store.allocate("fix", parent_id=take_id)
+            path, size = store.write(take_id, PCM, 2, 1, 16000)
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(size, os.path.getsize(path))
+            self.assertIsNotNone(store.write(fix_id, PCM, 2, 1, 16000))
+            self.assertEqual([row["id"] for row in store.fixes(take_id)], [fix_id])
+
+            store.save(PCM, 2, 1, 16000)  # Now the old take can go
+            self.assertIsNone(store.get(take_id))
+            self.assertIsNone(store.get(fix_id))
+            late_fix = store.save(PCM, 2, 1, 16000, kind="fix", parent_id=take_id)
+            self.assertIsNone(store.get(late_fix)["parent_id"])  # Kept on its own rather than failing
+        finally:
+            store.close()
+
+    def test_age_retention(self):
+        old = self.store.save(PCM, 2, 1, 16000)
+        with self.store.db:
+            self.store.db.execute("UPDATE recordings SET created = ? WHERE id = ?", (time.time() - 10 * 86400, old))
+        new = self.store.save(PCM, 2, 1, 16000)
+
+        self.store.max_age_days = 7
+        self.assertEqual(self.store.enforce_retention(), 1)
+        self.assertIsNone(self.store.get(old))
+        self.assertIsNotNone(self.store.get(new))
+
+    def test_reopen(self):
+        """Test the index and size total survive reopening the store."""
+        take_id = self.store.save(PCM, 2, 1, 16000)
+        total = self.store.total_bytes
+        self.store.close()
+        self.store = RecordingStore(self.tmp.name)
+        self.assertEqual(self.store.total_bytes, total)
+        self.assertEqual(self.store.load(take_id).pcm, PCM)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import unittest
+import numpy as np
+from aiohttp.test_utils import TestClient, TestServer
+from backend.fakes import FakeNERManager, FakePlayback, FakeTranscriber, Latency
+from backend.llm_client import CircuitOpenError
+from backend.server import DictationServer
+from benchmarks.bench_server import wav_bytes
+
+SPEECH = (np.sin(2 * np.pi * 300 * np.arange(16000) / 16000) * 6000).astype(np.int16).tobytes()
+
+
+class UnavailableNERManager(FakeNERManager):
+    def call_gpt_api(self, prompt, generation_config=None):
+        raise CircuitOpenError(4.2)
+
+
+class TestDictationServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.transcriber = FakeTranscriber()
+        self.server = DictationServer(transcriber=self.transcriber, ner_factory=FakeNERManager,
+                                      playback=FakePlayback(seconds_per_char=0.001), workers=2)
+        self.client = TestClient(TestServer(self.server.make_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def open_session(self):
+        response = await self.client.post("/sessions")
+        self.assertEqual(response.status, 201)
+        return (await response.json())["session"]
+
+    async def test_take_and_fix(self):
+        """Test a take and a fix uploaded as WAV run through the pipeline, with spoken replies."""
+        session_id = await self.open_session()
+        response = await self.client.post(f"/sessions/{session_id}/take?speak=1", data=wav_bytes(SPEECH))
+        result = await response.json()
+        self.assertEqual(result["transcription"], self.transcriber.text)
+        self.assertIn("Palo Alto", result["proper_nouns"])
+
+        speech = await self.client.get(result["speech"])
+        self.assertEqual(speech.status, 200)
+        self.assertEqual((await speech.read())[:4], b'RIFF')
+
+        response = await self.client.post(f"/sessions/{session_id}/fix", data=SPEECH)  # Raw 16 kHz PCM
+        result = await response.json()
+        self.assertEqual(result["fix_transcription"], self.transcriber.text)
+        self.assertEqual(result["transcription"], "I met Vik Srinivasan in Palo Alto near Stanford")
+
+    async def test_sessions_are_isolated(self):
+        """Test sessions keep their own transcripts, proper noun memory and temp directory."""
+        first, second = await self.open_session(), await self.open_session()
+        await self.client.post(f"/sessions/{first}/take?speak=1", data=SPEECH)
+
+        first_state = await (await self.client.get(f"/sessions/{first}")).json()
+        second_state = await (await self.client.get(f"/sessions/{second}")).json()
+        self.assertEqual(first_state["transcription"], self.transcriber.text)
+        self.assertIn("Stanford", first_state["known_nouns"])
+        self.assertEqual(second_state["transcription"], "")
+        self.assertEqual(second_state["known_nouns"], {})
+        self.assertEqual((await self.client.get(f"/sessions/{second}/speech")).status, 404)
+
+        directory = self.server.sessions[first].directory
+        self.assertTrue(os.path.exists(os.path.join(directory, "speech.wav")))
+        await self.client.delete(f"/sessions/{first}")
+        self.assertFalse(os.path.exists(directory))
+        self.assertEqual((await self.client.get(f"/sessions/{first}")).status, 404)
+
+    async def test_silence_skips_pipeline(self):
+        session_id = await self.open_session()
+        result = await (await self.client.post(f"/sessions/{session_id}/take", data=bytes(32000))).json()
+        self.assertEqual(result["transcription"], "")
+        self.assertEqual(self.transcriber.calls, 0)
+
+    async def test_fix_needs_a_take(self):
+        session_id = await self.open_session()
+        self.assertEqual((await self.client.post(f"/sessions/{session_id}/fix", data=SPEECH)).status, 409)
+
+    async def assert_bad_audio(self, query, body):
+        session_id = await self.open_session()
+        response = await self.client.post(f"/sessions/{session_id}/take{query}", data=body)
+        self.assertEqual(response.status, 400)
+        self.assertIn("bad audio", (await response.json())["error"])
+        self.assertEqual(self.transcriber.calls, 0)
+
+    async def test_partial_sample_is_rejected(self):
+        """Test raw PCM with half a sample left over gets a 400 rather than failing in the VAD."""
+        await self.assert_bad_audio("", SPEECH[:-1])
+
+    async def test_unsupported_width_is_rejected(self):
+        await self.assert_bad_audio("?width=3", SPEECH[:-2])
+
+    async def test_bad_rate_is_rejected(self):
+        for query in ("?rate=0", "?rate=-16000", "?rate=fast"):
+            await self.assert_bad_audio(query, SPEECH)
+
+    async def test_websocket_bad_audio_is_rejected(self):
+        session_id = await self.open_session()
+        self.assertEqual((await self.client.get(f"/sessions/{session_id}/ws?width=3")).status, 400)
+        async with self.client.ws_connect(f"/sessions/{session_id}/ws") as ws:
+            await ws.send_bytes(SPEECH[:-1])
+            await ws.send_json({"type": "take"})
+            reply = await ws.receive_json()
+            self.assertEqual((reply["type"], reply["status"]), ("error", 400))
+
+    async def test_websocket(self):
+        """Test audio streamed over a WebSocket is transcribed when the client asks."""
+        session_id = await self.open_session()
+        async with self.client.ws_connect(f"/sessions/{session_id}/ws?rate=16000&width=2") as ws:
+            for start in range(0, len(SPEECH), 3200):
+                await ws.send_bytes(SPEECH[start:start + 3200])
+            await ws.send_json({"type": "take"})
+            reply = await ws.receive_json()
+            self.assertEqual(reply["type"], "take")
+            self.assertEqual(reply["transcription"], self.transcriber.text)
+
+            await ws.send_json({"type": "fix"})  # Nothing streamed since the take
+            reply = await ws.receive_json()
+            self.assertEqual(reply["fix_transcription"], "")
+        self.assertEqual(self.transcriber.calls, 1)
+
+    async def test_backpressure(self):
+        """Test work past the pending limit is turned away with 503 instead of queueing."""
+        self.transcriber.engine.latency = Latency(0.3)
+        self.server.max_pending = 2
+        sessions = [await self.open_session() for _ in range(4)]
+        responses = await asyncio.gather(*(self.client.post(f"/sessions/{session_id}/take", data=SPEECH)
+                                           for session_id in sessions))
+        statuses = sorted(response.status for response in responses)
+        self.assertEqual(statuses, [200, 200, 503, 503])
+        rejected = next(response for response in responses if response.status == 503)
+        self.assertEqual(rejected.headers["Retry-After"], "1")
+        stats = await (await self.client.get("/stats")).json()
+        self.assertEqual(stats["rejected"], 2)
+        self.assertEqual(stats["pending"], 0)
+
+    async def test_llm_unavailable(self):
+        """Test an open LLM circuit is passed on as 503 with the time to retry."""
+        self.server.ner_factory = UnavailableNERManager
+        session_id = await self.open_session()
+        response = await self.client.post(f"/sessions/{session_id}/take", data=SPEECH)
+        self.assertEqual(response.status, 503)
+        self.assertEqual(response.headers["Retry-After"], "5")
+
+    async def test_session_limit(self):
+        self.server.max_sessions = 1
+        await self.open_session()
+        self.assertEqual((await self.client.post("/sessions")).status, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import numpy as np
+from backend.streaming import PauseSegmenter, StreamingTranscriber
+
+RATE = 16000
+CHUNK = 1024
+
+
+def tone(seconds):
+    """Generate a loud sine tone as int16 PCM."""
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16).tobytes()
+
+
+def silence(seconds):
+    return np.zeros(int(RATE * seconds), dtype=np.int16).tobytes()
+
+
+def chunks(pcm):
+    step = CHUNK * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+
+class FakeRecognizer:
+    """Recognizer that names each segment by its position and records what it was given."""
+
+    def __init__(self):
+        self.segments = []
+
+    def __call__(self, pcm, rate, sample_width):
+        self.segments.append(pcm)
+        return f"segment{len(self.segments)}"
+
+
+class TestPauseSegmenter(unittest.TestCase):
+    def test_cuts_at_pauses(self):
+        segmenter = PauseSegmenter(RATE, min_pause=0.5, min_segment=0.5)
+        audio = tone(1.0) + silence(0.8) + tone(1.0) + silence(0.8)
+        segments = [s for s in map(segmenter.push, chunks(audio)) if s]
+        self.assertEqual(len(segments), 2)
+        self.assertIsNone(segmenter.flush())
+
+    def test_silence_only_produces_nothing(self):
+        segmenter = PauseSegmenter(RATE)
+        segments = [s for s in map(segmenter.push, chunks(silence(5.0))) if s]
+        self.assertEqual(segments, [])
+        self.assertIsNone(segmenter.flush())
+
+    def test_long_speech_is_split_at_max_segment(self):
+        segmenter = PauseSegmenter(RATE, max_segment=2.0)
+        segments = [s for s in map(segmenter.push, chunks(tone(5.0))) if s]
+        self.assertEqual(len(segments), 2)
+        self.assertIsNotNone(segmenter.flush())
+
+
+class TestStreamingTranscriber(unittest.TestCase):
+    def test_transcribes_segments_in_order(self):
+        recognizer = FakeRecognizer()
+        streamer = StreamingTranscriber(recognizer, RATE,
+                                        segmenter=PauseSegmenter(RATE, min_pause=0.5, min_segment=0.5))
+        streamer.start()
+        for chunk in chunks(tone(1.0) + silence(0.8) + tone(1.0)):
+            streamer.chunks.put(chunk)
+
+        self.assertEqual(streamer.finish(), "segment1 segment2")
+        self.assertIsNone(streamer.error)
+
+    def test_records_recognizer_errors(self):
+        def failing(pcm, rate, sample_width):
+            raise RuntimeError("offline")
+
+        streamer = StreamingTranscriber(failing, RATE)
+        streamer.start()
+        for chunk in chunks(tone(1.0)):
+            streamer.chunks.put(chunk)
+
+        self.assertEqual(streamer.finish(), "")
+        self.assertIsInstance(streamer.error, RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
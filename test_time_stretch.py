@@ -0,0 +1,88 @@
+import unittest
+import numpy as np
+from backend.devices import AudioDeviceManager, NullBackend
+from backend.playback import Playback
+from backend.time_stretch import TimeStretcher, stretch_blocks, time_stretch
+from backend.tts import TTSProvider
+from backend.tts_cache import TTSCache
+from backend.utils import AudioClip
+
+RATE = 24000
+
+
+def tone(seconds, frequency=220, channels=1):
+    t = np.arange(int(seconds * RATE)) / RATE
+    samples = (np.sin(2 * np.pi * frequency * t) * 8000).astype(np.int16)
+    if channels == 2:
+        samples = np.stack([samples, samples // 2], axis=1)
+    return AudioClip(samples.tobytes(), 2, channels, RATE)
+
+
+def dominant_frequency(pcm):
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float64)
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    return np.argmax(spectrum) * RATE / len(samples)
+
+
+class TestTimeStretch(unittest.TestCase):
+    def test_preserves_pitch(self):
+        """Test WSOLA changes the length by the speed factor but keeps the pitch."""
+        clip = tone(2.0)
+        for speed in (0.75, 1.3, 2.0):
+            stretched = time_stretch(clip, speed)
+            self.assertEqual(len(stretched.pcm) // 2, round(2.0 * RATE / speed))
+            self.assertAlmostEqual(dominant_frequency(stretched.pcm), 220, delta=3)
+
+    def test_without_pitch_preservation(self):
+        """Test resampling raises the pitch along with the speed."""
+        stretched = time_stretch(tone(2.0), 1.5, preserve_pitch=False)
+        self.assertEqual(len(stretched.pcm) // 2, round(2.0 * RATE / 1.5))
+        self.assertAlmostEqual(dominant_frequency(stretched.pcm), 330, delta=3)
+
+    def test_streaming_matches_whole_clip(self):
+        """Test processing in blocks gives exactly the same audio as processing the whole clip."""
+        clip = tone(3.0)
+        for speed in (0.75, 1.3, 2.7, 3.7):
+            for preserve_pitch in (True, False):
+                whole = time_stretch(clip, speed, preserve_pitch).pcm
+                self.assertEqual(len(whole) // 2, round(3.0 * RATE / speed))
+                for block_seconds in (0.37, 0.05):
+                    blocks = list(stretch_blocks(clip, speed, preserve_pitch, block_seconds=block_seconds))
+                    self.assertGreater(len(blocks), 1)
+                    self.assertEqual(b''.join(block.pcm for block in blocks), whole, (speed, preserve_pitch))
+
+    def test_first_block_is_ready_early(self):
+        """Test output is produced before the whole input has been seen."""
+        stretcher = TimeStretcher(1.3, RATE)
+        self.assertGreater(len(stretcher.process(tone(0.5).pcm)), 0)
+
+    def test_stereo(self):
+        stretched = time_stretch(tone(1.0, channels=2), 1.5)
+        self.assertEqual(len(stretched.pcm) // 4, round(RATE / 1.5))
+
+    def test_rejects_other_sample_widths(self):
+        with self.assertRaises(ValueError):
+            time_stretch(AudioClip(bytes(100), 1, 1, 8000), 1.3)
+
+
+class ToneProvider(TTSProvider):
+    name = "tone"
+
+    def synthesize(self, text, lang):
+        return tone(0.1 * len(text))
+
+
+class TestPlaybackStream(unittest.TestCase):
+    def test_stream_caches_whole_clip(self):
+        """Test streamed speech is played block by block and then served from the cache."""
+        backend = NullBackend()
+        playback = Playback(cache=TTSCache(cache_dir=None), device=AudioDeviceManager(backend), provider=ToneProvider())
+        playback.playback_transcription("a long enough phrase")
+        expected = time_stretch(tone(0.1 * len("a long enough phrase")), 1.3).pcm
+
+        self.assertEqual(bytes(backend.output), expected)
+        self.assertEqual(playback.synthesize("a long enough phrase", 1.3).pcm, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+import wave
+import numpy as np
+import speech_recognition
+from backend.fakes import FakeTranscriber
+
+PCM = (np.sin(np.arange(8000) / 5.0) * 3000).astype(np.int16).tobytes()  # Half a second at 16 kHz
+
+
+def write_wav(path, pcm, rate=16000):
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm)
+
+
+class TestTranscriberInputs(unittest.TestCase):
+    def setUp(self):
+        self.transcriber = FakeTranscriber(text="hello")
+
+    def test_raw_pcm(self):
+        """Test bytes, bytearray and memoryview are wrapped without a copy."""
+        for pcm in (PCM, bytearray(PCM), memoryview(PCM)):
+            audio = self.transcriber.to_audio_data(pcm, 16000, 2)
+            self.assertIs(audio.frame_data, pcm)
+            self.assertEqual((audio.sample_rate, audio.sample_width), (16000, 2))
+            self.assertEqual(self.transcriber.transcribe_audio(pcm, 16000, 2), "hello")
+        self.assertEqual(self.transcriber.calls, 3)
+
+    def test_raw_pcm_needs_its_format(self):
+        with self.assertRaises(ValueError):
+            self.transcriber.transcribe_audio(PCM)
+
+    def test_audio_data(self):
+        audio = speech_recognition.AudioData(PCM, 16000, 2)
+        self.assertIs(self.transcriber.to_audio_data(audio), audio)
+        self.assertEqual(self.transcriber.transcribe_audio(audio), "hello")
+
+    def test_wav_path(self):
+        """Test a WAV file path still works, as transcriber_tester.py uses it."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "take.wav")
+            write_wav(path, PCM)
+            audio = self.transcriber.to_audio_data(path)
+            self.assertEqual(audio.frame_data, PCM)
+            self.assertEqual(audio.sample_rate, 16000)
+            self.assertEqual(self.transcriber.transcribe_audio(path), "hello")
+
+
+if __name__ == '__main__':
+    unittest.main()
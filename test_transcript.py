@@ -0,0 +1,36 @@
+import unittest
+from backend.transcript import Transcript
+
+
+class TestTranscript(unittest.TestCase):
+    def setUp(self):
+        self.transcript = Transcript("I met  Vik Srinivasan\nin Palo Alto")
+
+    def test_offsets(self):
+        """Test each word's span is where it sits in the rendered text, words joined by one space."""
+        text = self.transcript.text
+        self.assertEqual(text, "I met Vik Srinivasan in Palo Alto")
+        for index, word in enumerate(self.transcript.words):
+            start, end = self.transcript.span(index)
+            self.assertEqual(text[start:end], word)
+
+    def test_wer_is_counted_as_words_are_marked(self):
+        self.assertTrue(self.transcript.toggle(2))
+        self.assertTrue(self.transcript.toggle(3))
+        self.assertAlmostEqual(self.transcript.wer, 2 / 7 * 100)
+        self.assertFalse(self.transcript.toggle(2))
+        self.assertAlmostEqual(self.transcript.wer, 1 / 7 * 100)
+        self.assertEqual(Transcript().wer, 0.0)
+
+    def test_render(self):
+        self.transcript.toggle(1)
+        self.assertEqual(self.transcript.render(0, 2),
+                         '<a href="0">I</a> <a href="1" style="color: red; text-decoration: underline;">met</a>')
+        self.assertEqual(Transcript("AT&T <b>").render(), '<a href="0">AT&amp;T</a> <a href="1">&lt;b&gt;</a>')
+
+    def test_render_range(self):
+        self.assertEqual(self.transcript.render(6, 10), '<a href="6">Alto</a>')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import tempfile
+from backend.devices import AudioDeviceManager, NullBackend
+from backend.playback import Playback
+from backend.tts import EspeakProvider, TTSProvider, decode_mp3
+from backend.tts_cache import TTSCache
+from backend.utils import AudioClip
+
+# Stand-ins for ffmpeg and espeak that write canned audio to stdout
+FAKE_FFMPEG = [sys.executable, "-c", "import sys; sys.stdin.buffer.read(); sys.stdout.buffer.write(b'\\x01\\x00' * 240)"]
+FAKE_ESPEAK = [sys.executable, "-c", (
+    "import io, sys, wave\n"
+    "text = sys.stdin.read()\n"
+    "out = io.BytesIO()\n"
+    "wf = wave.open(out, 'wb'); wf.setnchannels(1); wf.setsampwidth(2); wf.setframerate(22050)\n"
+    "wf.writeframes(b'\\x02\\x00' * 100 * len(text)); wf.close()\n"
+    "sys.stdout.buffer.write(out.getvalue())\n"
+)]
+
+
+class CountingProvider(TTSProvider):
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def synthesize(self, text, lang):
+        self.calls += 1
+        return AudioClip(b'\x03\x00' * 2400 * len(text), 2, 1, 24000)
+
+
+class TestProviders(unittest.TestCase):
+    def test_decode_mp3_through_pipe(self):
+        """Test MP3 decoding reads PCM from the decoder's stdout."""
+        self.assertEqual(decode_mp3(b"ID3 not really an mp3", command=FAKE_FFMPEG), b'\x01\x00' * 240)
+
+    def test_decode_mp3_failure(self):
+        """Test a decoder error is raised with its message."""
+        with self.assertRaises(RuntimeError):
+            decode_mp3(b"", command=[sys.executable, "-c", "import sys; sys.exit('bad mp3')"])
+
+    def test_espeak_provider(self):
+        """Test the offline provider parses WAV from the synthesizer's stdout."""
+        clip = EspeakProvider(command=FAKE_ESPEAK).synthesize("hello", "en")
+        self.assertEqual((clip.sample_width, clip.channels, clip.rate), (2, 1, 22050))
+        self.assertEqual(len(clip.pcm), 2 * 100 * len("hello"))
+
+
+class TestPlayback(unittest.TestCase):
+    def setUp(self):
+        self.backend = NullBackend()
+        self.provider = CountingProvider()
+        self.playback = Playback(cache=TTSCache(cache_dir=None), device=AudioDeviceManager(self.backend),
+                                 provider=self.provider)
+
+    def test_no_files_written(self):
+        """Test synthesis and playback happen entirely in memory."""
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                self.playback.text_to_speech("hello there", 1.0)
+                self.playback.play_audio()
+                self.playback.cleanup()
+                self.assertEqual(os.listdir(directory), [])
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(len(self.backend.output), 2 * 2400 * len("hello there"))
+
+    def test_speed_change(self):
+        """Test faster speech is shorter."""
+        clip = self.playback.render_speech("hello there", 1.3)
+        self.assertLess(len(clip.pcm), 2 * 2400 * len("hello there"))
+
+    def test_cache_is_per_provider(self):
+        """Test phrases are synthesized once, under a key that includes the provider."""
+        self.playback.synthesize("hello", 1.0)
+        self.playback.synthesize("hello", 1.0)
+        self.assertEqual(self.provider.calls, 1)
+        self.assertIsNone(self.playback.cache.get("hello", "en", 1.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from backend.tts_cache import TTSCache
+from backend.utils import AudioClip
+
+
+def clip(nbytes, rate=24000):
+    return AudioClip(bytes(nbytes), 2, 1, rate)
+
+
+class TestTTSCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_text_lang_and_speed(self):
+        key = TTSCache.make_key("Hello", "en", 1.3)
+        self.assertEqual(key, TTSCache.make_key("Hello", "en", 1.3))
+        self.assertNotEqual(key, TTSCache.make_key("Hello", "fr", 1.3))
+        self.assertNotEqual(key, TTSCache.make_key("Hello", "en", 1.0))
+
+    def test_memory_hit_and_miss_stats(self):
+        cache = TTSCache(cache_dir=None)
+        self.assertIsNone(cache.get("Hello", "en", 1.3))
+        cache.put("Hello", "en", 1.3, clip(100))
+        self.assertEqual(cache.get("Hello", "en", 1.3).pcm, bytes(100))
+
+        stats = cache.stats()
+        self.assertEqual((stats["memory_hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["memory_bytes"], 100)
+
+    def test_memory_lru_eviction(self):
+        cache = TTSCache(cache_dir=None, max_memory_bytes=250)
+        cache.put("a", "en", 1.0, clip(100))
+        cache.put("b", "en", 1.0, clip(100))
+        cache.get("a", "en", 1.0)  # "b" is now least recently used
+        cache.put("c", "en", 1.0, clip(100))
+
+        self.assertIsNotNone(cache.get("a", "en", 1.0))
+        self.assertIsNone(cache.get("b", "en", 1.0))
+        self.assertLessEqual(cache.stats()["memory_bytes"], 250)
+
+    def test_disk_tier_survives_restart(self):
+        TTSCache(cache_dir=self.cache_dir).put("Is there anything you would like to fix?", "en", 1.3, clip(64, 22050))
+
+        cache = TTSCache(cache_dir=self.cache_dir)
+        restored = cache.get("Is there anything you would like to fix?", "en", 1.3)
+        self.assertEqual(restored, clip(64, 22050))
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+
+        # The disk hit was promoted to memory
+        cache.get("Is there anything you would like to fix?", "en", 1.3)
+        self.assertEqual(cache.stats()["memory_hits"], 1)
+
+    def test_disk_lru_eviction(self):
+        cache = TTSCache(cache_dir=self.cache_dir, max_disk_bytes=500)
+        for text in ("a", "b", "c"):
+            cache.put(text, "en", 1.0, clip(200))
+
+        self.assertLessEqual(cache.stats()["disk_bytes"], 500)
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, TTSCache.make_key("a", "en", 1.0) + ".wav")))
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, TTSCache.make_key("c", "en", 1.0) + ".wav")))
+
+
+if __name__ == "__main__":
+    unittest.main()
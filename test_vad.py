@@ -0,0 +1,107 @@
+import unittest
+import time
+import numpy as np
+from backend.api import VoiceDictationTool
+from backend.devices import AudioDeviceManager, NullBackend
+from backend.fakes import FakeNERManager, FakePlayback, FakeTranscriber
+from backend.metrics import HistogramSink, get_metrics
+from backend.vad import EnergyVAD
+
+RATE = 16000
+
+
+def tone(seconds, amplitude=6000):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (np.sin(2 * np.pi * 300 * t) * amplitude).astype(np.int16)
+
+
+def silence(seconds, amplitude=50):
+    return np.random.default_rng(0).normal(0, amplitude, int(seconds * RATE)).astype(np.int16)
+
+
+def pcm(*pieces):
+    return np.concatenate(pieces).tobytes()
+
+
+class TestEnergyVAD(unittest.TestCase):
+    def test_trims_leading_and_trailing_silence(self):
+        vad = EnergyVAD(RATE, padding=0.1)
+        trimmed, stats = vad.trim(pcm(silence(1.0), tone(0.5), silence(2.0)))
+
+        self.assertTrue(stats["speech"])
+        self.assertAlmostEqual(stats["input_seconds"], 3.5)
+        self.assertAlmostEqual(stats["output_seconds"], 0.7, delta=0.03)
+        self.assertAlmostEqual(stats["trimmed_seconds"], stats["input_seconds"] - stats["output_seconds"])
+        self.assertEqual(len(trimmed), int(stats["output_seconds"] * RATE) * 2)
+
+    def test_keeps_internal_pauses_by_default(self):
+        vad = EnergyVAD(RATE, padding=0.1)
+        _, stats = vad.trim(pcm(tone(0.5), silence(2.0), tone(0.5)))
+        self.assertAlmostEqual(stats["output_seconds"], 3.0, delta=0.03)
+
+    def test_compresses_long_pauses(self):
+        vad = EnergyVAD(RATE, padding=0.1, max_pause=0.5)
+        self.assertEqual(len(vad.segments(pcm(tone(0.5), silence(2.0), tone(0.5)))), 2)
+        _, stats = vad.trim(pcm(tone(0.5), silence(2.0), tone(0.5)))
+        self.assertAlmostEqual(stats["output_seconds"], 1.0 + 0.2 + 0.5, delta=0.03)
+
+    def test_no_speech(self):
+        """Test silence and steady low-level noise are not mistaken for speech."""
+        vad = EnergyVAD(RATE)
+        for audio in (bytes(RATE * 2), pcm(silence(2.0, amplitude=200)), b''):
+            trimmed, stats = vad.trim(audio)
+            self.assertFalse(stats["speech"])
+            self.assertEqual(trimmed, b'')
+
+    def test_ignores_clicks(self):
+        vad = EnergyVAD(RATE, min_speech=0.1)
+        _, stats = vad.trim(pcm(silence(1.0), tone(0.03), silence(1.0)))
+        self.assertFalse(stats["speech"])
+
+    def test_loud_background(self):
+        """Test speech over a noise floor above the fixed threshold is still found."""
+        vad = EnergyVAD(RATE, padding=0.1)
+        _, stats = vad.trim(pcm(silence(1.0, amplitude=800), tone(0.5, amplitude=8000), silence(1.0, amplitude=800)))
+        self.assertTrue(stats["speech"])
+        self.assertAlmostEqual(stats["output_seconds"], 0.7, delta=0.03)
+
+
+class TestPipelineVAD(unittest.TestCase):
+    def setUp(self):
+        self.backend = NullBackend(input_pcm=bytes(44100 * 2), realtime=True)
+        self.device = AudioDeviceManager(self.backend)
+        self.transcriber = FakeTranscriber()
+        self.ner_manager = FakeNERManager()
+        self.tool = VoiceDictationTool(archive=False, device=self.device, transcriber=self.transcriber,
+                                       ner_manager=self.ner_manager,
+                                       playback=FakePlayback(seconds_per_char=0.001, device=self.device),
+                                       warm_up=False)
+        self.histograms = HistogramSink()
+        get_metrics().add_sink(self.histograms)
+
+    def tearDown(self):
+        get_metrics().remove_sink(self.histograms)
+        self.tool.playback_queue.close()
+
+    def test_silent_take_skips_asr_and_llm(self):
+        stages = []
+        self.tool.start_recording()
+        time.sleep(0.2)
+        transcription, proper_nouns = self.tool.stop_recording(progress=lambda stage, value: stages.append(stage))
+
+        self.assertEqual((transcription, proper_nouns), ("", []))
+        self.assertListEqual(stages, ["transcription"])
+        self.assertEqual(self.transcriber.calls, 0)
+        self.assertEqual(self.ner_manager.calls, 0)
+        self.assertGreater(self.histograms.summary()["vad"]["trimmed_seconds"], 0)
+
+    def test_silent_fix_skips_llm(self):
+        self.tool.start_fix_recording()
+        time.sleep(0.2)
+        self.assertIsNone(self.tool.process_fix("I met Vic in Palo Alto"))
+        self.assertEqual(self.transcriber.calls, 0)
+        self.assertEqual(self.ner_manager.calls, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()